@@ -4,6 +4,7 @@ Automated TrueNAS Setup Script
 Enables SSH and creates API key using REST API
 """
 
+import os
 import requests
 import json
 import sys
@@ -14,8 +15,8 @@ from getpass import getpass
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 class TrueNASSetup:
-    def __init__(self, host, username, password):
-        self.base_url = f"https://{host}/api/v2.0"
+    def __init__(self, host, username, password, base_url=None):
+        self.base_url = base_url or f"https://{host}/api/v2.0"
         self.username = username
         self.password = password
         self.session = requests.Session()
@@ -189,13 +190,15 @@ def main():
     username = "root"
     old_password = "uppercut%$##"
     new_password = "n=I-PT:x>FU!}gjMPN/AM[D8"
+    # Point at another endpoint (e.g. truenas-fixture-server.py) without editing the host
+    api_url = os.getenv('TRUENAS_API_URL')
 
-    print(f"\nTarget: https://{host}")
+    print(f"\nTarget: {api_url or f'https://{host}'}")
     print(f"Username: {username}")
     print(f"Using password from environment...")
 
     # Initialize setup
-    setup = TrueNASSetup(host, username, old_password)
+    setup = TrueNASSetup(host, username, old_password, api_url)
 
     # Test connection
     if not setup.test_connection():
@@ -213,7 +216,7 @@ def main():
     if change_pw.lower() == 'yes':
         setup.change_root_password(new_password)
         print("\n[WARN] Password changed! Reconnecting with new password...")
-        setup = TrueNASSetup(host, username, new_password)
+        setup = TrueNASSetup(host, username, new_password, api_url)
 
     # Create API key
     create_key = input("\n[WARN] Create API key? (yes/no): ")
@@ -8,6 +8,8 @@ import json
 import requests
 from dotenv import load_dotenv
 
+from truenas_cli import load_tool
+
 # Load environment
 load_dotenv('.env.local')
 
@@ -19,7 +21,7 @@ if not BABYNAS_API_KEY:
     print("[ERROR] BABY_NAS_API_KEY not found in .env.local")
     exit(1)
 
-API_URL = f"http://{BABYNAS_IP}/api/v2.0"
+API_URL = os.getenv('BABY_NAS_API_URL', f"http://{BABYNAS_IP}/api/v2.0")
 headers = {
     "Authorization": f"Bearer {BABYNAS_API_KEY}",
     "Content-Type": "application/json"
@@ -83,39 +85,35 @@ print("STEP 3: ADD JDMAL PERMISSIONS TO DATASETS")
 print("Setting ZFS permissions for jdmal user...")
 print()
 
-success_count = 0
-failure_count = 0
-
-for dataset in datasets:
-    dataset_id = dataset.get('id')
-    dataset_name = dataset.get('name')
-
-    print(f">>> Configuring: {dataset_name}")
+# Only datasets that differ get a PUT (of just the differing properties),
+# several at a time; the rest are already configured
+manager = load_tool('truenas-manager.py').TrueNASManager(config={
+    'host': BABYNAS_IP,
+    'api_key': BABYNAS_API_KEY,
+    'api_url': API_URL,
+})
+desired = {
+    "aclmode": "posix",
+    "aclinherit": "passthrough"
+}
 
-    try:
-        # Update dataset ACL mode and inheritance
-        payload = {
-            "aclmode": "posix",
-            "aclinherit": "passthrough"
-        }
 
-        response = requests.put(
-            f"{API_URL}/pool/dataset/id/{dataset_id}?force=true",
-            headers=headers,
-            json=payload,
-            timeout=10
-        )
-        response.raise_for_status()
+def report(result):
+    if result['status'] == 'changed':
+        print(f"  [OK] Permissions updated: {result['dataset']}")
+    elif result['status'] == 'unchanged':
+        print(f"  [OK] Already configured: {result['dataset']}")
+    else:
+        print(f"  [ERROR] Failed to update permissions on {result['dataset']}: {result['error']}")
 
-        print(f"  [OK] Permissions updated: {dataset_name}")
-        success_count += 1
 
-    except Exception as e:
-        print(f"  [ERROR] Failed to update permissions: {e}")
-        failure_count += 1
+summary = manager.reconcile_dataset_properties(desired, datasets, workers=8, force=True, on_result=report)
+success_count = summary['changed'] + summary['unchanged']
+failure_count = summary['failed']
 
 print()
-print(f"[INFO] Permissions updated: {success_count}/{len(datasets)} successful")
+print(f"[INFO] Permissions updated: {summary['changed']} changed, {summary['unchanged']} already set, "
+      f"{success_count}/{len(datasets)} successful")
 if failure_count > 0:
     print(f"[ERROR] Failed: {failure_count} datasets")
 print()
@@ -41,7 +41,8 @@ def test_api(config):
         print("    Please create one via Web UI: System -> API Keys")
         return False
 
-    url = f"https://{ip}/api/v2.0/system/info"
+    base_url = config.get('TRUENAS_API_URL', f"https://{ip}/api/v2.0")
+    url = f"{base_url}/system/info"
     headers = {"Authorization": f"Bearer {api_key}"}
 
     try:
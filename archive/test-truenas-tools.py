@@ -99,7 +99,8 @@ def test_api_connection():
         with open(config_path, 'r') as f:
             config = json.load(f)
 
-        url = f"https://{config['host']}/api/v2.0/system/info"
+        base_url = config.get('api_url', f"https://{config['host']}/api/v2.0")
+        url = f"{base_url}/system/info"
         headers = {
             "Authorization": f"Bearer {config['api_key']}",
             "Content-Type": "application/json"
@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Agent - Resident helper that keeps API sessions and responses warm
+Holds keep-alive HTTPS sessions to the NAS and a short-lived cache of GET
+responses, and serves them to the TrueNAS tools over a local Unix socket.
+Writes invalidate the cached resources they touch, and requests sent with
+'Cache-Control: no-cache' (the tools' polling loops) always go upstream.
+Cached listings are also indexed in memory on demand (snapshots by dataset,
+jobs by method), so a tool asking for one dataset's snapshots gets just
+those instead of the whole list. The tools use the agent automatically while
+it is running and talk to the NAS directly otherwise.
+
+    python truenas-agent.py start --detach
+    python truenas-manager.py health system     # served through the agent
+    python truenas-agent.py status
+    python truenas-agent.py stop
+"""
+
+import json
+import os
+import re
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import urlsplit
+
+import click
+import requests
+import urllib3
+from tabulate import tabulate
+
+from truenas_cli import AGENT_SOCKET_ENV, DEFAULT_AGENT_SOCKET, agent_call, agent_socket_path
+
+# Disable SSL warnings for self-signed certificates
+urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+
+API_MARKER = '/api/v2.0/'
+
+# Writes to a resource also change what these endpoints return
+RELATED = {
+    'zfs/snapshot': ['pool/dataset'],
+    'pool/dataset': ['zfs/snapshot', 'pool', 'sharing/smb'],
+    'replication': ['core/get_jobs'],
+}
+
+
+def resource_of(url: str) -> Tuple[str, str]:
+    """Split a request URL into (API root path, resource), e.g. ('/api/v2.0/', 'zfs/snapshot')"""
+    path = urlsplit(url).path
+    root, marker, endpoint = path.partition(API_MARKER)
+    if not marker:
+        return '', path
+    return root + marker, re.split(r'/id/', endpoint, maxsplit=1)[0]
+
+
+class ResponseCache:
+    """LRU cache of GET responses with a time-to-live"""
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple, Dict[str, Any]]' = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        return sum(len(entry['content']) for entry in self._entries.values())
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry['stored'] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple, entry: Dict[str, Any]):
+        entry['stored'] = time.monotonic()
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, prefixes: List[str]) -> int:
+        """Drop entries whose URL path starts with any prefix; returns how many"""
+        stale = [key for key, entry in self._entries.items()
+                 if any(entry['path'].startswith(prefix) for prefix in prefixes)]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def clear(self) -> int:
+        count = len(self._entries)
+        self._entries.clear()
+        return count
+
+
+def build_index(content: bytes, field: str) -> Dict[str, bytes]:
+    """A JSON list response grouped by one field: value -> the matching records as JSON"""
+    groups: Dict[str, List[Any]] = {}
+    for record in json.loads(content):
+        groups.setdefault(str(record.get(field)), []).append(record)
+    return {value: json.dumps(records).encode() for value, records in groups.items()}
+
+
+class AgentRequestHandler(socketserver.StreamRequestHandler):
+    """One message per connection: a JSON line in, a JSON header line and body out"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            message = json.loads(line)
+        except ValueError:
+            self._reply({'error': 'malformed message'})
+            return
+
+        op = message.pop('op', 'request')
+        if op == 'request':
+            self._reply(*self.server.forward(message))
+        elif op == 'select':
+            self._reply(*self.server.select(message))
+        elif op == 'stats':
+            self._reply(self.server.get_stats())
+        elif op == 'flush':
+            self._reply({'flushed': self.server.flush()})
+        elif op == 'shutdown':
+            self._reply({'stopping': True})
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        else:
+            self._reply({'error': f"unknown op: {op}"})
+
+    def _reply(self, header: Dict[str, Any], content: bytes = b''):
+        header['length'] = len(content)
+        self.wfile.write(json.dumps(header).encode() + b'\n' + content)
+
+
+class TrueNASAgent(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server relaying API requests through warm sessions and a response cache"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path, ttl: float = 10.0, max_entries: int = 512,
+                 verbose: bool = False):
+        self.socket_path = socket_path
+        self.cache = ResponseCache(ttl, max_entries)
+        self.verbose = verbose
+        self.started = time.time()
+        self.stats = {
+            'requests': 0, 'hits': 0, 'misses': 0, 'coalesced': 0,
+            'upstream': 0, 'upstream_errors': 0, 'invalidated': 0, 'uncached': 0,
+            'selects': 0, 'indexes_built': 0,
+        }
+        self._sessions: Dict[Tuple[str, bool], requests.Session] = {}
+        self._inflight: Dict[Tuple, threading.Event] = {}
+        self._lock = threading.Lock()
+
+        socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        super().__init__(str(socket_path), AgentRequestHandler)
+        # Cached responses carry the caller's data; keep the socket private
+        os.chmod(socket_path, 0o600)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _session(self, url: str, verify: bool) -> requests.Session:
+        parts = urlsplit(url)
+        key = (f"{parts.scheme}://{parts.netloc}", verify)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = self._sessions[key] = requests.Session()
+                session.verify = verify
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+        return session
+
+    def _send(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        """Perform the request upstream; returns a cacheable entry"""
+        session = self._session(message['url'], message.get('verify', False))
+        start = time.perf_counter()
+        response = session.request(
+            message['method'], message['url'],
+            headers=message.get('headers'), params=message.get('params'),
+            json=message.get('json'), timeout=message.get('timeout', 30)
+        )
+        with self._lock:
+            self.stats['upstream'] += 1
+        if self.verbose:
+            click.echo(f"{message['method']} {message['url']} -> {response.status_code} "
+                       f"({(time.perf_counter() - start) * 1000:.1f} ms)")
+        return {
+            'path': urlsplit(message['url']).path,
+            'status': response.status_code,
+            'headers': {k: v for k, v in response.headers.items() if k.lower() == 'content-type'},
+            'content': response.content,
+        }
+
+    def _cached_get(self, key: Tuple, message: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """Serve a GET from cache, sharing one upstream fetch between concurrent callers"""
+        while True:
+            with self._lock:
+                entry = self.cache.get(key)
+                if entry is not None:
+                    self.stats['hits'] += 1
+                    return entry, True
+                waiter = self._inflight.get(key)
+                leader = waiter is None
+                if leader:
+                    waiter = self._inflight[key] = threading.Event()
+                    self.stats['misses'] += 1
+                else:
+                    self.stats['coalesced'] += 1
+            if not leader:
+                waiter.wait()
+                continue
+
+            try:
+                entry = self._send(message)
+                if entry['status'] == 200:
+                    with self._lock:
+                        self.cache.put(key, entry)
+                return entry, False
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                waiter.set()
+
+    @staticmethod
+    def _cache_key(message: Dict[str, Any]) -> Tuple:
+        headers = message.get('headers') or {}
+        return (headers.get('Authorization'), message['url'], json.dumps(message.get('params'), sort_keys=True))
+
+    def _get(self, message: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """A GET from cache, or upstream (refreshing the cache) when the caller asks for no-cache"""
+        key = self._cache_key(message)
+        headers = message.get('headers') or {}
+        if headers.get('Cache-Control', '').lower() != 'no-cache':
+            return self._cached_get(key, message)
+        entry = self._send(message)
+        with self._lock:
+            self.stats['uncached'] += 1
+            if entry['status'] == 200:
+                self.cache.put(key, entry)
+        return entry, False
+
+    def forward(self, message: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        """Relay one request message; returns the reply header and body"""
+        with self._lock:
+            self.stats['requests'] += 1
+        method = message['method'].upper()
+        try:
+            if method == 'GET':
+                entry, cached = self._get(message)
+            else:
+                entry, cached = self._send(message), False
+                if entry['status'] < 400:
+                    root, resource = resource_of(message['url'])
+                    prefixes = [root + name for name in [resource] + RELATED.get(resource, [])]
+                    with self._lock:
+                        self.stats['invalidated'] += self.cache.invalidate(prefixes)
+        except requests.exceptions.RequestException as e:
+            with self._lock:
+                self.stats['upstream_errors'] += 1
+            return {'error': str(e)}, b''
+
+        return {'status': entry['status'], 'headers': entry['headers'], 'cached': cached}, entry['content']
+
+    def select(self, message: Dict[str, Any]) -> Tuple[Dict[str, Any], bytes]:
+        """
+        The records of a list endpoint (GET message) whose 'field' equals 'value',
+        from an index built once per cached response and dropped with it
+        """
+        with self._lock:
+            self.stats['selects'] += 1
+        field, value = message.pop('field'), str(message.pop('value'))
+        try:
+            entry, cached = self._get(dict(message, method='GET'))
+        except requests.exceptions.RequestException as e:
+            with self._lock:
+                self.stats['upstream_errors'] += 1
+            return {'error': str(e)}, b''
+        reply = {'status': entry['status'], 'headers': entry['headers'], 'cached': cached}
+        if entry['status'] != 200:
+            return reply, entry['content']
+
+        indexes = entry.setdefault('indexes', {})
+        index = indexes.get(field)
+        if index is None:
+            try:
+                index = build_index(entry['content'], field)
+            except (ValueError, AttributeError):
+                return {'error': f"{message['url']} is not a list of records"}, b''
+            with self._lock:
+                indexes[field] = index
+                self.stats['indexes_built'] += 1
+        return reply, index.get(value, b'[]')
+
+    def flush(self) -> int:
+        """Empty the response cache"""
+        with self._lock:
+            return self.cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters, cache size and uptime"""
+        with self._lock:
+            return dict(
+                self.stats,
+                pid=os.getpid(),
+                uptime=time.time() - self.started,
+                entries=len(self.cache),
+                cached_bytes=self.cache.size,
+                sessions=len(self._sessions),
+                ttl=self.cache.ttl,
+            )
+
+
+def _running() -> Optional[Dict[str, Any]]:
+    """Stats of the agent on the configured socket, or None if none is running"""
+    try:
+        return agent_call({'op': 'stats'}, timeout=2)
+    except requests.exceptions.RequestException:
+        return None
+
+
+# ==================== CLI ====================
+
+@click.group()
+@click.option('--socket', 'socket_path', type=click.Path(dir_okay=False), envvar=AGENT_SOCKET_ENV,
+              default=str(DEFAULT_AGENT_SOCKET), show_default=True,
+              help=f"Unix socket path (clients read {AGENT_SOCKET_ENV})")
+def cli(socket_path):
+    """TrueNAS Agent - warm sessions and response cache for the TrueNAS tools"""
+    os.environ[AGENT_SOCKET_ENV] = str(Path(socket_path).expanduser())
+
+
+@cli.command('start')
+@click.option('--ttl', type=float, default=10.0, help='Seconds a cached GET response stays fresh')
+@click.option('--max-entries', type=int, default=512, help='Maximum cached responses')
+@click.option('--detach', is_flag=True, help='Run in the background (logs to agent.log next to the socket)')
+@click.option('--verbose', is_flag=True, help='Log every upstream request')
+def start(ttl, max_entries, detach, verbose):
+    """Start the agent"""
+    if not hasattr(socket, 'AF_UNIX'):
+        click.echo("Error: Unix sockets are not available on this platform", err=True)
+        sys.exit(1)
+
+    socket_path = agent_socket_path()
+    if _running():
+        click.echo(f"Agent already running on {socket_path}", err=True)
+        sys.exit(1)
+    if socket_path.exists():
+        socket_path.unlink()  # left behind by an agent that did not exit cleanly
+
+    if detach:
+        log_path = socket_path.with_name('agent.log')
+        socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        args = [sys.executable, __file__, '--socket', str(socket_path), 'start',
+                '--ttl', str(ttl), '--max-entries', str(max_entries)]
+        if verbose:
+            args.append('--verbose')
+        with open(log_path, 'a') as log:
+            subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT,
+                             start_new_session=True)
+
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            stats = _running()
+            if stats:
+                click.echo(f"Agent started (pid {stats['pid']}) on {socket_path}")
+                return
+            time.sleep(0.1)
+        click.echo(f"Error: agent did not start, see {log_path}", err=True)
+        sys.exit(1)
+
+    server = TrueNASAgent(socket_path, ttl=ttl, max_entries=max_entries, verbose=verbose)
+    click.echo(f"Agent listening on {socket_path} (cache TTL {ttl:g}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        click.echo("\nAgent stopped")
+    finally:
+        server.server_close()
+
+
+@cli.command('stop')
+def stop():
+    """Stop the running agent"""
+    if not _running():
+        click.echo("Agent is not running")
+        return
+    agent_call({'op': 'shutdown'}, timeout=5)
+    click.echo("Agent stopped")
+
+
+@cli.command('status')
+def status():
+    """Show agent cache and request statistics"""
+    stats = _running()
+    if not stats:
+        click.echo("Agent is not running")
+        sys.exit(1)
+
+    lookups = stats['hits'] + stats['misses'] + stats['coalesced']
+    hit_rate = (stats['hits'] + stats['coalesced']) / lookups if lookups else 0.0
+    table_data = [
+        ['PID', stats['pid']],
+        ['Uptime', f"{stats['uptime'] / 60:.1f} min"],
+        ['Requests', stats['requests']],
+        ['Cache Hits', f"{stats['hits']} ({hit_rate:.1%} incl. coalesced)"],
+        ['Cache Misses', stats['misses']],
+        ['Coalesced', stats['coalesced']],
+        ['Upstream Calls', stats['upstream']],
+        ['Upstream Errors', stats['upstream_errors']],
+        ['Invalidated', stats['invalidated']],
+        ['No-cache Requests', stats.get('uncached', 0)],
+        ['Indexed Selects', f"{stats.get('selects', 0)} ({stats.get('indexes_built', 0)} indexes built)"],
+        ['Cached Entries', stats['entries']],
+        ['Cached Size', f"{stats['cached_bytes'] / 1024:.1f} KiB"],
+        ['Sessions', stats['sessions']],
+        ['Cache TTL', f"{stats['ttl']:g}s"],
+    ]
+    click.echo(tabulate(table_data, headers=['Metric', 'Value'], tablefmt='grid'))
+
+
+@cli.command('flush')
+def flush():
+    """Drop all cached responses"""
+    reply = agent_call({'op': 'flush'}, timeout=5)
+    if reply is None:
+        click.echo("Agent is not running")
+        sys.exit(1)
+    click.echo(f"Flushed {reply['flushed']} cached responses")
+
+
+if __name__ == '__main__':
+    cli()
@@ -27,7 +27,8 @@ class TrueNASAPIClient:
         print(json.dumps(pools, indent=2))
     """
 
-    def __init__(self, host: str, api_key: str, verify_ssl: bool = False):
+    def __init__(self, host: str, api_key: str, verify_ssl: bool = False,
+                 base_url: Optional[str] = None):
         """
         Initialize API client
 
@@ -35,11 +36,12 @@ class TrueNASAPIClient:
             host: TrueNAS host IP or hostname
             api_key: API key for authentication
             verify_ssl: Whether to verify SSL certificates (default: False for self-signed)
+            base_url: Full API URL override (e.g. a local fixture server)
         """
         self.host = host
         self.api_key = api_key
         self.verify_ssl = verify_ssl
-        self.base_url = f"https://{host}/api/v2.0"
+        self.base_url = base_url or f"https://{host}/api/v2.0"
 
     @classmethod
     def from_config(cls, config_path: Optional[Path] = None) -> 'TrueNASAPIClient':
@@ -61,7 +63,8 @@ class TrueNASAPIClient:
         return cls(
             host=config['host'],
             api_key=config['api_key'],
-            verify_ssl=config.get('verify_ssl', False)
+            verify_ssl=config.get('verify_ssl', False),
+            base_url=config.get('api_url')
         )
 
     def _get_headers(self) -> Dict[str, str]:
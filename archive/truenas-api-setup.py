@@ -20,11 +20,12 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 class TrueNASAPI:
     """TrueNAS SCALE API Client"""
 
-    def __init__(self, host: str, api_key: Optional[str] = None, verify_ssl: bool = False):
+    def __init__(self, host: str, api_key: Optional[str] = None, verify_ssl: bool = False,
+                 base_url: Optional[str] = None):
         self.host = host.rstrip('/')
         self.api_key = api_key
         self.verify_ssl = verify_ssl
-        self.base_url = f"https://{self.host}/api/v2.0"
+        self.base_url = base_url or f"https://{self.host}/api/v2.0"
 
     def _get_headers(self) -> Dict[str, str]:
         """Get request headers with authentication"""
@@ -352,7 +353,8 @@ def main():
     api = TrueNASAPI(
         config["host"],
         config["api_key"],
-        config.get("verify_ssl", False)
+        config.get("verify_ssl", False),
+        config.get("api_url")
     )
 
     # Execute requested action
@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Benchmark Suite - Performance tests for the snapshot, replication and dashboard hot paths
+Runs each tool against a local fixture server at several data scales and records
+wall time, API call count and peak memory. Results can be saved as a baseline and
+later runs compared against it so regressions show up.
+
+    python truenas-benchmark.py run --scale small --scale medium --save-baseline
+    python truenas-benchmark.py run --compare
+"""
+
+import io
+import json
+import multiprocessing
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Callable
+
+import click
+import requests
+from tabulate import tabulate
+
+from truenas_cli import load_tool
+
+
+SCRIPT_DIR = Path(__file__).parent
+DEFAULT_BASELINE = SCRIPT_DIR / 'benchmarks' / 'baseline.json'
+
+# Generator settings per scale
+SCALES = {
+    'small': {'datasets': 100, 'snapshots': 5000, 'replication_tasks': 10, 'job_days': 90},
+    'medium': {'datasets': 1000, 'snapshots': 50000, 'replication_tasks': 30, 'job_days': 365},
+    'large': {'datasets': 5000, 'snapshots': 250000, 'replication_tasks': 50, 'job_days': 3 * 365},
+}
+
+# Cold start cases for the unified entry point (truenas.py), and the libraries
+# that short commands should not pay for
+STARTUP_CASES = {
+    'help': ['--help'],
+    'subcommand_help': ['health', 'system', '--help'],
+    'health_system': ['health', 'system'],
+}
+STARTUP_FIXTURES = {'datasets': 10, 'snapshots': 100, 'replication_tasks': 2, 'job_days': 7}
+HEAVY_MODULES = ('requests', 'rich', 'tabulate')
+DEFAULT_STARTUP_TARGET_MS = 300
+
+
+# ==================== Fixture Server Process ====================
+
+def _serve_fixtures(settings: Dict[str, Any], seed: int, queue):
+    """Child process: generate fixtures for a scale and serve them"""
+    server_module = load_tool('truenas-fixture-server.py')
+    generator_module = load_tool('truenas-generate-fixtures.py')
+    generator = generator_module.FixtureGenerator(seed=seed, **settings)
+    server = server_module.FixtureServer(server_module.FixtureStore(generator.build()))
+    queue.put(server.api_url)
+    server.serve_forever()
+
+
+class FixtureProcess:
+    """Fixture server in a separate process so it does not share the GIL or heap"""
+
+    def __init__(self, settings: Dict[str, Any], seed: int = 0):
+        self._queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_serve_fixtures, args=(settings, seed, self._queue), daemon=True
+        )
+        self.api_url = None
+
+    def __enter__(self) -> 'FixtureProcess':
+        self._process.start()
+        self.api_url = self._queue.get(timeout=600)
+        return self
+
+    def __exit__(self, *exc):
+        self._process.terminate()
+        self._process.join()
+
+    def request_count(self) -> int:
+        """Total requests served so far"""
+        stats_url = self.api_url.rsplit('/api/', 1)[0] + '/_fixture/stats'
+        return sum(requests.get(stats_url, timeout=10).json().values())
+
+
+# ==================== Benchmarks ====================
+
+class BenchmarkContext:
+    """Tool instances and sample arguments shared by the benchmarks of one scale"""
+
+    def __init__(self, config_path: Path):
+        self.config_path = config_path
+        self.snapshot_tool = load_tool('truenas-snapshot-manager.py')
+        self.replication_tool = load_tool('truenas-replication-manager.py')
+        self.dashboard_tool = load_tool('truenas-dashboard.py')
+
+        self.snapshots = self.snapshot_tool.SnapshotManager(config_path)
+        self.replication = self.replication_tool.ReplicationManager(config_path)
+        self.dashboard = self.dashboard_tool.TrueNASDashboard(config_path)
+
+        # The dataset with the most snapshots exercises the per-dataset paths hardest
+        counts: Dict[str, int] = {}
+        for snap in self.snapshots.get_snapshots():
+            counts[snap['dataset']] = counts.get(snap['dataset'], 0) + 1
+        self.busiest_dataset = max(counts, key=counts.get)
+
+    def invoke(self, cli, args: List[str]) -> str:
+        """Run a click command in-process and return its output"""
+        from click.testing import CliRunner
+        result = CliRunner().invoke(cli, ['--config', str(self.config_path)] + args, obj={})
+        if result.exit_code != 0:
+            raise RuntimeError(f"{' '.join(args)} failed: {result.output[-500:]}")
+        return result.output
+
+    def list_rows(self, args: List[str]) -> int:
+        """Run a snapshot listing as CSV, raising if it selected nothing"""
+        output = self.invoke(self.snapshot_tool.cli, ['list'] + args + ['--format', 'csv'])
+        rows = len(output.splitlines()) - 1
+        if rows < 1:
+            raise RuntimeError(f"list {' '.join(args)} selected no snapshots")
+        return rows
+
+
+def bench_snapshot_list(ctx: BenchmarkContext):
+    # --name-pattern is searched in the full dataset@name
+    ctx.list_rows([
+        '--dataset-pattern', '/', '--name-pattern', '@(auto|daily)-',
+        '--created-after', '2000-01-01', '--sort', 'size', '--reverse'
+    ])
+
+
+def bench_snapshot_query(ctx: BenchmarkContext):
+    # The documented query forms: a dataset prefix and a snapshot name prefix or pattern
+    pool = ctx.busiest_dataset.split('/')[0]
+    ctx.list_rows(['--query', f"dataset^{pool} and (name^auto- or name~^daily-) and age>1d"])
+
+
+def bench_bulk_delete_dry_run(ctx: BenchmarkContext):
+    ctx.invoke(ctx.snapshot_tool.cli, [
+        'bulk-delete', '--dataset', ctx.busiest_dataset, '--older-than', '30', '--dry-run', '--yes'
+    ])
+
+
+def bench_apply_retention_policy(ctx: BenchmarkContext):
+    ctx.snapshots.apply_retention_policy(
+        ctx.busiest_dataset, {'hourly': 24, 'daily': 7, 'weekly': 4, 'monthly': 12}, dry_run=True
+    )
+
+
+def bench_replication_history(ctx: BenchmarkContext):
+    ctx.replication.get_replication_history(days=30)
+
+
+def bench_replication_statistics(ctx: BenchmarkContext):
+    ctx.replication.get_replication_statistics()
+
+
+def bench_dashboard_frame(ctx: BenchmarkContext):
+    from rich.console import Console
+    layout = ctx.dashboard.create_layout()
+    ctx.dashboard.update_layout(layout)
+    Console(file=io.StringIO(), width=160, height=50).print(layout)
+
+
+BENCHMARKS: Dict[str, Callable[[BenchmarkContext], None]] = {
+    'snapshot_list': bench_snapshot_list,
+    'snapshot_query': bench_snapshot_query,
+    'bulk_delete_dry_run': bench_bulk_delete_dry_run,
+    'apply_retention_policy': bench_apply_retention_policy,
+    'replication_history': bench_replication_history,
+    'replication_statistics': bench_replication_statistics,
+    'dashboard_frame': bench_dashboard_frame,
+}
+
+
+def measure(func: Callable[[BenchmarkContext], None], ctx: BenchmarkContext,
+            server: FixtureProcess, repeat: int) -> Dict[str, float]:
+    """Best-of-N wall time, API calls per run and peak traced memory"""
+    func(ctx)  # warm-up: first-request and import costs are not part of the hot path
+
+    timings = []
+    calls = 0
+    for _ in range(repeat):
+        before = server.request_count()
+        start = time.perf_counter()
+        func(ctx)
+        timings.append(time.perf_counter() - start)
+        calls = server.request_count() - before
+
+    # Memory is traced in a separate run since tracemalloc slows execution down
+    tracemalloc.start()
+    func(ctx)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'wall_ms': min(timings) * 1000,
+        'median_ms': statistics.median(timings) * 1000,
+        'api_calls': calls,
+        'peak_mb': peak / 1024 ** 2,
+    }
+
+
+def run_scale(scale: str, names: List[str], repeat: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """Run the selected benchmarks against one generated data scale"""
+    results = {}
+    with FixtureProcess(SCALES[scale], seed=seed) as server, tempfile.TemporaryDirectory() as tmp:
+        config_path = Path(tmp) / 'config.json'
+        with open(config_path, 'w') as f:
+            json.dump({'host': 'fixture', 'api_key': 'benchmark', 'api_url': server.api_url}, f)
+
+        ctx = BenchmarkContext(config_path)
+        for name in names:
+            click.echo(f"  {scale}/{name}...", err=True)
+            results[name] = measure(BENCHMARKS[name], ctx, server, repeat)
+    return results
+
+
+def compare_results(results: Dict[str, Any], baseline: Dict[str, Any],
+                    tolerance: float) -> List[List[Any]]:
+    """Rows describing metrics that regressed beyond the tolerance"""
+    regressions = []
+    for scale, benches in results.items():
+        for name, metrics in benches.items():
+            base = baseline.get(scale, {}).get(name)
+            if not base:
+                continue
+            for metric in ('wall_ms', 'peak_mb'):
+                if metrics[metric] > base[metric] * (1 + tolerance):
+                    regressions.append([scale, name, metric, f"{base[metric]:.2f}", f"{metrics[metric]:.2f}"])
+            if metrics['api_calls'] > base['api_calls']:
+                regressions.append([scale, name, 'api_calls', base['api_calls'], metrics['api_calls']])
+    return regressions
+
+
+# ==================== Startup ====================
+
+def measure_startup(args: List[str], config_path: Path, repeat: int) -> Dict[str, Any]:
+    """Wall time of fresh interpreter runs of truenas.py, and the heavy modules they import"""
+    command = [str(SCRIPT_DIR / 'truenas.py'), '--config', str(config_path)] + args
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + command, stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=True)
+        timings.append(time.perf_counter() - start)
+
+    # -X importtime lists every module imported, one per line: 'import time: self | cumulative | name'
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + command,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    imported = {line.rsplit('|', 1)[-1].strip() for line in result.stderr.splitlines()
+                if line.startswith('import time:')}
+
+    return {
+        'wall_ms': min(timings) * 1000,
+        'median_ms': statistics.median(timings) * 1000,
+        'heavy_imports': [name for name in HEAVY_MODULES if name in imported],
+    }
+
+
+# ==================== CLI ====================
+
+@click.group()
+def cli():
+    """TrueNAS tools benchmark suite"""
+    pass
+
+
+@cli.command('run')
+@click.option('--scale', 'scales', multiple=True, type=click.Choice(list(SCALES)),
+              help='Data scale to run (repeatable, default: small and medium)')
+@click.option('--bench', 'benches', multiple=True, type=click.Choice(list(BENCHMARKS)),
+              help='Benchmark to run (repeatable, default: all)')
+@click.option('--repeat', type=int, default=3, help='Timed runs per benchmark (best is reported)')
+@click.option('--seed', type=int, default=0, help='Fixture generator seed')
+@click.option('--baseline', type=click.Path(dir_okay=False), default=str(DEFAULT_BASELINE),
+              help='Baseline results file')
+@click.option('--save-baseline', is_flag=True, help='Store these results as the new baseline')
+@click.option('--compare', is_flag=True, help='Fail if results regress against the baseline')
+@click.option('--tolerance', type=float, default=0.25, help='Allowed time/memory regression (fraction)')
+@click.option('--output', type=click.Path(dir_okay=False), help='Also write results as JSON')
+def run_benchmarks(scales, benches, repeat, seed, baseline, save_baseline, compare, tolerance, output):
+    """Run benchmarks at one or more data scales"""
+    scales = scales or ('small', 'medium')
+    names = list(benches) or list(BENCHMARKS)
+
+    results = {}
+    for scale in scales:
+        results[scale] = run_scale(scale, names, repeat, seed)
+
+    table_data = []
+    for scale, benches_run in results.items():
+        for name, metrics in benches_run.items():
+            table_data.append([
+                scale, name,
+                f"{metrics['wall_ms']:.1f}",
+                f"{metrics['median_ms']:.1f}",
+                metrics['api_calls'],
+                f"{metrics['peak_mb']:.1f}"
+            ])
+    click.echo(tabulate(table_data, headers=[
+        'Scale', 'Benchmark', 'Best (ms)', 'Median (ms)', 'API Calls', 'Peak (MB)'
+    ], tablefmt='grid'))
+
+    document = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'results': results,
+    }
+    if output:
+        with open(output, 'w') as f:
+            json.dump(document, f, indent=2)
+
+    baseline_path = Path(baseline)
+    if compare:
+        if not baseline_path.exists():
+            click.echo(f"\nNo baseline at {baseline_path}; run with --save-baseline first", err=True)
+            sys.exit(1)
+        with open(baseline_path, 'r') as f:
+            base = json.load(f)['results']
+        regressions = compare_results(results, base, tolerance)
+        if regressions:
+            click.echo(f"\nRegressions beyond {tolerance:.0%} tolerance:")
+            click.echo(tabulate(regressions, headers=[
+                'Scale', 'Benchmark', 'Metric', 'Baseline', 'Current'
+            ], tablefmt='grid'))
+            sys.exit(1)
+        click.echo(f"\nNo regressions against {baseline_path}")
+
+    if save_baseline:
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(document, f, indent=2)
+        click.echo(f"\nBaseline saved to: {baseline_path}")
+
+
+@cli.command('startup')
+@click.option('--repeat', type=int, default=10, help='Cold starts per case (best is reported)')
+@click.option('--target', type=float, default=DEFAULT_STARTUP_TARGET_MS,
+              help='Fail if any case\'s best cold start exceeds this (ms)')
+def run_startup(repeat, target):
+    """Time cold starts of the truenas entry point"""
+    results = {}
+    with FixtureProcess(STARTUP_FIXTURES) as server, tempfile.TemporaryDirectory() as tmp:
+        config_path = Path(tmp) / 'config.json'
+        with open(config_path, 'w') as f:
+            json.dump({'host': 'fixture', 'api_key': 'benchmark', 'api_url': server.api_url}, f)
+
+        for name, args in STARTUP_CASES.items():
+            click.echo(f"  startup/{name}...", err=True)
+            results[name] = measure_startup(args, config_path, repeat)
+
+    table_data = [[
+        name, ' '.join(STARTUP_CASES[name]),
+        f"{metrics['wall_ms']:.1f}",
+        f"{metrics['median_ms']:.1f}",
+        ', '.join(metrics['heavy_imports']) or '-'
+    ] for name, metrics in results.items()]
+    click.echo(tabulate(table_data, headers=[
+        'Case', 'Command', 'Best (ms)', 'Median (ms)', 'Heavy Imports'
+    ], tablefmt='grid'))
+
+    slow = [name for name, metrics in results.items() if metrics['wall_ms'] > target]
+    if slow:
+        click.echo(f"\nCold start over {target:.0f} ms target: {', '.join(slow)}")
+        sys.exit(1)
+    click.echo(f"\nAll cold starts within {target:.0f} ms target")
+
+
+@cli.command('scales')
+def list_scales():
+    """Show the data scales available"""
+    table_data = [[name] + [settings[k] for k in ('datasets', 'snapshots', 'replication_tasks', 'job_days')]
+                  for name, settings in SCALES.items()]
+    click.echo(tabulate(table_data, headers=[
+        'Scale', 'Datasets', 'Snapshots', 'Replication Tasks', 'Job Days'
+    ], tablefmt='grid'))
+
+
+if __name__ == '__main__':
+    cli()
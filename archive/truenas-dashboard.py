@@ -6,8 +6,12 @@ network throughput, service status, and recent snapshots.
 """
 
 import json
+import os
 import sys
 import time
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from datetime import datetime
 from typing import Optional, Dict, Any, List
@@ -23,6 +27,10 @@ from rich.progress import Progress, BarColumn, TextColumn
 from rich.text import Text
 from rich import box
 
+from truenas_profile import profiler
+from truenas_trace import tracer, TRACE_ENV
+from truenas_tree import DatasetTree
+
 # Disable SSL warnings
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -46,9 +54,23 @@ class TrueNASDashboard:
         self.host = self.config['host']
         self.api_key = self.config['api_key']
         self.verify_ssl = self.config.get('verify_ssl', False)
-        self.base_url = f"https://{self.host}/api/v2.0"
+        self.base_url = self.config.get('api_url', f"https://{self.host}/api/v2.0")
         self.console = Console()
 
+        # Request hedging: once a read has been outstanding for its endpoint's
+        # p95 latency, a duplicate is sent and whichever answers first wins.
+        # The budget caps hedges as a fraction of all requests.
+        self.hedge_enabled = self.config.get('hedge', False)
+        self.hedge_budget = self.config.get('hedge_budget', 0.1)
+        self.hedge_min_samples = self.config.get('hedge_min_samples', 10)
+        self._latencies = defaultdict(lambda: deque(maxlen=200))
+        self._hedge_lock = threading.Lock()
+        self._hedge_stats = {'requests': 0, 'hedged': 0, 'hedge_wins': 0, 'budget_denied': 0}
+        self._executor = None
+        self._frame = None  # trace span of the frame being built
+        # Kept across refreshes; each listing only re-rolls the datasets that changed
+        self.dataset_tree = DatasetTree()
+
     def _get_headers(self) -> Dict[str, str]:
         """Get request headers with authentication"""
         return {
@@ -56,21 +78,95 @@ class TrueNASDashboard:
             "Authorization": f"Bearer {self.api_key}"
         }
 
-    def _make_request(self, endpoint: str) -> Optional[Any]:
-        """Make API request with error handling"""
-        url = f"{self.base_url}/{endpoint}"
-        try:
+    def _fetch(self, endpoint: str, queued_at: Optional[float] = None) -> Any:
+        """Perform a single GET and record its latency"""
+        start = time.perf_counter()
+        with tracer.request('GET', endpoint, queued_at=queued_at, parent=self._frame) as span:
             response = requests.get(
-                url,
+                f"{self.base_url}/{endpoint}",
                 headers=self._get_headers(),
                 verify=self.verify_ssl,
                 timeout=5
             )
+            if span:
+                span.record_response(response)
             response.raise_for_status()
-            return response.json()
+        data = response.json()
+        with self._hedge_lock:
+            self._latencies[endpoint].append(time.perf_counter() - start)
+        return data
+
+    def _hedge_delay(self, endpoint: str) -> Optional[float]:
+        """p95 latency of an endpoint, or None until enough samples exist"""
+        with self._hedge_lock:
+            samples = sorted(self._latencies[endpoint])
+        if len(samples) < self.hedge_min_samples:
+            return None
+        return samples[int(0.95 * (len(samples) - 1))]
+
+    def _take_hedge_budget(self) -> bool:
+        """Reserve one hedge if the budget allows it"""
+        with self._hedge_lock:
+            if self._hedge_stats['hedged'] + 1 > self.hedge_budget * self._hedge_stats['requests']:
+                self._hedge_stats['budget_denied'] += 1
+                return False
+            self._hedge_stats['hedged'] += 1
+            return True
+
+    def _hedged_fetch(self, endpoint: str) -> Any:
+        """Fetch with a duplicate request once the p95 latency has passed"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='hedge')
+
+        primary = self._executor.submit(self._fetch, endpoint, time.perf_counter())
+        delay = self._hedge_delay(endpoint)
+        if delay is None:
+            return primary.result()
+
+        done, _ = wait([primary], timeout=delay)
+        if done or not self._take_hedge_budget():
+            return primary.result()
+
+        hedge = self._executor.submit(self._fetch, endpoint, time.perf_counter())
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        with self._hedge_lock:
+                            self._hedge_stats['hedge_wins'] += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _make_request(self, endpoint: str) -> Optional[Any]:
+        """Make API request with error handling"""
+        with self._hedge_lock:
+            self._hedge_stats['requests'] += 1
+        try:
+            if self.hedge_enabled:
+                return self._hedged_fetch(endpoint)
+            return self._fetch(endpoint)
         except Exception as e:
             return None
 
+    def get_hedge_metrics(self) -> Dict[str, Any]:
+        """Get request hedging counters and per-endpoint p95 latency"""
+        with self._hedge_lock:
+            stats = dict(self._hedge_stats)
+            endpoints = list(self._latencies)
+        requests_made = stats['requests']
+        stats['hedge_rate'] = stats['hedged'] / requests_made if requests_made else 0.0
+        stats['win_rate'] = stats['hedge_wins'] / stats['hedged'] if stats['hedged'] else 0.0
+        stats['p95_ms'] = {}
+        for endpoint in endpoints:
+            delay = self._hedge_delay(endpoint)
+            if delay is not None:
+                stats['p95_ms'][endpoint] = delay * 1000
+        return stats
+
     def get_system_info(self) -> Dict[str, Any]:
         """Get system information"""
         return self._make_request('system/info') or {}
@@ -81,10 +177,11 @@ class TrueNASDashboard:
 
     def get_datasets(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Get top datasets by usage"""
-        datasets = self._make_request('pool/dataset') or []
-        # Sort by used space
-        datasets.sort(key=lambda d: d.get('used', {}).get('parsed', 0), reverse=True)
-        return datasets[:limit]
+        datasets = self._make_request('pool/dataset')
+        if datasets is None:
+            return []
+        self.dataset_tree.refresh(datasets)
+        return [node.record for node in self.dataset_tree.largest(limit)]
 
     def get_snapshots(self, limit: int = 5) -> List[Dict[str, Any]]:
         """Get recent snapshots"""
@@ -399,6 +496,13 @@ class TrueNASDashboard:
         footer_text.append("Press ", style="dim")
         footer_text.append("Ctrl+C", style="bold red")
         footer_text.append(" to exit | Auto-refresh every 5 seconds", style="dim")
+        if self.hedge_enabled:
+            metrics = self.get_hedge_metrics()
+            footer_text.append(
+                f" | Hedged: {metrics['hedged']}/{metrics['requests']} "
+                f"({metrics['hedge_rate']:.1%}, {metrics['hedge_wins']} wins)",
+                style="dim"
+            )
         layout["footer"].update(Panel(footer_text, style="dim"))
 
     def run(self, refresh_interval: int = 5):
@@ -408,26 +512,63 @@ class TrueNASDashboard:
         try:
             with Live(layout, console=self.console, screen=True, refresh_per_second=1):
                 while True:
-                    self.update_layout(layout)
+                    with tracer.span('dashboard frame') as self._frame:
+                        self.update_layout(layout)
                     time.sleep(refresh_interval)
         except KeyboardInterrupt:
             self.console.print("\n[yellow]Dashboard stopped by user[/yellow]")
+            if self.hedge_enabled:
+                self.print_hedge_metrics()
+        finally:
+            # Drop queued hedges rather than waiting on requests nobody will read
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def print_hedge_metrics(self):
+        """Print hedging metrics for tuning the budget"""
+        metrics = self.get_hedge_metrics()
+        table = Table(title="Request Hedging", box=box.SIMPLE)
+        table.add_column("Endpoint", style="cyan")
+        table.add_column("p95", justify="right")
+        for endpoint, p95 in sorted(metrics['p95_ms'].items()):
+            table.add_row(endpoint, f"{p95:.0f} ms")
+        self.console.print(table)
+        self.console.print(
+            f"Requests: {metrics['requests']} | Hedged: {metrics['hedged']} ({metrics['hedge_rate']:.1%}) | "
+            f"Hedge wins: {metrics['hedge_wins']} ({metrics['win_rate']:.1%}) | "
+            f"Budget denied: {metrics['budget_denied']}"
+        )
 
 
-def main():
-    """Main entry point"""
+def main(argv: Optional[List[str]] = None):
+    """Main entry point; argv defaults to the command line"""
     import argparse
 
     parser = argparse.ArgumentParser(description="TrueNAS Real-time Dashboard")
     parser.add_argument('--config', type=str, help='Path to config file')
     parser.add_argument('--refresh', type=int, default=5, help='Refresh interval in seconds')
+    parser.add_argument('--hedge', action='store_true', help='Hedge slow reads with a duplicate request')
+    parser.add_argument('--hedge-budget', type=float, help='Maximum fraction of requests that may be hedged')
+    parser.add_argument('--trace', type=str, default=os.environ.get(TRACE_ENV),
+                        help=f"Write a Chrome trace of API calls to PATH and print a summary (or set {TRACE_ENV})")
+
+    parser.add_argument('--profile', type=str, metavar='PATH',
+                        help='Sample the dashboard and write collapsed stacks (flame graph input) to PATH')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    if args.trace:
+        tracer.enable(args.trace)
+    if args.profile:
+        profiler.start(args.profile)
 
     config_path = Path(args.config) if args.config else None
 
     try:
         dashboard = TrueNASDashboard(config_path)
+        if args.hedge:
+            dashboard.hedge_enabled = True
+        if args.hedge_budget is not None:
+            dashboard.hedge_budget = args.hedge_budget
         dashboard.run(refresh_interval=args.refresh)
     except FileNotFoundError as e:
         print(str(e), file=sys.stderr)
@@ -435,6 +576,9 @@ def main():
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
+    finally:
+        profiler.finish()
+        tracer.finish()
 
 
 if __name__ == '__main__':
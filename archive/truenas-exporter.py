@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Exporter - Prometheus metrics for pools, datasets, replication, alerts and disks
+Collectors run on their own refresh intervals in the background and keep their
+last rendered output; /metrics only concatenates those, so any number of
+scrapers costs the NAS nothing extra.
+
+    python truenas-exporter.py --port 9814 --interval datasets=300
+    curl http://localhost:9814/metrics
+    python truenas-exporter.py --once > /var/lib/node_exporter/truenas.prom
+"""
+
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple, Callable
+
+import click
+
+from truenas_cli import load_tool
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Default refresh interval per collector, in seconds
+DEFAULT_INTERVALS = {
+    'pools': 30,
+    'datasets': 60,
+    'replication': 60,
+    'alerts': 30,
+    'disks': 300,
+}
+
+REPLICATION_STATES = ['SUCCESS', 'RUNNING', 'PENDING', 'ERROR', 'FAILED', 'UNKNOWN']
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class MetricFamily:
+    """One metric name with its help text, type and labelled samples"""
+
+    def __init__(self, name: str, help_text: str, metric_type: str = 'gauge'):
+        self.name = name
+        self.help_text = help_text
+        self.metric_type = metric_type
+        self.samples: List[Tuple[Dict[str, Any], float]] = []
+
+    def add(self, value: float, **labels):
+        self.samples.append((labels, value))
+        return self
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        for labels, value in self.samples:
+            label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f"{self.name}{{{label_text}}} {_format(value)}" if label_text
+                         else f"{self.name} {_format(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# ==================== Collectors ====================
+
+def collect_pools(manager, threshold: int) -> List[MetricFamily]:
+    pools = manager.get_pools()
+    over = {alert['pool'] for alert in manager.check_pool_capacity(threshold, pools=pools)}
+
+    size = MetricFamily('truenas_pool_size_bytes', 'Pool size in bytes')
+    allocated = MetricFamily('truenas_pool_allocated_bytes', 'Pool allocated bytes')
+    free = MetricFamily('truenas_pool_free_bytes', 'Pool free bytes')
+    healthy = MetricFamily('truenas_pool_healthy', 'Whether the pool reports healthy')
+    status = MetricFamily('truenas_pool_status', 'Pool status (1 for the current status)')
+    alert = MetricFamily('truenas_pool_capacity_alert', f"Whether pool usage is at or over {threshold}%")
+
+    for pool in pools:
+        name = pool['name']
+        size.add(pool.get('size', 0), pool=name)
+        allocated.add(pool.get('allocated', 0), pool=name)
+        free.add(pool.get('free', pool.get('size', 0) - pool.get('allocated', 0)), pool=name)
+        healthy.add(1 if pool.get('healthy') else 0, pool=name)
+        status.add(1, pool=name, status=pool.get('status', 'UNKNOWN'))
+        alert.add(1 if name in over else 0, pool=name)
+
+    return [size, allocated, free, healthy, status, alert]
+
+
+def collect_datasets(manager) -> List[MetricFamily]:
+    used = MetricFamily('truenas_dataset_used_bytes', 'Dataset used bytes')
+    available = MetricFamily('truenas_dataset_available_bytes', 'Dataset available bytes')
+    encrypted = MetricFamily('truenas_dataset_encrypted', 'Whether the dataset is encrypted')
+
+    for ds in manager.get_datasets():
+        labels = {'dataset': ds['name'], 'pool': ds.get('pool', ds['name'].split('/')[0])}
+        used.add(ds.get('used', {}).get('parsed', 0), **labels)
+        available.add(ds.get('available', {}).get('parsed', 0), **labels)
+        encrypted.add(1 if ds.get('encrypted') else 0, **labels)
+
+    return [used, available, encrypted]
+
+
+def collect_replication(manager) -> List[MetricFamily]:
+    state = MetricFamily('truenas_replication_state', 'Replication task state (1 for the current state)')
+    enabled = MetricFamily('truenas_replication_enabled', 'Whether the replication task is enabled')
+    last_run = MetricFamily('truenas_replication_last_run_timestamp_seconds',
+                            'Unix time of the last replication run')
+
+    for task in manager.get_replication_status():
+        labels = {'task': task['id'], 'name': task['name']}
+        current = task['state'] if task['state'] in REPLICATION_STATES else 'UNKNOWN'
+        for name in REPLICATION_STATES:
+            state.add(1 if name == current else 0, state=name, **labels)
+        enabled.add(1 if task['enabled'] else 0, **labels)
+        if task['last_run']:
+            try:
+                last_run.add(datetime.fromisoformat(task['last_run']).timestamp(), **labels)
+            except (TypeError, ValueError):
+                pass
+
+    return [state, enabled, last_run]
+
+
+def collect_alerts(manager) -> List[MetricFamily]:
+    counts: Dict[str, int] = {}
+    for alert in manager.get_alerts():
+        level = alert.get('level', 'UNKNOWN')
+        counts[level] = counts.get(level, 0) + 1
+
+    alerts = MetricFamily('truenas_alerts', 'Active alerts by level')
+    for level in sorted(set(counts) | {'CRITICAL', 'WARNING', 'INFO'}):
+        alerts.add(counts.get(level, 0), level=level)
+    return [alerts]
+
+
+def collect_disks(manager) -> List[MetricFamily]:
+    size = MetricFamily('truenas_disk_size_bytes', 'Disk size in bytes')
+    for disk in manager.get_disk_info():
+        size.add(disk.get('size', 0), disk=disk.get('name', 'unknown'),
+                 model=disk.get('model', ''), serial=disk.get('serial', ''), type=disk.get('type', ''))
+    return [size]
+
+
+# ==================== Exporter ====================
+
+class Collector:
+    """Refreshes one group of metrics on its own interval and keeps the rendered text"""
+
+    def __init__(self, name: str, interval: float, collect: Callable[[], List[MetricFamily]]):
+        self.name = name
+        self.interval = interval
+        self.collect = collect
+        self.text = ''
+        self.success = False
+        self.duration = 0.0
+        self.last_success = 0.0
+        self.errors = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self):
+        """Run the collector once; failures keep the previous metrics"""
+        start = time.perf_counter()
+        try:
+            self.text = ''.join(family.render() for family in self.collect())
+            self.success = True
+            self.last_success = time.time()
+        except SystemExit:
+            # The manager exits on API errors (after reporting them); keep the thread alive
+            self._failed("API request failed")
+        except Exception as e:
+            self._failed(str(e))
+        self.duration = time.perf_counter() - start
+
+    def _failed(self, reason: str):
+        self.success = False
+        self.errors += 1
+        click.echo(f"Collector {self.name} failed: {reason}", err=True)
+
+    def _run(self):
+        while True:
+            self.refresh()
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"collector-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+class TrueNASExporter:
+    """Set of collectors and the exposition text built from their cached output"""
+
+    def __init__(self, manager, intervals: Dict[str, float], threshold: int = 80):
+        functions = {
+            'pools': lambda: collect_pools(manager, threshold),
+            'datasets': lambda: collect_datasets(manager),
+            'replication': lambda: collect_replication(manager),
+            'alerts': lambda: collect_alerts(manager),
+            'disks': lambda: collect_disks(manager),
+        }
+        self.collectors = [Collector(name, interval, functions[name]) for name, interval in intervals.items()]
+        self.scrapes = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        for collector in self.collectors:
+            collector.start()
+
+    def stop(self):
+        for collector in self.collectors:
+            collector.stop()
+
+    def refresh_all(self):
+        """Run every collector once, in parallel"""
+        threads = [threading.Thread(target=c.refresh) for c in self.collectors]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def render(self) -> str:
+        """Current exposition text; never calls the NAS"""
+        with self._lock:
+            self.scrapes += 1
+        success = MetricFamily('truenas_exporter_collector_success', 'Whether the last collection succeeded')
+        duration = MetricFamily('truenas_exporter_collector_duration_seconds', 'Duration of the last collection')
+        last = MetricFamily('truenas_exporter_collector_last_success_timestamp_seconds',
+                            'Unix time of the last successful collection')
+        errors = MetricFamily('truenas_exporter_collector_errors_total', 'Failed collections', 'counter')
+        interval = MetricFamily('truenas_exporter_collector_interval_seconds', 'Refresh interval')
+        for c in self.collectors:
+            success.add(1 if c.success else 0, collector=c.name)
+            duration.add(c.duration, collector=c.name)
+            last.add(c.last_success, collector=c.name)
+            errors.add(c.errors, collector=c.name)
+            interval.add(c.interval, collector=c.name)
+        scrapes = MetricFamily('truenas_exporter_scrapes_total', 'Scrapes served', 'counter').add(self.scrapes)
+
+        return ''.join(c.text for c in self.collectors) + ''.join(
+            family.render() for family in (success, duration, last, errors, interval, scrapes)
+        )
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Serves /metrics from the exporter's cache"""
+
+    def do_GET(self):
+        if self.path.split('?')[0] == '/metrics':
+            body = self.server.exporter.render().encode()
+            content_type = CONTENT_TYPE
+            status = 200
+        elif self.path == '/':
+            body = b'<html><body><h1>TrueNAS Exporter</h1><a href="/metrics">Metrics</a></body></html>'
+            content_type = 'text/html'
+            status = 200
+        else:
+            body = b'Not found\n'
+            content_type = 'text/plain'
+            status = 404
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_interval(value: str) -> Tuple[str, float]:
+    """Parse 'collector=seconds'"""
+    name, sep, seconds = value.partition('=')
+    if not sep or name not in DEFAULT_INTERVALS:
+        raise click.BadParameter(f"expected one of {', '.join(DEFAULT_INTERVALS)} as NAME=SECONDS, got '{value}'")
+    try:
+        return name, float(seconds)
+    except ValueError:
+        raise click.BadParameter(f"invalid seconds in '{value}'")
+
+
+@click.command()
+@click.option('--config', type=click.Path(), help='Path to config file')
+@click.option('--host', default='0.0.0.0', help='Address to bind')
+@click.option('--port', type=int, default=9814, help='Port to listen on')
+@click.option('--interval', 'intervals', multiple=True,
+              help=f"Collector refresh interval as NAME=SECONDS (repeatable; names: {', '.join(DEFAULT_INTERVALS)})")
+@click.option('--disable', 'disabled', multiple=True, type=click.Choice(list(DEFAULT_INTERVALS)),
+              help='Collector to turn off (repeatable)')
+@click.option('--threshold', type=int, default=80, help='Pool usage percent that raises truenas_pool_capacity_alert')
+@click.option('--once', is_flag=True, help='Collect once, print the metrics and exit (textfile collector use)')
+def main(config, host, port, intervals, disabled, threshold, once):
+    """Export TrueNAS metrics for Prometheus"""
+    settings = {name: float(seconds) for name, seconds in DEFAULT_INTERVALS.items() if name not in disabled}
+    for value in intervals:
+        name, seconds = parse_interval(value)
+        if name in settings:
+            settings[name] = seconds
+
+    manager_module = load_tool('truenas-manager.py')
+    try:
+        manager = manager_module.TrueNASManager(Path(config) if config else None)
+    except FileNotFoundError as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+
+    exporter = TrueNASExporter(manager, settings, threshold=threshold)
+    if once:
+        exporter.refresh_all()
+        click.echo(exporter.render(), nl=False)
+        sys.exit(0 if all(c.success for c in exporter.collectors) else 1)
+
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    server.exporter = exporter
+    exporter.start()
+
+    click.echo(f"Serving metrics at http://{host}:{server.server_address[1]}/metrics")
+    click.echo("Intervals: " + ', '.join(f"{name}={seconds:g}s" for name, seconds in settings.items()))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        click.echo("\nExporter stopped")
+    finally:
+        exporter.stop()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Fixture Server - Local stand-in for the TrueNAS SCALE REST API
+Replays recorded or synthesised /api/v2.0 responses for pool, dataset, snapshot,
+replication, job, disk, service and alert endpoints, with configurable latency,
+jitter and error injection, so the management tools can be exercised offline.
+
+Point any tool at it by setting "api_url" in the config file, e.g.:
+    python truenas-fixture-server.py --port 8080 --write-config ~/.truenas/fixture.json
+    python truenas-manager.py --config ~/.truenas/fixture.json pool list
+"""
+
+import json
+import random
+import ssl
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import urlsplit
+
+import click
+
+
+API_PREFIX = '/api/v2.0'
+
+# Endpoints served from fixtures. Collections hold a list of items addressable
+# by '<endpoint>/id/<id>'; the rest return a single JSON document.
+COLLECTIONS = [
+    'pool',
+    'pool/dataset',
+    'zfs/snapshot',
+    'replication',
+    'core/get_jobs',
+    'disk',
+    'service',
+    'alert/list',
+    'sharing/smb',
+    'user',
+]
+DOCUMENTS = [
+    'system/info',
+    'reporting/netdata',
+]
+ENDPOINTS = COLLECTIONS + DOCUMENTS
+
+
+# ==================== Fixture Data ====================
+
+def make_snapshot(dataset: str, name: str, creation: datetime, used: int = 0,
+                  written: int = 0, referenced: int = 0,
+                  user_properties: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Build a snapshot record in the shape returned by zfs/snapshot"""
+    properties = {
+        'creation': {'value': creation.isoformat(), 'parsed': int(creation.timestamp())},
+        'used': {'value': str(used), 'parsed': used},
+        'written': {'value': str(written), 'parsed': written},
+        'referenced': {'value': str(referenced), 'parsed': referenced},
+    }
+    for key, value in (user_properties or {}).items():
+        properties[key] = {'value': value, 'parsed': value, 'source': 'LOCAL'}
+
+    return {
+        'id': f"{dataset}@{name}",
+        'name': f"{dataset}@{name}",
+        'snapshot_name': name,
+        'dataset': dataset,
+        'pool': dataset.split('/')[0],
+        'type': 'SNAPSHOT',
+        'properties': properties,
+    }
+
+
+def make_dataset(name: str, used: int = 0, available: int = 0,
+                 compression: str = 'LZ4', **properties) -> Dict[str, Any]:
+    """Build a dataset record in the shape returned by pool/dataset"""
+    record = {
+        'id': name,
+        'name': name,
+        'pool': name.split('/')[0],
+        'type': 'FILESYSTEM',
+        'encrypted': False,
+        'used': {'value': str(used), 'parsed': used},
+        'available': {'value': str(available), 'parsed': available},
+        'compression': {'value': compression, 'parsed': compression.lower()},
+    }
+    for key, value in properties.items():
+        record[key] = {'value': str(value), 'parsed': value}
+    return record
+
+
+def default_fixtures(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Small synthesised fixture set used when no recording is available"""
+    now = now or datetime.now()
+    gib = 1024 ** 3
+
+    datasets = [
+        make_dataset('tank', 900 * gib, 2700 * gib),
+        make_dataset('tank/backups', 600 * gib, 2700 * gib),
+        make_dataset('tank/media', 250 * gib, 2700 * gib),
+        make_dataset('tank/home', 50 * gib, 2700 * gib),
+    ]
+
+    snapshots = []
+    for ds in ('tank/backups', 'tank/media', 'tank/home'):
+        for hours in range(0, 24 * 14, 6):
+            created = (now - timedelta(hours=hours)).replace(microsecond=0)
+            snapshots.append(make_snapshot(
+                ds, f"auto-{created.strftime('%Y-%m-%d_%H-%M')}", created,
+                used=(hours % 5) * 64 * 1024 ** 2, written=(hours % 7) * 32 * 1024 ** 2,
+                referenced=40 * gib
+            ))
+
+    replication = []
+    jobs = []
+    for task_id, (source, state) in enumerate(
+            [('tank/backups', 'SUCCESS'), ('tank/media', 'ERROR'), ('tank/home', 'SUCCESS')], 1):
+        last_run = (now - timedelta(hours=task_id)).replace(microsecond=0)
+        replication.append({
+            'id': task_id,
+            'name': f"{source.split('/')[-1]}-offsite",
+            'enabled': True,
+            'direction': 'PUSH',
+            'transport': 'SSH',
+            'source_datasets': [source],
+            'target_dataset': f"backup/{source.split('/')[-1]}",
+            'recursive': True,
+            'speed_limit': None,
+            'schedule': {'minute': '0', 'hour': '*/6', 'dom': '*', 'month': '*', 'dow': '*'},
+            'state': {'state': state, 'datetime': last_run.isoformat(), 'last_snapshot': None},
+            'job': {},
+        })
+        for run in range(8):
+            started = last_run - timedelta(hours=6 * run)
+            jobs.append({
+                'id': len(jobs) + 1,
+                'method': 'replication.run',
+                'arguments': [task_id],
+                'state': state if run == 0 else 'SUCCESS',
+                'time_started': {'$date': started.isoformat()},
+                'time_finished': {'$date': (started + timedelta(minutes=12)).isoformat()},
+            })
+
+    return {
+        'system/info': {
+            'hostname': 'baby-nas-fixture',
+            'version': 'TrueNAS-SCALE-24.04.2',
+            'uptime_seconds': 86400 * 12,
+            'system_product': 'Virtual Machine',
+            'system_manufacturer': 'Microsoft Corporation',
+        },
+        'pool': [{
+            'id': 1, 'name': 'tank', 'status': 'ONLINE', 'healthy': True,
+            'size': 3600 * gib, 'allocated': 900 * gib, 'free': 2700 * gib,
+        }],
+        'pool/dataset': datasets,
+        'zfs/snapshot': snapshots,
+        'replication': replication,
+        'core/get_jobs': jobs,
+        'disk': [
+            {'name': f"sd{letter}", 'model': 'Virtual Disk', 'size': 1800 * gib,
+             'type': 'HDD', 'serial': f"FIXTURE{idx:04d}"}
+            for idx, letter in enumerate('ab')
+        ],
+        'service': [
+            {'id': idx, 'service': name, 'state': 'RUNNING' if enabled else 'STOPPED', 'enable': enabled}
+            for idx, (name, enabled) in enumerate(
+                [('smb', True), ('nfs', False), ('ssh', True), ('cifs', True)], 1)
+        ],
+        'alert/list': [
+            {'level': 'WARNING', 'klass': 'ReplicationFailed',
+             'formatted': 'Replication "media-offsite" failed: connection reset by peer'},
+        ],
+        'sharing/smb': [
+            {'id': 1, 'name': 'backups', 'path': '/mnt/tank/backups', 'enabled': True, 'comment': ''},
+        ],
+        'user': [
+            {'id': 1, 'username': 'root', 'full_name': 'root', 'uid': 0,
+             'group': {'bsdgrp_group': 'wheel'}, 'smb': False},
+        ],
+        'reporting/netdata': {},
+    }
+
+
+class FixtureStore:
+    """
+    In-memory backing store for the fixture server
+
+    Endpoint payloads are kept as raw JSON bytes until something needs to look
+    inside them (an id lookup or a mutation), so replaying very large recorded
+    listings costs no re-encoding per request.
+    """
+
+    def __init__(self, data: Optional[Dict[str, Any]] = None):
+        self._lock = threading.Lock()
+        self._raw: Dict[str, bytes] = {}
+        self._parsed: Dict[str, Any] = {}
+        self._index: Dict[str, Dict[str, int]] = {}
+        for endpoint, payload in (data or {}).items():
+            self._parsed[endpoint] = payload
+
+    @classmethod
+    def from_directory(cls, path: Path, fill_defaults: bool = True) -> 'FixtureStore':
+        """
+        Load fixtures recorded as '<dir>/<endpoint>.json' files
+        (e.g. 'pool/dataset.json', 'core/get_jobs.json')
+        """
+        store = cls(default_fixtures() if fill_defaults else None)
+        for endpoint in ENDPOINTS:
+            fixture = path / f"{endpoint}.json"
+            if fixture.exists():
+                store._parsed.pop(endpoint, None)
+                store._raw[endpoint] = fixture.read_bytes()
+        return store
+
+    def endpoints(self) -> List[str]:
+        """Endpoints with data loaded"""
+        return sorted(set(self._raw) | set(self._parsed))
+
+    def _load(self, endpoint: str) -> Any:
+        """Parsed payload for an endpoint (caller holds the lock)"""
+        if endpoint not in self._parsed:
+            self._parsed[endpoint] = json.loads(self._raw.pop(endpoint))
+        return self._parsed[endpoint]
+
+    def _changed(self, endpoint: str):
+        """Drop derived state after a mutation (caller holds the lock)"""
+        self._raw.pop(endpoint, None)
+        self._index.pop(endpoint, None)
+
+    def _find(self, endpoint: str, item_id: str) -> Optional[int]:
+        """Position of an item in a collection (caller holds the lock)"""
+        if endpoint not in self._index:
+            self._index[endpoint] = {
+                str(item.get('id')): pos for pos, item in enumerate(self._load(endpoint))
+            }
+        return self._index[endpoint].get(item_id)
+
+    def get_raw(self, endpoint: str) -> Optional[bytes]:
+        """Encoded payload of a whole endpoint"""
+        with self._lock:
+            if endpoint in self._raw:
+                return self._raw[endpoint]
+            if endpoint not in self._parsed:
+                return None
+            self._raw[endpoint] = json.dumps(self._parsed[endpoint]).encode()
+            return self._raw[endpoint]
+
+    def get_item(self, endpoint: str, item_id: str) -> Optional[Dict[str, Any]]:
+        """Single item from a collection"""
+        with self._lock:
+            pos = self._find(endpoint, item_id)
+            return None if pos is None else self._load(endpoint)[pos]
+
+    def create(self, endpoint: str, body: Dict[str, Any]) -> Any:
+        """Add an item to a collection, mimicking TrueNAS create semantics"""
+        with self._lock:
+            items = self._load(endpoint)
+            created = []
+
+            if endpoint == 'zfs/snapshot':
+                now = datetime.now().replace(microsecond=0)
+                targets = [body['dataset']]
+                if body.get('recursive'):
+                    prefix = body['dataset'] + '/'
+                    targets += [d['name'] for d in self._load('pool/dataset')
+                                if d['name'].startswith(prefix)]
+                for dataset in targets:
+                    user_props = body.get('properties') or {}
+                    created.append(make_snapshot(dataset, body['name'], now,
+                                                 user_properties=user_props))
+            elif endpoint == 'pool/dataset':
+                created.append(make_dataset(body['name'], **{
+                    k: v for k, v in body.items() if k not in ('name',)
+                }))
+            else:
+                numeric = [i['id'] for i in items if isinstance(i.get('id'), int)]
+                created.append({'id': max(numeric, default=0) + 1, **body})
+
+            for item in created:
+                if self._find(endpoint, str(item['id'])) is not None:
+                    raise ValueError(f"{endpoint} '{item['id']}' already exists")
+            items.extend(created)
+            self._changed(endpoint)
+            return created[0]
+
+    def update(self, endpoint: str, item_id: str, body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Merge properties into an item"""
+        with self._lock:
+            pos = self._find(endpoint, item_id)
+            if pos is None:
+                return None
+            item = self._load(endpoint)[pos]
+            for key, value in body.items():
+                if key == 'user_properties_update':
+                    user = item.setdefault('user_properties', {})
+                    for prop in value:
+                        user[prop['key']] = {'value': prop['value'], 'parsed': prop['value'], 'source': 'LOCAL'}
+                elif isinstance(item.get(key), dict) and 'value' in item[key]:
+                    item[key] = {'value': value, 'parsed': value}
+                else:
+                    item[key] = value
+            self._changed(endpoint)
+            return item
+
+    def delete(self, endpoint: str, item_id: str) -> bool:
+        """Remove an item from a collection"""
+        with self._lock:
+            pos = self._find(endpoint, item_id)
+            if pos is None:
+                return False
+            del self._load(endpoint)[pos]
+            self._changed(endpoint)
+            return True
+
+    def action(self, endpoint: str, item_id: str, action: str, body: Dict[str, Any]) -> Tuple[int, Any]:
+        """Run an item action such as replication 'run' or snapshot 'clone'"""
+        if self.get_item(endpoint, item_id) is None:
+            return 404, {'message': f"{endpoint} '{item_id}' not found"}
+
+        if endpoint == 'replication' and action == 'run':
+            with self._lock:
+                jobs = self._load('core/get_jobs')
+                job_id = max((j['id'] for j in jobs), default=0) + 1
+                now = datetime.now().replace(microsecond=0).isoformat()
+                jobs.append({
+                    'id': job_id, 'method': 'replication.run', 'arguments': [int(item_id)],
+                    'state': 'SUCCESS', 'time_started': {'$date': now}, 'time_finished': {'$date': now},
+                })
+                self._changed('core/get_jobs')
+                task = self._load('replication')[self._find('replication', item_id)]
+                task['state'] = {'state': 'SUCCESS', 'datetime': now, 'last_snapshot': None}
+                self._changed('replication')
+            return 200, job_id
+
+        if endpoint == 'zfs/snapshot' and action == 'clone':
+            self.create('pool/dataset', {'name': body['dataset_dst'], 'origin': item_id})
+            return 200, True
+
+        if endpoint == 'zfs/snapshot' and action == 'rollback':
+            return 200, None
+
+        return 404, {'message': f"Unknown action '{action}' for {endpoint}"}
+
+
+# ==================== HTTP Server ====================
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """Routes /api/v2.0 requests to the fixture store"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'TrueNASFixture/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status: int, payload: Any = None, raw: Optional[bytes] = None):
+        body = raw if raw is not None else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self) -> Dict[str, Any]:
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def _route(self, path: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """Split a path into (endpoint, item id, action)"""
+        for endpoint in sorted(ENDPOINTS, key=len, reverse=True):
+            if path == endpoint:
+                return endpoint, None, None
+            if path.startswith(endpoint + '/id/'):
+                item_id = path[len(endpoint) + 4:]
+                for action in ('run', 'clone', 'rollback'):
+                    if item_id.endswith('/' + action):
+                        return endpoint, item_id[:-len(action) - 1], action
+                return endpoint, item_id, None
+        return None, None, None
+
+    def _handle(self, method: str):
+        server = self.server
+        path = urlsplit(self.path).path
+        if path == '/_fixture/stats':
+            return self._send(200, server.get_stats())
+
+        if not path.startswith(API_PREFIX + '/'):
+            return self._send(404, {'message': f"Not found: {path}"})
+        endpoint, item_id, action = self._route(path[len(API_PREFIX) + 1:].rstrip('/'))
+        body = self._read_body() if method in ('POST', 'PUT') else {}
+
+        if endpoint is None:
+            server.record(method, path)
+        elif item_id is None:
+            server.record(method, endpoint)
+        else:
+            server.record(method, f"{endpoint}/id/*" + (f"/{action}" if action else ''))
+        delay, fail = server.inject(endpoint)
+        if delay:
+            time.sleep(delay)
+        if fail:
+            return self._send(server.error_status, {'message': 'Injected fixture error'})
+        if endpoint is None:
+            return self._send(404, {'message': f"Unknown endpoint: {path}"})
+
+        store = server.store
+        try:
+            if method == 'GET' and item_id is None:
+                raw = store.get_raw(endpoint)
+                if raw is None:
+                    return self._send(404, {'message': f"No fixture for {endpoint}"})
+                return self._send(200, raw=raw)
+            if method == 'GET':
+                item = store.get_item(endpoint, item_id)
+                if item is None:
+                    return self._send(404, {'message': f"{endpoint} '{item_id}' not found"})
+                return self._send(200, item)
+            if method == 'POST' and action:
+                return self._send(*store.action(endpoint, item_id, action, body))
+            if method == 'POST' and item_id is None:
+                return self._send(200, store.create(endpoint, body))
+            if method == 'PUT' and item_id is not None:
+                item = store.update(endpoint, item_id, body)
+                if item is None:
+                    return self._send(404, {'message': f"{endpoint} '{item_id}' not found"})
+                return self._send(200, item)
+            if method == 'DELETE' and item_id is not None:
+                if not store.delete(endpoint, item_id):
+                    return self._send(404, {'message': f"{endpoint} '{item_id}' not found"})
+                return self._send(200, True)
+        except (KeyError, ValueError) as e:
+            return self._send(422, {'message': str(e)})
+
+        return self._send(405, {'message': f"{method} not supported on {endpoint}"})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server replaying fixtures with latency, jitter and errors
+
+    Per-endpoint overrides take the form {'pool/dataset': {'latency': 0.2}}.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, store: FixtureStore, host: str = '127.0.0.1', port: int = 0,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 500, overrides: Optional[Dict[str, Dict[str, float]]] = None,
+                 seed: Optional[int] = None, verbose: bool = False):
+        super().__init__((host, port), FixtureRequestHandler)
+        self.store = store
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.overrides = overrides or {}
+        self.verbose = verbose
+        self.scheme = 'http'
+        self._random = random.Random(seed)
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, int] = {}
+        self._thread = None
+
+    @property
+    def api_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"{self.scheme}://{host}:{port}{API_PREFIX}"
+
+    def enable_tls(self, certfile: str, keyfile: Optional[str] = None):
+        """Serve HTTPS with the given certificate"""
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        self.socket = context.wrap_socket(self.socket, server_side=True)
+        self.scheme = 'https'
+
+    def inject(self, endpoint: Optional[str]) -> Tuple[float, bool]:
+        """Delay and failure decision for one request"""
+        settings = self.overrides.get(endpoint or '', {})
+        latency = settings.get('latency', self.latency)
+        jitter = settings.get('jitter', self.jitter)
+        error_rate = settings.get('error_rate', self.error_rate)
+        with self._stats_lock:
+            delay = max(0.0, latency + self._random.uniform(-jitter, jitter))
+            fail = self._random.random() < error_rate
+        return delay, fail
+
+    def record(self, method: str, endpoint: str):
+        """Count a request for API call accounting"""
+        key = f"{method} {endpoint}"
+        with self._stats_lock:
+            self._stats[key] = self._stats.get(key, 0) + 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """Request counts by 'METHOD endpoint'"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        """Clear request counters"""
+        with self._stats_lock:
+            self._stats.clear()
+
+    def start(self) -> 'FixtureServer':
+        """Serve from a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop a server started with start()"""
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+
+def write_client_config(path: Path, api_url: str, api_key: str = 'fixture-api-key'):
+    """Write a tool config file pointing at a fixture server"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({
+            'host': urlsplit(api_url).netloc,
+            'api_key': api_key,
+            'verify_ssl': False,
+            'api_url': api_url,
+        }, f, indent=2)
+
+
+# ==================== CLI ====================
+
+def parse_override(value: str) -> Tuple[str, str, float]:
+    """Parse 'endpoint:setting=value' (e.g. 'pool/dataset:latency=250')"""
+    try:
+        endpoint, setting = value.split(':', 1)
+        key, number = setting.split('=', 1)
+        if key not in ('latency', 'jitter', 'error_rate'):
+            raise ValueError
+        return endpoint, key, float(number)
+    except ValueError:
+        raise click.BadParameter(f"Expected endpoint:latency|jitter|error_rate=N, got '{value}'")
+
+
+@click.command()
+@click.option('--fixtures', type=click.Path(exists=True, file_okay=False),
+              help='Directory of recorded <endpoint>.json fixtures')
+@click.option('--host', default='127.0.0.1', help='Address to bind')
+@click.option('--port', type=int, default=8080, help='Port to listen on (0 for any)')
+@click.option('--latency', type=float, default=0.0, help='Base response latency in milliseconds')
+@click.option('--jitter', type=float, default=0.0, help='Random +/- latency jitter in milliseconds')
+@click.option('--error-rate', type=float, default=0.0, help='Fraction of requests that fail (0-1)')
+@click.option('--error-status', type=int, default=500, help='HTTP status for injected errors')
+@click.option('--endpoint', 'overrides', multiple=True,
+              help="Per-endpoint override, e.g. 'alert/list:latency=800' (ms)")
+@click.option('--seed', type=int, help='Random seed for reproducible jitter and errors')
+@click.option('--certfile', type=click.Path(exists=True), help='Serve HTTPS with this certificate')
+@click.option('--keyfile', type=click.Path(exists=True), help='Private key for --certfile')
+@click.option('--write-config', type=click.Path(), help='Write a client config pointing at this server')
+@click.option('--verbose', is_flag=True, help='Log every request')
+def main(fixtures, host, port, latency, jitter, error_rate, error_status, overrides,
+         seed, certfile, keyfile, write_config, verbose):
+    """Serve recorded or synthesised TrueNAS API responses locally"""
+    if fixtures:
+        store = FixtureStore.from_directory(Path(fixtures))
+    else:
+        store = FixtureStore(default_fixtures())
+
+    endpoint_settings: Dict[str, Dict[str, float]] = {}
+    for value in overrides:
+        endpoint, key, number = parse_override(value)
+        endpoint_settings.setdefault(endpoint, {})[key] = number / 1000 if key != 'error_rate' else number
+
+    server = FixtureServer(
+        store, host=host, port=port,
+        latency=latency / 1000, jitter=jitter / 1000,
+        error_rate=error_rate, error_status=error_status,
+        overrides=endpoint_settings, seed=seed, verbose=verbose
+    )
+    if certfile:
+        server.enable_tls(certfile, keyfile)
+
+    if write_config:
+        write_client_config(Path(write_config).expanduser(), server.api_url)
+        click.echo(f"Client config written to: {write_config}")
+
+    click.echo(f"Serving {len(store.endpoints())} endpoints at {server.api_url}")
+    click.echo("Press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        click.echo("\nFixture server stopped")
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
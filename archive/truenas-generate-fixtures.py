@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Fixture Generator - Synthetic large-scale TrueNAS data
+Generates realistic pools, dataset hierarchies, snapshots with per-dataset
+creation cadences, and years of replication jobs in the JSON shapes consumed by
+TrueNASManager, SnapshotManager, ReplicationManager and TrueNASDashboard.
+
+Output is deterministic for a given --seed and --epoch. Files are written in
+the '<dir>/<endpoint>.json' layout served by truenas-fixture-server.py:
+    python truenas-generate-fixtures.py --out fixtures/large --datasets 10000 --snapshots 1000000
+    python truenas-fixture-server.py --fixtures fixtures/large
+"""
+
+import json
+import math
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+import click
+
+from truenas_cli import load_tool
+
+
+GIB = 1024 ** 3
+MIB = 1024 ** 2
+
+# (naming schema, interval in hours) for periodic snapshot tasks
+CADENCES = [
+    ('auto-%Y-%m-%d_%H-%M', 1),
+    ('auto-%Y-%m-%d_%H-%M', 6),
+    ('daily-%Y-%m-%d_%H-%M', 24),
+    ('weekly-%Y-%m-%d_%H-%M', 24 * 7),
+]
+CADENCE_WEIGHTS = [0.35, 0.2, 0.35, 0.1]
+
+CATEGORIES = ['backups', 'media', 'home', 'projects', 'vms', 'apps', 'archive', 'shares']
+SERVICES = ['smb', 'nfs', 'ssh', 'cifs', 'wireguard', 'iscsi', 'snmp', 'ups', 'ftp']
+
+
+fixture_server = load_tool('truenas-fixture-server.py')
+
+
+class FixtureGenerator:
+    """Seeded generator for synthetic TrueNAS API data"""
+
+    def __init__(self, seed: int = 0, epoch: Optional[datetime] = None,
+                 pools: int = 2, datasets: int = 200, snapshots: int = 10000,
+                 years: float = 1.0, replication_tasks: int = 20, job_days: int = 365):
+        self.seed = seed
+        self.epoch = (epoch or datetime.now()).replace(minute=0, second=0, microsecond=0)
+        self.pool_count = max(1, pools)
+        self.dataset_count = max(self.pool_count, datasets)
+        self.snapshot_count = snapshots
+        self.years = years
+        self.replication_task_count = replication_tasks
+        self.job_days = job_days
+        self._datasets: Optional[List[Dict[str, Any]]] = None
+
+    def _rng(self, stream: str) -> random.Random:
+        """Independent random stream so each endpoint is stable on its own"""
+        return random.Random(f"{self.seed}:{stream}")
+
+    # ==================== Pools and Datasets ====================
+
+    def pool_names(self) -> List[str]:
+        names = ['tank', 'backup', 'fast', 'cold']
+        return [names[i] if i < len(names) else f"pool{i}" for i in range(self.pool_count)]
+
+    def datasets(self) -> List[Dict[str, Any]]:
+        """Dataset hierarchy with used bytes rolled up from children"""
+        if self._datasets is not None:
+            return self._datasets
+
+        rng = self._rng('datasets')
+        names = list(self.pool_names())
+        children: Dict[str, List[str]] = {name: [] for name in names}
+
+        # Grow the tree by attaching each new dataset to a random existing one,
+        # biased towards shallow parents so depth stays realistic (2-6 levels)
+        while len(names) < self.dataset_count:
+            parent = names[min(int(rng.expovariate(1.0 / max(1, len(names) / 4))), len(names) - 1)]
+            if parent.count('/') >= 5:
+                parent = parent.split('/')[0]
+            if parent.count('/') == 0:
+                base = rng.choice(CATEGORIES)
+            else:
+                base = rng.choice(['data', 'db', 'logs', 'user', 'vol', 'cache', 'repo', 'share'])
+            name = f"{parent}/{base}{len(children[parent]):02d}"
+            children[parent].append(name)
+            children[name] = []
+            names.append(name)
+
+        self_used = {name: int(rng.lognormvariate(math.log(2 * GIB), 1.5)) for name in names}
+        snap_used = {name: int(self_used[name] * rng.uniform(0, 0.4)) for name in names}
+        total_used: Dict[str, int] = {}
+        child_used: Dict[str, int] = {}
+        for name in sorted(names, key=lambda n: n.count('/'), reverse=True):
+            child_used[name] = sum(total_used[c] for c in children[name])
+            total_used[name] = self_used[name] + snap_used[name] + child_used[name]
+
+        pool_size = {pool: int(total_used[pool] * rng.uniform(1.5, 4.0)) for pool in self.pool_names()}
+        records = []
+        for name in names:
+            pool = name.split('/')[0]
+            available = pool_size[pool] - total_used[pool]
+            records.append(fixture_server.make_dataset(
+                name,
+                used=total_used[name],
+                available=available,
+                compression=rng.choice(['LZ4', 'LZ4', 'ZSTD', 'OFF']),
+                usedbydataset=self_used[name],
+                usedbysnapshots=snap_used[name],
+                usedbychildren=child_used[name],
+                aclmode=rng.choice(['PASSTHROUGH', 'POSIX', 'DISCARD']),
+                aclinherit=rng.choice(['PASSTHROUGH', 'DISCARD']),
+                recordsize=rng.choice(['128K', '128K', '1M']),
+            ))
+        self._datasets = records
+        self._pool_size = pool_size
+        return records
+
+    def pools(self) -> List[Dict[str, Any]]:
+        datasets = {d['name']: d for d in self.datasets()}
+        pools = []
+        for idx, name in enumerate(self.pool_names(), 1):
+            allocated = datasets[name]['used']['parsed']
+            size = self._pool_size[name]
+            pools.append({
+                'id': idx, 'name': name, 'status': 'ONLINE', 'healthy': True,
+                'size': size, 'allocated': allocated, 'free': size - allocated,
+            })
+        return pools
+
+    # ==================== Snapshots ====================
+
+    def _snapshot_plan(self) -> List[Tuple[str, str, float, int]]:
+        """(dataset, naming schema, interval hours, count) for every dataset"""
+        rng = self._rng('snapshot-plan')
+        names = [d['name'] for d in self.datasets()]
+        span_hours = self.years * 365 * 24
+
+        # Skewed allocation: a few datasets carry most of the snapshots
+        weights = [rng.paretovariate(1.2) for _ in names]
+        total_weight = sum(weights)
+        plan = []
+        allocated = 0
+        for name, weight in zip(names, weights):
+            schema, interval = rng.choices(CADENCES, CADENCE_WEIGHTS)[0]
+            count = int(self.snapshot_count * weight / total_weight)
+            allocated += count
+            plan.append([name, schema, interval, count])
+        for entry in plan[:self.snapshot_count - allocated]:
+            entry[3] += 1
+
+        for entry in plan:
+            if entry[3] and entry[2] * entry[3] > span_hours:
+                entry[2] = span_hours / entry[3]
+        return [tuple(entry) for entry in plan]
+
+    def iter_snapshots(self) -> Iterator[Dict[str, Any]]:
+        """Stream snapshot records without holding them all in memory"""
+        rng = self._rng('snapshots')
+        datasets = {d['name']: d for d in self.datasets()}
+        for dataset, schema, interval, count in self._snapshot_plan():
+            rate = rng.lognormvariate(math.log(50 * MIB), 1.5)  # bytes written per hour
+            idle = rng.uniform(0.05, 0.6)  # share of intervals with no writes
+            referenced = datasets[dataset]['usedbydataset']['parsed']
+            seen = set()
+            for i in range(count):
+                created = self.epoch - timedelta(hours=interval * i, seconds=rng.randint(0, 90))
+                name = created.strftime(schema)
+                if name in seen:
+                    name = f"{name}-{i}"
+                seen.add(name)
+                if rng.random() < idle:
+                    written = 0
+                else:
+                    written = int(rate * interval * rng.lognormvariate(0, 0.8))
+                used = int(written * rng.betavariate(1.2, 3.0))
+                yield fixture_server.make_snapshot(
+                    dataset, name, created, used=used, written=written, referenced=referenced
+                )
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        return list(self.iter_snapshots())
+
+    # ==================== Replication ====================
+
+    def replication_tasks(self) -> List[Dict[str, Any]]:
+        rng = self._rng('replication')
+        candidates = [d['name'] for d in self.datasets() if d['name'].count('/') in (1, 2)]
+        tasks = []
+        for task_id in range(1, self.replication_task_count + 1):
+            source = rng.choice(candidates) if candidates else self.pool_names()[0]
+            interval = rng.choice([1, 6, 12, 24])
+            state = rng.choices(['SUCCESS', 'ERROR', 'RUNNING', 'PENDING'], [0.8, 0.1, 0.05, 0.05])[0]
+            last_run = self.epoch - timedelta(hours=rng.uniform(0, interval))
+            tasks.append({
+                'id': task_id,
+                'name': f"{source.replace('/', '-')}-repl{task_id}",
+                'enabled': rng.random() > 0.1,
+                'direction': 'PUSH',
+                'transport': 'SSH',
+                'source_datasets': [source],
+                'target_dataset': f"offsite/{source}",
+                'recursive': rng.random() > 0.5,
+                'speed_limit': rng.choice([None, None, 10240, 51200]),
+                'schedule': {'minute': '0', 'hour': f"*/{interval}", 'dom': '*', 'month': '*', 'dow': '*'},
+                'state': {
+                    'state': state,
+                    'datetime': None if state == 'PENDING' else last_run.replace(microsecond=0).isoformat(),
+                    'last_snapshot': None,
+                },
+                'job': {},
+                '_interval_hours': interval,
+            })
+        return tasks
+
+    def iter_jobs(self) -> Iterator[Dict[str, Any]]:
+        """Replication job history, newest first, with a sprinkling of other jobs"""
+        rng = self._rng('jobs')
+        job_id = 1
+        for task in self.replication_tasks():
+            interval = task['_interval_hours']
+            failure_rate = rng.uniform(0.0, 0.08)
+            for run in range(int(self.job_days * 24 / interval)):
+                started = self.epoch - timedelta(hours=interval * run, seconds=rng.randint(0, 300))
+                duration = timedelta(seconds=rng.lognormvariate(math.log(300), 1.0))
+                yield {
+                    'id': job_id,
+                    'method': 'replication.run',
+                    'arguments': [task['id']],
+                    'state': 'FAILED' if rng.random() < failure_rate else 'SUCCESS',
+                    'time_started': {'$date': started.replace(microsecond=0).isoformat()},
+                    'time_finished': {'$date': (started + duration).replace(microsecond=0).isoformat()},
+                }
+                job_id += 1
+                if rng.random() < 0.2:
+                    yield {
+                        'id': job_id,
+                        'method': rng.choice(['pool.scrub', 'zfs.snapshot.create', 'disk.sync_all']),
+                        'arguments': [],
+                        'state': 'SUCCESS',
+                        'time_started': {'$date': started.replace(microsecond=0).isoformat()},
+                        'time_finished': {'$date': started.replace(microsecond=0).isoformat()},
+                    }
+                    job_id += 1
+
+    # ==================== Everything Else ====================
+
+    def disks(self) -> List[Dict[str, Any]]:
+        rng = self._rng('disks')
+        disks = []
+        for idx in range(self.pool_count * 6):
+            disks.append({
+                'name': f"sd{chr(ord('a') + idx % 26)}{idx // 26 or ''}",
+                'model': rng.choice(['WDC WD120EFBX', 'ST12000VN0008', 'Samsung SSD 870']),
+                'size': rng.choice([4, 8, 12, 16]) * 1000 ** 4,
+                'type': rng.choice(['HDD', 'HDD', 'SSD']),
+                'serial': f"SYN{self.seed:03d}{idx:05d}",
+            })
+        return disks
+
+    def services(self) -> List[Dict[str, Any]]:
+        rng = self._rng('services')
+        services = []
+        for idx, name in enumerate(SERVICES, 1):
+            enabled = rng.random() > 0.3
+            services.append({
+                'id': idx, 'service': name, 'enable': enabled,
+                'state': 'RUNNING' if enabled and rng.random() > 0.05 else 'STOPPED',
+            })
+        return services
+
+    def alerts(self) -> List[Dict[str, Any]]:
+        rng = self._rng('alerts')
+        alerts = []
+        for task in self.replication_tasks():
+            if task['state']['state'] == 'ERROR':
+                alerts.append({'level': 'CRITICAL', 'klass': 'ReplicationFailed',
+                               'formatted': f"Replication \"{task['name']}\" failed: connection timed out"})
+        for pool in self.pools():
+            if pool['allocated'] / pool['size'] >= 0.6:
+                alerts.append({'level': 'WARNING', 'klass': 'ZpoolCapacityWarning',
+                               'formatted': f"Space usage for pool \"{pool['name']}\" is "
+                                            f"{pool['allocated'] / pool['size']:.0%}."})
+        if rng.random() < 0.5:
+            alerts.append({'level': 'INFO', 'klass': 'UpdateAvailable',
+                           'formatted': 'An update is available for TrueNAS SCALE.'})
+        return alerts
+
+    def system_info(self) -> Dict[str, Any]:
+        return {
+            'hostname': f"synthetic-nas-{self.seed}",
+            'version': 'TrueNAS-SCALE-24.04.2',
+            'uptime_seconds': 86400 * 47,
+            'system_product': 'Synthetic',
+            'system_manufacturer': 'Fixture Generator',
+        }
+
+    def streams(self) -> Dict[str, Any]:
+        """Endpoint -> payload, with large collections as iterators"""
+        return {
+            'system/info': self.system_info(),
+            'pool': self.pools(),
+            'pool/dataset': self.datasets(),
+            'zfs/snapshot': self.iter_snapshots(),
+            'replication': [self._public(t) for t in self.replication_tasks()],
+            'core/get_jobs': self.iter_jobs(),
+            'disk': self.disks(),
+            'service': self.services(),
+            'alert/list': self.alerts(),
+            'sharing/smb': [],
+            'user': [],
+            'reporting/netdata': {},
+        }
+
+    @staticmethod
+    def _public(task: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in task.items() if not k.startswith('_')}
+
+    def build(self) -> Dict[str, Any]:
+        """Fully materialised fixtures, e.g. for FixtureStore(data)"""
+        return {endpoint: payload if isinstance(payload, (list, dict)) else list(payload)
+                for endpoint, payload in self.streams().items()}
+
+    def write(self, out_dir: Path, progress=None) -> Dict[str, int]:
+        """Write '<endpoint>.json' files, streaming large collections"""
+        counts = {}
+        for endpoint, payload in self.streams().items():
+            path = out_dir / f"{endpoint}.json"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, 'w') as f:
+                if isinstance(payload, dict):
+                    json.dump(payload, f)
+                    counts[endpoint] = 1
+                else:
+                    count = 0
+                    f.write('[')
+                    for item in payload:
+                        if count:
+                            f.write(',\n')
+                        f.write(json.dumps(item))
+                        count += 1
+                    f.write(']')
+                    counts[endpoint] = count
+            if progress:
+                progress(endpoint, counts[endpoint])
+        return counts
+
+
+# ==================== CLI ====================
+
+@click.command()
+@click.option('--out', required=True, type=click.Path(file_okay=False), help='Output directory')
+@click.option('--seed', type=int, default=0, help='Random seed')
+@click.option('--epoch', help='Reference "now" for timestamps (ISO format, default: current hour)')
+@click.option('--pools', type=int, default=2, help='Number of pools')
+@click.option('--datasets', type=int, default=10000, help='Number of datasets (including pool roots)')
+@click.option('--snapshots', type=int, default=1000000, help='Total number of snapshots')
+@click.option('--years', type=float, default=3.0, help='Snapshot history span in years')
+@click.option('--replication-tasks', type=int, default=50, help='Number of replication tasks')
+@click.option('--job-days', type=int, default=3 * 365, help='Days of replication job history')
+def main(out, seed, epoch, pools, datasets, snapshots, years, replication_tasks, job_days):
+    """Generate synthetic TrueNAS fixtures at scale"""
+    generator = FixtureGenerator(
+        seed=seed,
+        epoch=datetime.fromisoformat(epoch) if epoch else None,
+        pools=pools, datasets=datasets, snapshots=snapshots, years=years,
+        replication_tasks=replication_tasks, job_days=job_days
+    )
+    click.echo(f"Generating fixtures in {out} (seed {seed}, epoch {generator.epoch.isoformat()})")
+    generator.write(Path(out), progress=lambda endpoint, count: click.echo(f"  {endpoint}: {count}"))
+    click.echo(f"\nServe with: python truenas-fixture-server.py --fixtures {out}")
+
+
+if __name__ == '__main__':
+    main()
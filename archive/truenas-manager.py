@@ -9,37 +9,53 @@ import os
 import sys
 import json
 import click
-import requests
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import TYPE_CHECKING, Callable, Optional, Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from tabulate import tabulate
-import urllib3
 
-# Disable SSL warnings for self-signed certificates
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from truenas_cli import LazyObject, defer_client, not_found, request_errors, send_request, tabulate
+from truenas_journal import Journal, JournalError, journal_name, run_journal
+from truenas_output import Column, gigabytes, yes_no, output_options, write_rows
+from truenas_profile import profile_option
+from truenas_ssh import SSHError, runner_from_config
+from truenas_trace import tracer, trace_option, TracedGroup
+from truenas_tree import DatasetNode, DatasetTree
+from truenas_zfs import ZFSBackend
+
+if TYPE_CHECKING:
+    import requests
 
 
 class TrueNASManager:
     """TrueNAS SCALE Management Client"""
 
-    def __init__(self, config_path: Optional[Path] = None):
-        if config_path is None:
-            config_path = Path.home() / ".truenas" / "config.json"
+    def __init__(self, config_path: Optional[Path] = None, backend: Optional[str] = None,
+                 config: Optional[Dict[str, Any]] = None):
+        if config is not None:
+            # Already-loaded settings (host, api_key, ...) from a script with its own configuration
+            self.config = config
+        else:
+            if config_path is None:
+                config_path = Path.home() / ".truenas" / "config.json"
 
-        if not config_path.exists():
-            raise FileNotFoundError(
-                f"Configuration not found at {config_path}\n"
-                "Run 'python truenas-api-setup.py --setup' first"
-            )
+            if not config_path.exists():
+                raise FileNotFoundError(
+                    f"Configuration not found at {config_path}\n"
+                    "Run 'python truenas-api-setup.py --setup' first"
+                )
 
-        with open(config_path, 'r') as f:
-            self.config = json.load(f)
+            with open(config_path, 'r') as f:
+                self.config = json.load(f)
 
         self.host = self.config['host']
         self.api_key = self.config['api_key']
         self.verify_ssl = self.config.get('verify_ssl', False)
-        self.base_url = f"https://{self.host}/api/v2.0"
+        self.base_url = self.config.get('api_url', f"https://{self.host}/api/v2.0")
+        # Bulk listings: 'api' (REST) or 'zfs' (zfs list over SSH, see truenas_zfs)
+        self.backend = backend or self.config.get('listing_backend', 'api')
+        self._zfs: Optional[ZFSBackend] = None
+        self._tree: Optional[DatasetTree] = None
 
     def _get_headers(self) -> Dict[str, str]:
         """Get request headers with authentication"""
@@ -48,18 +64,28 @@ class TrueNASManager:
             "Authorization": f"Bearer {self.api_key}"
         }
 
-    def _make_request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
-        """Make API request with error handling"""
+    def _request(self, method: str, endpoint: str, **kwargs) -> 'requests.Response':
+        """Make API request, raising on failure (for callers that recover, e.g. per-item in bulk runs)"""
         url = f"{self.base_url}/{endpoint}"
         kwargs.setdefault('headers', self._get_headers())
         kwargs.setdefault('verify', self.verify_ssl)
         kwargs.setdefault('timeout', 30)
 
-        try:
-            response = requests.request(method, url, **kwargs)
+        with tracer.request(method, endpoint) as span:
+            response = send_request(method, url, **kwargs)
+            if span:
+                span.record_response(response)
             response.raise_for_status()
-            return response
-        except requests.exceptions.RequestException as e:
+        return response
+
+    def _make_request(self, method: str, endpoint: str, missing_ok: bool = False,
+                      **kwargs) -> Optional['requests.Response']:
+        """Make API request with error handling (with missing_ok, a 404 returns None)"""
+        try:
+            return self._request(method, endpoint, **kwargs)
+        except request_errors() as e:
+            if missing_ok and not_found(e):
+                return None
             click.echo(f"Error: API request failed: {e}", err=True)
             sys.exit(1)
 
@@ -78,9 +104,11 @@ class TrueNASManager:
                 return pool
         raise ValueError(f"Pool '{pool_name}' not found")
 
-    def check_pool_capacity(self, threshold: int = 80) -> List[Dict[str, Any]]:
-        """Check pools for capacity alerts"""
-        pools = self.get_pools()
+    def check_pool_capacity(self, threshold: int = 80,
+                            pools: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Check pools for capacity alerts (pools: already fetched pool list, to skip the API call)"""
+        if pools is None:
+            pools = self.get_pools()
         alerts = []
 
         for pool in pools:
@@ -101,16 +129,60 @@ class TrueNASManager:
 
     # ==================== Dataset Management ====================
 
+    def _zfs_listing(self, listing: Callable[[ZFSBackend], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Run a listing on the zfs backend, exiting on failure as API requests do"""
+        if self._zfs is None:
+            self._zfs = ZFSBackend(runner_from_config(self.config))
+        try:
+            return listing(self._zfs)
+        except SSHError as e:
+            click.echo(f"Error: zfs list failed: {e}", err=True)
+            sys.exit(1)
+
     def get_datasets(self, pool_name: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all datasets, optionally filtered by pool"""
-        response = self._make_request('GET', 'pool/dataset')
-        datasets = response.json()
+        if self.backend == 'zfs':
+            datasets = self._zfs_listing(lambda zfs: zfs.datasets())
+        else:
+            datasets = self._make_request('GET', 'pool/dataset').json()
 
         if pool_name:
             datasets = [d for d in datasets if d['name'].startswith(pool_name)]
 
         return datasets
 
+    def get_dataset_tree(self, refresh: bool = False) -> DatasetTree:
+        """
+        Every dataset as a hierarchy with usage rollups (see truenas_tree). The
+        tree is listed once and then kept current by the dataset methods below;
+        refresh re-lists and updates only the datasets that changed.
+        """
+        if self._tree is None:
+            self._tree = DatasetTree(self.get_datasets())
+        elif refresh:
+            self._tree.refresh(self.get_datasets())
+        return self._tree
+
+    def _tree_update(self, record: Any):
+        """Fold a dataset record returned by a write into the cached tree"""
+        if self._tree is not None and isinstance(record, dict) and 'name' in record:
+            self._tree.update(record)
+
+    def _tree_refresh_ancestors(self, name: str):
+        """
+        Re-fetch the cached ancestors of a created or deleted dataset: ZFS counts
+        it in every ancestor's 'used', so their records are stale afterwards
+        """
+        if self._tree is None:
+            return
+        parent = name.rpartition('/')[0]
+        while parent:
+            if parent in self._tree:
+                response = self._make_request('GET', f'pool/dataset/id/{parent}', missing_ok=True)
+                if response is not None:
+                    self._tree.update(response.json())
+            parent = parent.rpartition('/')[0]
+
     def create_dataset(self, path: str, properties: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Create a new dataset"""
         data = {'name': path}
@@ -118,23 +190,110 @@ class TrueNASManager:
             data.update(properties)
 
         response = self._make_request('POST', 'pool/dataset', json=data)
-        return response.json()
+        result = response.json()
+        self._tree_update(result)
+        self._tree_refresh_ancestors(path)
+        return result
 
-    def delete_dataset(self, dataset_id: str, recursive: bool = False) -> bool:
-        """Delete a dataset"""
+    def delete_dataset(self, dataset_id: str, recursive: bool = False, missing_ok: bool = False) -> bool:
+        """Delete a dataset (with missing_ok, returns False if it was already gone)"""
         params = {'recursive': recursive}
-        self._make_request('DELETE', f'pool/dataset/id/{dataset_id}', params=params)
-        return True
-
-    def set_dataset_properties(self, dataset_id: str, properties: Dict[str, Any]) -> Dict[str, Any]:
-        """Set dataset properties"""
-        response = self._make_request('PUT', f'pool/dataset/id/{dataset_id}', json=properties)
-        return response.json()
+        deleted = self._make_request('DELETE', f'pool/dataset/id/{dataset_id}', missing_ok, params=params) is not None
+        if self._tree is not None:
+            self._tree.remove(dataset_id)
+            self._tree_refresh_ancestors(dataset_id)
+        return deleted
+
+    def set_dataset_properties(self, dataset_id: str, properties: Dict[str, Any],
+                               force: bool = False) -> Dict[str, Any]:
+        """Set dataset properties (force sends ?force=true, as the setup scripts do)"""
+        params = {'force': 'true'} if force else None
+        response = self._make_request('PUT', f'pool/dataset/id/{dataset_id}', json=properties, params=params)
+        result = response.json()
+        self._tree_update(result)
+        return result
+
+    @staticmethod
+    def dataset_property_changes(dataset: Dict[str, Any], desired: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        The desired properties a dataset record does not already have. Values
+        compare case-insensitively against the record's value, rawvalue and
+        parsed forms, since the API reports e.g. aclmode 'POSIX' for 'posix'.
+        """
+        changes = {}
+        for prop, wanted in desired.items():
+            current = dataset.get(prop)
+            if isinstance(current, dict):
+                have = {str(current[k]).lower() for k in ('value', 'rawvalue', 'parsed') if k in current}
+            else:
+                have = {str(current).lower()} if current is not None else set()
+            if str(wanted).lower() not in have:
+                changes[prop] = wanted
+        return changes
+
+    def reconcile_dataset_properties(self, desired: Dict[str, Any],
+                                     datasets: Optional[List[Dict[str, Any]]] = None, workers: int = 8,
+                                     force: bool = False, dry_run: bool = False,
+                                     on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Bring datasets (records; default every dataset) to the desired
+        properties. Only datasets that differ are updated, with only the
+        properties that differ, by up to `workers` concurrent requests; a
+        failed update is recorded and the rest carry on.
+
+        Returns counts of 'changed', 'unchanged' and 'failed' datasets and
+        'results': [{'dataset', 'changes', 'status', 'error'}] in completion
+        order (status 'changed', 'unchanged', 'failed' or, with dry_run,
+        'would change'). on_result is called with each result as it arrives.
+        """
+        if datasets is None:
+            datasets = self.get_datasets()
+        results = []
+        summary = {'changed': 0, 'unchanged': 0, 'failed': 0}
+
+        def record(result: Dict[str, Any]):
+            results.append(result)
+            summary[result['status'] if result['status'] != 'would change' else 'changed'] += 1
+            if on_result:
+                on_result(result)
+
+        pending = []
+        for ds in datasets:
+            changes = self.dataset_property_changes(ds, desired)
+            if not changes:
+                record({'dataset': ds['name'], 'changes': {}, 'status': 'unchanged', 'error': None})
+            elif dry_run:
+                record({'dataset': ds['name'], 'changes': changes, 'status': 'would change', 'error': None})
+            else:
+                pending.append((ds, changes))
+
+        def update(ds: Dict[str, Any], changes: Dict[str, Any]) -> Dict[str, Any]:
+            result = {'dataset': ds['name'], 'changes': changes, 'status': 'changed', 'error': None}
+            try:
+                response = self._request('PUT', f"pool/dataset/id/{ds['id']}", json=changes,
+                                         params={'force': 'true'} if force else None)
+                result['record'] = response.json()
+            except request_errors() as e:
+                result.update(status='failed', error=str(e))
+            return result
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending)))) as pool:
+                futures = [pool.submit(update, ds, changes) for ds, changes in pending]
+                for future in as_completed(futures):
+                    result = future.result()
+                    # Fold into the cached tree here, on one thread
+                    self._tree_update(result.pop('record', None))
+                    record(result)
+
+        return dict(summary, results=results)
 
     # ==================== Snapshot Management ====================
 
     def get_snapshots(self, dataset: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all snapshots, optionally filtered by dataset"""
+        if self.backend == 'zfs':
+            return self._zfs_listing(lambda zfs: zfs.snapshots(dataset))
         response = self._make_request('GET', 'zfs/snapshot')
         snapshots = response.json()
 
@@ -218,10 +377,9 @@ class TrueNASManager:
         response = self._make_request('POST', 'sharing/smb', json=data)
         return response.json()
 
-    def delete_smb_share(self, share_id: int) -> bool:
-        """Delete an SMB share"""
-        self._make_request('DELETE', f'sharing/smb/id/{share_id}')
-        return True
+    def delete_smb_share(self, share_id: int, missing_ok: bool = False) -> bool:
+        """Delete an SMB share (with missing_ok, returns False if it was already gone)"""
+        return self._make_request('DELETE', f'sharing/smb/id/{share_id}', missing_ok) is not None
 
     def update_smb_share(self, share_id: int, properties: Dict[str, Any]) -> Dict[str, Any]:
         """Update SMB share properties"""
@@ -274,20 +432,50 @@ class TrueNASManager:
         return response.json()
 
 
+# ==================== CLI Helpers ====================
+
+def start_journal(operation: str, items: List[Dict[str, Any]], resume: bool, discard: bool = False,
+                  **params) -> Journal:
+    """
+    A new journal holding the plan (refusing to replace an interrupted run's
+    unless discard), or with --resume the interrupted run's journal
+    """
+    journal = Journal(journal_name(operation))
+    if resume:
+        try:
+            journal.load()
+        except JournalError as e:
+            click.echo(f"Error: {e}", err=True)
+            sys.exit(1)
+        click.echo(f"Resuming {operation} started {journal.started}: {journal.completed} done, "
+                   f"{len(journal.items)} left")
+    elif not items:
+        click.echo("Error: nothing to delete (give IDs or --resume)", err=True)
+        sys.exit(1)
+    else:
+        try:
+            journal.begin(operation, items, discard, **params)
+        except JournalError as e:
+            click.echo(f"Error: {e}", err=True)
+            sys.exit(1)
+    return journal
+
+
 # ==================== CLI Commands ====================
 
-@click.group()
+@click.group(cls=TracedGroup)
 @click.option('--config', type=click.Path(), help='Path to config file')
+@click.option('--backend', type=click.Choice(['api', 'zfs']),
+              help="Snapshot/dataset listings from the REST API or 'zfs list' over SSH "
+                   "(default: the config's listing_backend, else api)")
+@trace_option
+@profile_option
 @click.pass_context
-def cli(ctx, config):
+def cli(ctx, config, backend):
     """TrueNAS Manager - Comprehensive management tool"""
-    ctx.ensure_object(dict)
-    config_path = Path(config) if config else None
-    try:
-        ctx.obj['manager'] = TrueNASManager(config_path)
-    except FileNotFoundError as e:
-        click.echo(str(e), err=True)
-        sys.exit(1)
+    obj = ctx.ensure_object(LazyObject)
+    config_path = Path(config) if config else obj.get('config_path')
+    defer_client(ctx, 'manager', lambda: TrueNASManager(config_path, backend))
 
 
 # ==================== Pool Commands ====================
@@ -298,33 +486,40 @@ def pool():
     pass
 
 
+POOL_COLUMNS = [
+    Column('Pool', 'name'),
+    Column('Status', 'status'),
+    Column('Size', 'size', gigabytes(1)),
+    Column('Used', 'allocated', gigabytes(1)),
+    Column('Free', 'free', gigabytes(1)),
+    Column('Usage', 'usage_pct', lambda v: f"{v:.1f}%"),
+    Column('Healthy', 'healthy', yes_no),
+]
+
+
 @pool.command('list')
+@output_options
 @click.pass_context
-def pool_list(ctx):
+def pool_list(ctx, output_format, page_size):
     """List all storage pools"""
     manager = ctx.obj['manager']
     pools = manager.get_pools()
 
-    table_data = []
-    for p in pools:
-        size_gb = p.get('size', 0) / (1024**3)
-        allocated_gb = p.get('allocated', 0) / (1024**3)
-        free_gb = size_gb - allocated_gb
-        usage_pct = (allocated_gb / size_gb * 100) if size_gb > 0 else 0
-
-        table_data.append([
-            p['name'],
-            p.get('status', 'UNKNOWN'),
-            f"{size_gb:.1f} GB",
-            f"{allocated_gb:.1f} GB",
-            f"{free_gb:.1f} GB",
-            f"{usage_pct:.1f}%",
-            'Yes' if p.get('healthy') else 'No'
-        ])
+    def rows():
+        for p in pools:
+            size = p.get('size', 0)
+            allocated = p.get('allocated', 0)
+            yield {
+                'name': p['name'],
+                'status': p.get('status', 'UNKNOWN'),
+                'size': size,
+                'allocated': allocated,
+                'free': size - allocated,
+                'usage_pct': (allocated / size * 100) if size > 0 else 0,
+                'healthy': bool(p.get('healthy')),
+            }
 
-    click.echo(tabulate(table_data, headers=[
-        'Pool', 'Status', 'Size', 'Used', 'Free', 'Usage', 'Healthy'
-    ], tablefmt='grid'))
+    write_rows(rows(), POOL_COLUMNS, output_format, page_size)
 
 
 @pool.command('status')
@@ -377,31 +572,76 @@ def dataset():
     pass
 
 
+DATASET_COLUMNS = [
+    Column('Dataset', 'name'),
+    Column('Used', 'used', gigabytes()),
+    Column('Available', 'available', gigabytes()),
+    Column('Compression', 'compression'),
+    Column('Type', 'type'),
+]
+
+
+DATASET_TREE_COLUMNS = [
+    Column('Dataset', 'label'),
+    Column('Used', 'used', gigabytes()),
+    Column('Available', 'available', gigabytes()),
+    Column('Snapshots', 'snapshots', gigabytes()),
+    Column('Datasets', 'datasets'),
+    Column('Compression', 'compression'),
+]
+
+
+def tree_rows(nodes: List[DatasetNode]) -> List[Dict[str, Any]]:
+    """
+    Rows for a tree walk: names indented by depth ('· ' per level, since tables
+    strip leading spaces) and usage rolled up over each subtree
+    """
+    base = min((node.depth for node in nodes), default=0)
+    return [{
+        'name': node.name,
+        'label': '· ' * (node.depth - base) + (node.name if node.depth == base else node.short_name),
+        'depth': node.depth,
+        'used': node.total_used,
+        'available': node.min_available,
+        'snapshots': node.total_snapshots,
+        'datasets': node.datasets,
+        'compression': (node.record or {}).get('compression', {}).get('value', 'N/A'),
+    } for node in nodes]
+
+
 @dataset.command('list')
 @click.option('--pool', help='Filter by pool name')
+@click.option('--tree', 'as_tree', is_flag=True,
+              help='Show the hierarchy with used, tightest available and snapshot space rolled up per subtree')
+@click.option('--depth', type=int, help='With --tree, stop this many levels below the pools')
+@click.option('--top', type=int, help='With --tree, only the N largest children of each dataset')
+@output_options
 @click.pass_context
-def dataset_list(ctx, pool):
+def dataset_list(ctx, pool, as_tree, depth, top, output_format, page_size):
     """List all datasets"""
     manager = ctx.obj['manager']
+    if as_tree:
+        tree = manager.get_dataset_tree()
+        roots = [tree.get(pool)] if pool in tree else [] if pool else [None]
+        nodes = [node for root in roots for node in tree.walk(root, max_depth=depth, top=top)]
+        columns = DATASET_TREE_COLUMNS
+        if output_format != 'table':
+            # Data formats carry the full name and depth rather than the indented label
+            columns = [Column('Dataset', 'name'), Column('Depth', 'depth')] + columns[1:]
+        write_rows(tree_rows(nodes), columns, output_format, page_size)
+        return
+
     datasets = manager.get_datasets(pool)
 
-    table_data = []
-    for ds in datasets:
-        used_gb = ds.get('used', {}).get('parsed', 0) / (1024**3)
-        available_gb = ds.get('available', {}).get('parsed', 0) / (1024**3)
-        compression = ds.get('compression', {}).get('value', 'N/A')
+    rows = ({
+        'name': ds['name'],
+        'used': ds.get('used', {}).get('parsed', 0),
+        'available': ds.get('available', {}).get('parsed', 0),
+        'compression': ds.get('compression', {}).get('value', 'N/A'),
+        'type': ds.get('type', 'N/A'),
+    } for ds in datasets)
 
-        table_data.append([
-            ds['name'],
-            f"{used_gb:.2f} GB",
-            f"{available_gb:.2f} GB",
-            compression,
-            ds.get('type', 'N/A')
-        ])
-
-    click.echo(tabulate(table_data, headers=[
-        'Dataset', 'Used', 'Available', 'Compression', 'Type'
-    ], tablefmt='grid'))
+    write_rows(rows, DATASET_COLUMNS, output_format, page_size)
 
 
 @dataset.command('create')
@@ -425,18 +665,65 @@ def dataset_create(ctx, path, compression, quota):
 
 
 @dataset.command('delete')
-@click.argument('dataset_id')
+@click.argument('dataset_ids', nargs=-1)
 @click.option('--recursive', is_flag=True, help='Delete recursively')
+@click.option('--resume', is_flag=True, help='Finish an interrupted multi-dataset delete from its journal')
+@click.option('--discard-journal', is_flag=True, help="Start over, dropping an interrupted delete's journal")
 @click.confirmation_option(prompt='Are you sure you want to delete this dataset?')
 @click.pass_context
-def dataset_delete(ctx, dataset_id, recursive):
-    """Delete a dataset"""
+def dataset_delete(ctx, dataset_ids, recursive, resume, discard_journal):
+    """Delete one or more datasets"""
     manager = ctx.obj['manager']
-    try:
-        manager.delete_dataset(dataset_id, recursive)
-        click.echo(f"Dataset deleted: {dataset_id}")
-    except Exception as e:
-        click.echo(f"Error deleting dataset: {e}", err=True)
+    if len(dataset_ids) == 1 and not resume:
+        try:
+            manager.delete_dataset(dataset_ids[0], recursive)
+            click.echo(f"Dataset deleted: {dataset_ids[0]}")
+        except Exception as e:
+            click.echo(f"Error deleting dataset: {e}", err=True)
+            sys.exit(1)
+        return
+
+    journal = start_journal('dataset-delete', [{'key': d} for d in dataset_ids], resume, discard_journal,
+                            recursive=recursive)
+    recursive = journal.params.get('recursive', recursive)
+    result = run_journal(journal, lambda item: manager.delete_dataset(item['key'], recursive, missing_ok=True))
+    click.echo(f"Deleted {result['done']} datasets, {result['left']} left")
+
+
+@dataset.command('reconcile')
+@click.option('--set', '-s', 'settings', multiple=True, required=True, metavar='PROPERTY=VALUE',
+              help='Desired property value (repeatable), e.g. -s aclmode=posix -s aclinherit=passthrough')
+@click.option('--pool', help='Only datasets whose name starts with this')
+@click.option('--dataset', 'names', multiple=True, help='Only these datasets (repeatable)')
+@click.option('--workers', type=int, default=8, help='Concurrent update requests')
+@click.option('--force', is_flag=True, help='Force the updates (PUT ...?force=true)')
+@click.option('--dry-run', is_flag=True, help='Show what would change without updating anything')
+@click.pass_context
+def dataset_reconcile(ctx, settings, pool, names, workers, force, dry_run):
+    """Set properties on every dataset that does not already have them"""
+    manager = ctx.obj['manager']
+    desired = {}
+    for setting in settings:
+        prop, sep, value = setting.partition('=')
+        if not sep or not prop:
+            raise click.BadParameter(f"expected PROPERTY=VALUE, got '{setting}'", param_hint='--set')
+        desired[prop.strip()] = value.strip()
+
+    datasets = manager.get_datasets(pool)
+    if names:
+        datasets = [ds for ds in datasets if ds['name'] in names]
+
+    def report(result: Dict[str, Any]):
+        if result['status'] == 'failed':
+            click.echo(f"  [FAILED] {result['dataset']}: {result['error']}", err=True)
+        elif result['changes']:
+            changes = ', '.join(f"{k}={v}" for k, v in result['changes'].items())
+            click.echo(f"  [{result['status'].upper()}] {result['dataset']}: {changes}")
+
+    summary = manager.reconcile_dataset_properties(desired, datasets, workers, force, dry_run, report)
+    verb = 'would change' if dry_run else 'changed'
+    click.echo(f"\n{summary['changed']} {verb}, {summary['unchanged']} unchanged, {summary['failed']} failed")
+    if summary['failed']:
         sys.exit(1)
 
 
@@ -448,29 +735,31 @@ def snapshot():
     pass
 
 
+SNAPSHOT_COLUMNS = [
+    Column('Snapshot', 'name'),
+    Column('Dataset', 'dataset'),
+    Column('Created', 'created', lambda v: v.strftime('%Y-%m-%d %H:%M:%S')),
+    Column('Used', 'used', gigabytes()),
+]
+
+
 @snapshot.command('list')
 @click.option('--dataset', help='Filter by dataset')
+@output_options
 @click.pass_context
-def snapshot_list(ctx, dataset):
+def snapshot_list(ctx, dataset, output_format, page_size):
     """List all snapshots"""
     manager = ctx.obj['manager']
     snapshots = manager.get_snapshots(dataset)
 
-    table_data = []
-    for snap in snapshots:
-        creation_time = datetime.fromisoformat(snap.get('properties', {}).get('creation', {}).get('value', ''))
-        used_gb = snap.get('properties', {}).get('used', {}).get('parsed', 0) / (1024**3)
+    rows = ({
+        'name': snap['name'],
+        'dataset': snap.get('dataset', 'N/A'),
+        'created': datetime.fromisoformat(snap.get('properties', {}).get('creation', {}).get('value', '')),
+        'used': snap.get('properties', {}).get('used', {}).get('parsed', 0),
+    } for snap in snapshots)
 
-        table_data.append([
-            snap['name'],
-            snap.get('dataset', 'N/A'),
-            creation_time.strftime('%Y-%m-%d %H:%M:%S'),
-            f"{used_gb:.2f} GB"
-        ])
-
-    click.echo(tabulate(table_data, headers=[
-        'Snapshot', 'Dataset', 'Created', 'Used'
-    ], tablefmt='grid'))
+    write_rows(rows, SNAPSHOT_COLUMNS, output_format, page_size)
 
 
 @snapshot.command('create')
@@ -527,28 +816,26 @@ def replication():
     pass
 
 
+REPLICATION_COLUMNS = [
+    Column('ID', 'id'),
+    Column('Name', 'name'),
+    Column('Status', 'enabled', lambda v: 'Enabled' if v else 'Disabled'),
+    Column('State', 'state'),
+    Column('Last Run', 'last_run', lambda v: v or 'Never'),
+    Column('Source', 'source', ', '.join),
+    Column('Target', 'target'),
+]
+
+
 @replication.command('list')
+@output_options
 @click.pass_context
-def replication_list(ctx):
+def replication_list(ctx, output_format, page_size):
     """List replication tasks"""
     manager = ctx.obj['manager']
     tasks = manager.get_replication_status()
 
-    table_data = []
-    for task in tasks:
-        table_data.append([
-            task['id'],
-            task['name'],
-            'Enabled' if task['enabled'] else 'Disabled',
-            task['state'],
-            task['last_run'] or 'Never',
-            ', '.join(task['source']),
-            task['target']
-        ])
-
-    click.echo(tabulate(table_data, headers=[
-        'ID', 'Name', 'Status', 'State', 'Last Run', 'Source', 'Target'
-    ], tablefmt='grid'))
+    write_rows(tasks, REPLICATION_COLUMNS, output_format, page_size)
 
 
 @replication.command('run')
@@ -573,26 +860,24 @@ def smb():
     pass
 
 
+SMB_COLUMNS = [
+    Column('ID', 'id'),
+    Column('Name', 'name'),
+    Column('Path', 'path'),
+    Column('Status', 'enabled', lambda v: 'Enabled' if v else 'Disabled'),
+    Column('Description', 'comment', lambda v: v or ''),
+]
+
+
 @smb.command('list')
+@output_options
 @click.pass_context
-def smb_list(ctx):
+def smb_list(ctx, output_format, page_size):
     """List SMB shares"""
     manager = ctx.obj['manager']
     shares = manager.get_smb_shares()
 
-    table_data = []
-    for share in shares:
-        table_data.append([
-            share.get('id'),
-            share.get('name'),
-            share.get('path'),
-            'Enabled' if share.get('enabled') else 'Disabled',
-            share.get('comment', '')
-        ])
-
-    click.echo(tabulate(table_data, headers=[
-        'ID', 'Name', 'Path', 'Status', 'Description'
-    ], tablefmt='grid'))
+    write_rows(shares, SMB_COLUMNS, output_format, page_size)
 
 
 @smb.command('create')
@@ -615,18 +900,26 @@ def smb_create(ctx, path, name, comment):
 
 
 @smb.command('delete')
-@click.argument('share_id', type=int)
+@click.argument('share_ids', type=int, nargs=-1)
+@click.option('--resume', is_flag=True, help='Finish an interrupted multi-share delete from its journal')
+@click.option('--discard-journal', is_flag=True, help="Start over, dropping an interrupted delete's journal")
 @click.confirmation_option(prompt='Are you sure you want to delete this share?')
 @click.pass_context
-def smb_delete(ctx, share_id):
-    """Delete an SMB share"""
+def smb_delete(ctx, share_ids, resume, discard_journal):
+    """Delete one or more SMB shares"""
     manager = ctx.obj['manager']
-    try:
-        manager.delete_smb_share(share_id)
-        click.echo(f"SMB share deleted: {share_id}")
-    except Exception as e:
-        click.echo(f"Error deleting SMB share: {e}", err=True)
-        sys.exit(1)
+    if len(share_ids) == 1 and not resume:
+        try:
+            manager.delete_smb_share(share_ids[0])
+            click.echo(f"SMB share deleted: {share_ids[0]}")
+        except Exception as e:
+            click.echo(f"Error deleting SMB share: {e}", err=True)
+            sys.exit(1)
+        return
+
+    journal = start_journal('smb-delete', [{'key': s} for s in share_ids], resume, discard_journal)
+    result = run_journal(journal, lambda item: manager.delete_smb_share(int(item['key']), missing_ok=True))
+    click.echo(f"Deleted {result['done']} SMB shares, {result['left']} left")
 
 
 # ==================== User Commands ====================
@@ -637,27 +930,34 @@ def user():
     pass
 
 
+USER_COLUMNS = [
+    Column('ID', 'id'),
+    Column('Username', 'username'),
+    Column('Full Name', 'full_name'),
+    Column('UID', 'uid'),
+    Column('Primary Group', 'group'),
+    Column('SMB', 'smb', yes_no),
+]
+
+
 @user.command('list')
+@output_options
 @click.pass_context
-def user_list(ctx):
+def user_list(ctx, output_format, page_size):
     """List all users"""
     manager = ctx.obj['manager']
     users = manager.get_users()
 
-    table_data = []
-    for u in users:
-        table_data.append([
-            u.get('id'),
-            u.get('username'),
-            u.get('full_name', ''),
-            u.get('uid'),
-            u.get('group', {}).get('bsdgrp_group', 'N/A'),
-            'Yes' if u.get('smb') else 'No'
-        ])
+    rows = ({
+        'id': u.get('id'),
+        'username': u.get('username'),
+        'full_name': u.get('full_name', ''),
+        'uid': u.get('uid'),
+        'group': u.get('group', {}).get('bsdgrp_group', 'N/A'),
+        'smb': bool(u.get('smb')),
+    } for u in users)
 
-    click.echo(tabulate(table_data, headers=[
-        'ID', 'Username', 'Full Name', 'UID', 'Primary Group', 'SMB'
-    ], tablefmt='grid'))
+    write_rows(rows, USER_COLUMNS, output_format, page_size)
 
 
 # ==================== Health Commands ====================
@@ -10,19 +10,17 @@ import sys
 import time
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from typing import TYPE_CHECKING, Callable, Optional, Dict, Any, List
 
 import click
-import requests
-import urllib3
-from tabulate import tabulate
-from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
-from rich.table import Table
-from rich import box
 
-# Disable SSL warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from truenas_cli import LazyObject, agent_select, defer_client, request_errors, send_request, tabulate
+from truenas_output import Column, echo_summary, output_options, write_rows
+from truenas_profile import profile_option
+from truenas_trace import tracer, trace_option, TracedGroup
+
+if TYPE_CHECKING:
+    import requests
 
 
 class ReplicationManager:
@@ -44,17 +42,37 @@ class ReplicationManager:
         self.host = self.config['host']
         self.api_key = self.config['api_key']
         self.verify_ssl = self.config.get('verify_ssl', False)
-        self.base_url = f"https://{self.host}/api/v2.0"
-        self.console = Console()
-
-    def _get_headers(self) -> Dict[str, str]:
-        """Get request headers"""
-        return {
+        self.base_url = self.config.get('api_url', f"https://{self.host}/api/v2.0")
+        self._console = None
+
+    @property
+    def console(self):
+        """Rich console, created (and rich imported) on first use"""
+        if self._console is None:
+            from rich.console import Console
+            self._console = Console()
+        return self._console
+
+    def _get_headers(self, fresh: bool = False) -> Dict[str, str]:
+        """Get request headers (fresh: never answered from the agent's cache, for polling)"""
+        headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}"
         }
-
-    def _make_request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        if fresh:
+            headers["Cache-Control"] = "no-cache"
+        return headers
+
+    def _agent_select(self, endpoint: str, field: str, value: Any) -> Optional[List[Dict[str, Any]]]:
+        """Records of a list endpoint with field == value from the agent's index; None without an agent"""
+        with tracer.request('GET', endpoint) as span:
+            response = agent_select(f"{self.base_url}/{endpoint}", field, value, headers=self._get_headers(),
+                                    verify=self.verify_ssl, timeout=30)
+            if span and response is not None:
+                span.record_response(response)
+        return response.json() if response is not None and response.ok else None
+
+    def _make_request(self, method: str, endpoint: str, **kwargs) -> 'requests.Response':
         """Make API request"""
         url = f"{self.base_url}/{endpoint}"
         kwargs.setdefault('headers', self._get_headers())
@@ -62,22 +80,25 @@ class ReplicationManager:
         kwargs.setdefault('timeout', 30)
 
         try:
-            response = requests.request(method, url, **kwargs)
-            response.raise_for_status()
+            with tracer.request(method, endpoint) as span:
+                response = send_request(method, url, **kwargs)
+                if span:
+                    span.record_response(response)
+                response.raise_for_status()
             return response
-        except requests.exceptions.RequestException as e:
+        except request_errors() as e:
             click.echo(f"Error: {e}", err=True)
             sys.exit(1)
 
-    def get_replication_tasks(self) -> List[Dict[str, Any]]:
-        """Get all replication tasks"""
-        response = self._make_request('GET', 'replication')
+    def get_replication_tasks(self, fresh: bool = False) -> List[Dict[str, Any]]:
+        """Get all replication tasks (fresh: bypass the agent's cache)"""
+        response = self._make_request('GET', 'replication', headers=self._get_headers(fresh))
         return response.json()
 
-    def get_replication_task(self, task_id: int) -> Optional[Dict[str, Any]]:
-        """Get specific replication task"""
+    def get_replication_task(self, task_id: int, fresh: bool = False) -> Optional[Dict[str, Any]]:
+        """Get specific replication task (fresh: bypass the agent's cache)"""
         try:
-            response = self._make_request('GET', f'replication/id/{task_id}')
+            response = self._make_request('GET', f'replication/id/{task_id}', headers=self._get_headers(fresh))
             return response.json()
         except:
             return None
@@ -105,9 +126,9 @@ class ReplicationManager:
         data = {'speed_limit': limit_kbps} if limit_kbps else {'speed_limit': None}
         return self.update_replication_task(task_id, data)
 
-    def get_replication_state(self, task_id: int) -> Dict[str, Any]:
+    def get_replication_state(self, task_id: int, fresh: bool = False) -> Dict[str, Any]:
         """Get current state of replication task"""
-        task = self.get_replication_task(task_id)
+        task = self.get_replication_task(task_id, fresh)
         if not task:
             return {}
 
@@ -124,6 +145,8 @@ class ReplicationManager:
 
     def wait_for_replication(self, task_id: int, timeout: int = 3600, check_interval: int = 5) -> bool:
         """Wait for replication task to complete"""
+        from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
+
         start_time = time.time()
 
         with Progress(
@@ -135,7 +158,8 @@ class ReplicationManager:
             task = progress.add_task(f"Waiting for replication task {task_id}...", total=None)
 
             while time.time() - start_time < timeout:
-                state = self.get_replication_state(task_id)
+                # Polled faster than the agent's cache expires: always ask the NAS
+                state = self.get_replication_state(task_id, fresh=True)
                 current_state = state.get('state', 'UNKNOWN')
 
                 if current_state == 'SUCCESS':
@@ -200,12 +224,14 @@ class ReplicationManager:
 
     def get_replication_history(self, task_id: Optional[int] = None, days: int = 7) -> List[Dict[str, Any]]:
         """Get replication history from jobs"""
-        # Get all jobs for replication tasks
-        response = self._make_request('GET', 'core/get_jobs')
-        jobs = response.json()
+        # Get all jobs for replication tasks (just those, from the agent's job index when it runs)
+        replication_jobs = self._agent_select('core/get_jobs', 'method', 'replication.run')
+        if replication_jobs is None:
+            response = self._make_request('GET', 'core/get_jobs')
+            jobs = response.json()
 
-        # Filter replication jobs
-        replication_jobs = [j for j in jobs if j.get('method') == 'replication.run']
+            # Filter replication jobs
+            replication_jobs = [j for j in jobs if j.get('method') == 'replication.run']
 
         # Filter by task_id if provided
         if task_id is not None:
@@ -276,25 +302,53 @@ class ReplicationManager:
 
 # ==================== CLI Commands ====================
 
-@click.group()
+@click.group(cls=TracedGroup)
 @click.option('--config', type=click.Path(), help='Path to config file')
+@trace_option
+@profile_option
 @click.pass_context
 def cli(ctx, config):
     """TrueNAS Replication Manager"""
-    ctx.ensure_object(dict)
-    config_path = Path(config) if config else None
+    obj = ctx.ensure_object(LazyObject)
+    config_path = Path(config) if config else obj.get('config_path')
+    defer_client(ctx, 'manager', lambda: ReplicationManager(config_path))
+
+
+STATE_ICONS = {'SUCCESS': '✓', 'ERROR': '✗', 'FAILED': '✗', 'RUNNING': '⟳'}
+
+
+def parse_time(value: Optional[str]) -> Any:
+    """An API timestamp as a datetime (ISO in ndjson/csv/tsv), kept as given if it does not parse"""
+    if not value:
+        return None
     try:
-        ctx.obj['manager'] = ReplicationManager(config_path)
-    except FileNotFoundError as e:
-        click.echo(str(e), err=True)
-        sys.exit(1)
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def show_time(missing: str) -> Callable[[Any], str]:
+    """Table display of a parse_time value, with missing for None"""
+    return lambda v: v.strftime('%Y-%m-%d %H:%M') if isinstance(v, datetime) else v or missing
+
+
+TASK_COLUMNS = [
+    Column('ID', 'id'),
+    Column('Name', 'name'),
+    Column('Enabled', 'enabled', lambda v: 'Yes' if v else 'No'),
+    Column('State', 'state', lambda v: f"{STATE_ICONS.get(v, '○')} {v}"),
+    Column('Last Run', 'last_run', show_time('Never')),
+    Column('Source', 'source', ', '.join),
+    Column('Target', 'target'),
+]
 
 
 @cli.command('list')
 @click.option('--enabled-only', is_flag=True, help='Show only enabled tasks')
 @click.option('--failed-only', is_flag=True, help='Show only failed tasks')
+@output_options
 @click.pass_context
-def list_tasks(ctx, enabled_only, failed_only):
+def list_tasks(ctx, enabled_only, failed_only, output_format, page_size):
     """List replication tasks"""
     manager = ctx.obj['manager']
     tasks = manager.get_replication_tasks()
@@ -305,43 +359,22 @@ def list_tasks(ctx, enabled_only, failed_only):
     if failed_only:
         tasks = [t for t in tasks if t.get('state', {}).get('state') in ['ERROR', 'FAILED']]
 
-    table_data = []
-    for task in tasks:
-        state = task.get('state', {})
-        last_run = state.get('datetime', 'Never')
-        if last_run != 'Never':
-            try:
-                dt = datetime.fromisoformat(last_run)
-                last_run = dt.strftime('%Y-%m-%d %H:%M')
-            except:
-                pass
-
-        current_state = state.get('state', 'UNKNOWN')
-        # Color indicators
-        if current_state == 'SUCCESS':
-            state_icon = '✓'
-        elif current_state in ['ERROR', 'FAILED']:
-            state_icon = '✗'
-        elif current_state == 'RUNNING':
-            state_icon = '⟳'
-        else:
-            state_icon = '○'
-
-        table_data.append([
-            task['id'],
-            task.get('name', 'N/A'),
-            'Yes' if task.get('enabled') else 'No',
-            f"{state_icon} {current_state}",
-            last_run,
-            ', '.join(task.get('source_datasets', [])),
-            task.get('target_dataset', 'N/A')
-        ])
+    def rows():
+        for task in tasks:
+            state = task.get('state', {})
+            yield {
+                'id': task['id'],
+                'name': task.get('name', 'N/A'),
+                'enabled': bool(task.get('enabled')),
+                'state': state.get('state', 'UNKNOWN'),
+                'last_run': parse_time(state.get('datetime')),
+                'source': task.get('source_datasets', []),
+                'target': task.get('target_dataset', 'N/A'),
+            }
 
-    click.echo(tabulate(table_data, headers=[
-        'ID', 'Name', 'Enabled', 'State', 'Last Run', 'Source', 'Target'
-    ], tablefmt='grid'))
+    write_rows(rows(), TASK_COLUMNS, output_format, page_size)
 
-    click.echo(f"\nTotal: {len(tasks)} tasks")
+    echo_summary(output_format, f"\nTotal: {len(tasks)} tasks")
 
 
 @cli.command('status')
@@ -485,49 +518,42 @@ def retry_failed(ctx, max_retries, delay):
             click.echo(f"  ✗ {task}")
 
 
+HISTORY_COLUMNS = [
+    Column('Job ID', 'id'),
+    Column('Task ID', 'task_id'),
+    Column('State', 'state'),
+    Column('Started', 'started', show_time('N/A')),
+    Column('Finished', 'finished', show_time('N/A')),
+]
+
+
 @cli.command('history')
 @click.option('--task-id', type=int, help='Filter by task ID')
 @click.option('--days', type=int, default=7, help='Number of days to show')
+@output_options
 @click.pass_context
-def show_history(ctx, task_id, days):
+def show_history(ctx, task_id, days, output_format, page_size):
     """Show replication history"""
     manager = ctx.obj['manager']
     history = manager.get_replication_history(task_id=task_id, days=days)
 
     if not history:
-        click.echo("No replication history found")
+        echo_summary(output_format, "No replication history found")
         return
 
-    table_data = []
-    for job in history:
-        job_id = job.get('id')
-        task_arg = job.get('arguments', [None])[0]
-        state = job.get('state', 'UNKNOWN')
-
-        time_started = job.get('time_started', {}).get('$date', 'N/A')
-        time_finished = job.get('time_finished', {}).get('$date', 'N/A')
-
-        try:
-            if time_started != 'N/A':
-                time_started = datetime.fromisoformat(time_started).strftime('%Y-%m-%d %H:%M')
-            if time_finished != 'N/A':
-                time_finished = datetime.fromisoformat(time_finished).strftime('%Y-%m-%d %H:%M')
-        except:
-            pass
-
-        table_data.append([
-            job_id,
-            task_arg,
-            state,
-            time_started,
-            time_finished
-        ])
+    def rows():
+        for job in history:
+            yield {
+                'id': job.get('id'),
+                'task_id': job.get('arguments', [None])[0],
+                'state': job.get('state', 'UNKNOWN'),
+                'started': parse_time((job.get('time_started') or {}).get('$date')),
+                'finished': parse_time((job.get('time_finished') or {}).get('$date')),
+            }
 
-    click.echo(tabulate(table_data, headers=[
-        'Job ID', 'Task ID', 'State', 'Started', 'Finished'
-    ], tablefmt='grid'))
+    write_rows(rows(), HISTORY_COLUMNS, output_format, page_size)
 
-    click.echo(f"\nTotal: {len(history)} jobs in last {days} days")
+    echo_summary(output_format, f"\nTotal: {len(history)} jobs in last {days} days")
 
 
 @cli.command('stats')
@@ -563,8 +589,8 @@ def monitor_tasks(ctx, refresh):
             # Clear screen
             click.clear()
 
-            # Get current tasks
-            tasks = manager.get_replication_tasks()
+            # Get current tasks (refreshed every cycle, not from the agent's cache)
+            tasks = manager.get_replication_tasks(fresh=True)
 
             # Display header
             click.echo("="*80)
@@ -5,26 +5,55 @@ Provides on-demand snapshot creation, listing with filtering, bulk operations,
 snapshot comparison, automated cleanup with retention policies, and export/import.
 """
 
+import fnmatch
+import itertools
 import json
+import os
+import stat
 import sys
 import re
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta, timezone
+from typing import TYPE_CHECKING, Callable, Optional, Dict, Any, Iterable, List, Iterator, Tuple
 
 import click
-import requests
-import urllib3
-from tabulate import tabulate
 
-# Disable SSL warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+from truenas_catalog import SnapshotCatalog, default_catalog_path, snapshot_dirs
+from truenas_cli import (LazyObject, agent_select, defer_client, load_tool, not_found, parse_size, request_errors,
+                         send_request, tabulate)
+from truenas_export import ExportError, SnapshotExport, write_export
+from truenas_journal import Journal, JournalError, journal_name, run_journal
+from truenas_output import Column, gigabytes, echo_summary, human_size, output_options, write_rows
+from truenas_profile import profile_option
+from truenas_query import Query, QueryError, creation_time
+from truenas_restore import METHODS, Restorer, unsafe_path
+from truenas_retention import (RETENTION_TIERS, parse_duration, format_duration, parse_counts,
+                               policy_grid, policy_label, redundant_runs, simulate_retention, summarize)
+from truenas_ssh import SSHRunner, SSHError, runner_from_config
+from truenas_timeline import SPARK_CHARS, change_timeline, sparkline
+from truenas_zfs import ZFSBackend
+from truenas_trace import tracer, trace_option, TracedGroup
+
+if TYPE_CHECKING:
+    import requests
+
+
+# Restore clones live directly under the pool as restore-<label>-<UTC expiry>, and carry
+# their expiry in a user property; only clones with both (and an origin) are ever swept
+CLONE_PREFIX = 'restore-'
+CLONE_EXPIRY_FORMAT = '%Y%m%d%H%M'
+CLONE_NAME = re.compile(r'^restore-(?P<label>.+)-(?P<expires>\d{12})$')
+CLONE_EXPIRES_PROPERTY = 'org.truenas:restore-expires'
+CLONE_EXPIRES_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 
 
 class SnapshotManager:
     """TrueNAS Snapshot Manager"""
 
-    def __init__(self, config_path: Optional[Path] = None):
+    def __init__(self, config_path: Optional[Path] = None, backend: Optional[str] = None):
         if config_path is None:
             config_path = Path.home() / ".truenas" / "config.json"
 
@@ -36,11 +65,16 @@ class SnapshotManager:
 
         with open(config_path, 'r') as f:
             self.config = json.load(f)
+        self.config_path = config_path
 
         self.host = self.config['host']
         self.api_key = self.config['api_key']
         self.verify_ssl = self.config.get('verify_ssl', False)
-        self.base_url = f"https://{self.host}/api/v2.0"
+        self.base_url = self.config.get('api_url', f"https://{self.host}/api/v2.0")
+        self._ssh: Optional[SSHRunner] = None
+        self._nas = None
+        # Bulk listings: 'api' (REST) or 'zfs' (zfs list through the SSH runner)
+        self.backend = backend or self.config.get('listing_backend', 'api')
 
     def _get_headers(self) -> Dict[str, str]:
         """Get request headers"""
@@ -49,23 +83,57 @@ class SnapshotManager:
             "Authorization": f"Bearer {self.api_key}"
         }
 
-    def _make_request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
-        """Make API request"""
+    def _request(self, method: str, endpoint: str, **kwargs) -> 'requests.Response':
+        """Make API request, raising on failure (for callers that recover or clean up)"""
         url = f"{self.base_url}/{endpoint}"
         kwargs.setdefault('headers', self._get_headers())
         kwargs.setdefault('verify', self.verify_ssl)
         kwargs.setdefault('timeout', 30)
 
-        try:
-            response = requests.request(method, url, **kwargs)
+        with tracer.request(method, endpoint) as span:
+            response = send_request(method, url, **kwargs)
+            if span:
+                span.record_response(response)
             response.raise_for_status()
-            return response
-        except requests.exceptions.RequestException as e:
+        return response
+
+    def _agent_select(self, endpoint: str, field: str, value: Any) -> Optional[List[Dict[str, Any]]]:
+        """Records of a list endpoint with field == value from the agent's index; None without an agent"""
+        with tracer.request('GET', endpoint) as span:
+            response = agent_select(f"{self.base_url}/{endpoint}", field, value, headers=self._get_headers(),
+                                    verify=self.verify_ssl, timeout=30)
+            if span and response is not None:
+                span.record_response(response)
+        return response.json() if response is not None and response.ok else None
+
+    def _make_request(self, method: str, endpoint: str, missing_ok: bool = False,
+                      **kwargs) -> Optional['requests.Response']:
+        """Make API request (with missing_ok, a 404 returns None instead of failing)"""
+        try:
+            return self._request(method, endpoint, **kwargs)
+        except request_errors() as e:
+            if missing_ok and not_found(e):
+                return None
             click.echo(f"Error: {e}", err=True)
             sys.exit(1)
 
+    def _zfs_listing(self, listing: Callable[[ZFSBackend], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Run a listing on the zfs backend, exiting on failure as API requests do"""
+        try:
+            return listing(ZFSBackend(self.ssh))
+        except SSHError as e:
+            click.echo(f"Error: zfs list failed: {e}", err=True)
+            sys.exit(1)
+
     def get_snapshots(self, dataset: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get all snapshots"""
+        if self.backend == 'zfs':
+            return self._zfs_listing(lambda zfs: zfs.snapshots(dataset))
+        if dataset:
+            # The agent, when running, answers from its index of the cached listing
+            selected = self._agent_select('zfs/snapshot', 'dataset', dataset)
+            if selected is not None:
+                return selected
         response = self._make_request('GET', 'zfs/snapshot')
         snapshots = response.json()
 
@@ -99,11 +167,127 @@ class SnapshotManager:
         response = self._make_request('POST', 'zfs/snapshot', json=data)
         return response.json()
 
-    def delete_snapshot(self, snapshot_id: str, defer: bool = False) -> bool:
-        """Delete a snapshot"""
+    # ==================== Snapshot Groups ====================
+
+    def resolve_datasets(self, patterns: List[str]) -> Tuple[List[str], List[str]]:
+        """
+        Datasets named by a list of names and glob patterns, in the order given,
+        along with every dataset on the system
+        """
+        names = [ds['name'] for ds in self.get_datasets()]
+        selected: List[str] = []
+        for pattern in patterns:
+            if any(c in pattern for c in '*?['):
+                matches = sorted(n for n in names if fnmatch.fnmatchcase(n, pattern))
+            else:
+                matches = [pattern] if pattern in names else []
+            if not matches:
+                raise ValueError(f"No datasets match {pattern}")
+            selected.extend(m for m in matches if m not in selected)
+        return selected, names
+
+    @staticmethod
+    def recursive_root(group: List[str], names: List[str]) -> Optional[str]:
+        """
+        The dataset whose recursive snapshot covers exactly the group, if any:
+        one atomic call then gives every dataset the same point in time
+        """
+        root = min(group, key=len)
+        subtree = {n for n in names if n == root or n.startswith(root + '/')}
+        return root if subtree == set(group) else None
+
+    def create_snapshot_group(self, datasets: List[str], name: Optional[str] = None,
+                              properties: Optional[Dict[str, Any]] = None, mode: str = 'auto',
+                              names: Optional[List[str]] = None, workers: int = 8) -> Dict[str, Any]:
+        """
+        Snapshot several datasets under one shared name.
+        mode: 'recursive' (one atomic recursive snapshot of the group's root; the
+        group must be that root's whole subtree), 'concurrent' (one request per
+        dataset, in parallel) or 'auto' (recursive when possible).
+        If any snapshot fails, the ones already created are deleted again.
+
+        Returns {'name', 'mode', 'results': [{'dataset', 'started', 'latency',
+        'error'}], 'rolled_back': [...], 'ok'} with times in seconds from the start.
+        """
+        if name is None:
+            name = datetime.now().strftime('%Y%m%d-%H%M%S')
+
+        root = None
+        if mode in ('auto', 'recursive'):
+            root = self.recursive_root(datasets, names if names is not None else
+                                       [ds['name'] for ds in self.get_datasets()])
+            if root is None and mode == 'recursive':
+                raise ValueError("The datasets are not exactly one dataset and all of its children; "
+                                 "use concurrent mode")
+
+        def snapshot(dataset: str, recursive: bool) -> Dict[str, Any]:
+            data = {'dataset': dataset, 'name': name, 'recursive': recursive}
+            if properties:
+                data['properties'] = properties
+            started = time.perf_counter() - t0
+            try:
+                self._request('POST', 'zfs/snapshot', json=data)
+                error = None
+            except request_errors() as e:
+                error = str(e)
+            latency = time.perf_counter() - t0 - started
+            return {'dataset': dataset, 'started': started, 'latency': latency, 'error': error}
+
+        t0 = time.perf_counter()
+        if root is not None:
+            result = snapshot(root, True)
+            results = [dict(result, dataset=ds) for ds in datasets]
+        else:
+            with ThreadPoolExecutor(max_workers=max(1, min(workers, len(datasets)))) as pool:
+                results = list(pool.map(lambda ds: snapshot(ds, False), datasets))
+
+        rolled_back = []
+        failed = [r for r in results if r['error']]
+        if failed and root is None:
+            # Undo the partial group so no dataset is left with a lone member
+            for r in results:
+                if r['error'] is None:
+                    snapshot_id = f"{r['dataset']}@{name}"
+                    try:
+                        self._request('DELETE', f'zfs/snapshot/id/{snapshot_id}')
+                        rolled_back.append(snapshot_id)
+                    except request_errors() as e:
+                        click.echo(f"Warning: Failed to roll back {snapshot_id}: {e}", err=True)
+
+        return {
+            'name': name,
+            'mode': 'recursive' if root is not None else 'concurrent',
+            'root': root,
+            'results': results,
+            'rolled_back': rolled_back,
+            'ok': not failed,
+        }
+
+    def delete_snapshot(self, snapshot_id: str, defer: bool = False, missing_ok: bool = False) -> bool:
+        """Delete a snapshot (with missing_ok, returns False if it was already gone)"""
         params = {'defer': defer}
-        self._make_request('DELETE', f'zfs/snapshot/id/{snapshot_id}', params=params)
-        return True
+        return self._make_request('DELETE', f'zfs/snapshot/id/{snapshot_id}', missing_ok, params=params) is not None
+
+    def delete_snapshots(self, snapshots: List[Dict[str, Any]], operation: str = 'delete',
+                         journal: Optional[Journal] = None, discard: bool = False, **params) -> Dict[str, int]:
+        """
+        Delete snapshots through a write-ahead journal, so an interrupted run
+        can be finished with resume_deletes instead of being planned again.
+        Raises JournalError if an interrupted run's journal is still pending,
+        unless discard.
+        """
+        journal = journal or Journal(journal_name('snapshot', operation))
+        journal.begin(operation, [{'key': s['id'], 'name': s['name']} for s in snapshots], discard, **params)
+        return self.resume_deletes(journal)
+
+    def resume_deletes(self, journal: Journal) -> Dict[str, int]:
+        """
+        Delete the snapshots a journal still has pending. A snapshot that is
+        already gone counts as deleted: an interruption can land between a
+        delete and its journal entry.
+        """
+        return run_journal(journal, lambda item: self.delete_snapshot(item['key'], missing_ok=True),
+                           lambda item: item['name'])
 
     def clone_snapshot(self, snapshot_id: str, dataset_name: str) -> Dict[str, Any]:
         """Clone a snapshot to a new dataset"""
@@ -111,6 +295,105 @@ class SnapshotManager:
         response = self._make_request('POST', f'zfs/snapshot/id/{snapshot_id}/clone', json=data)
         return response.json()
 
+    # ==================== Clone Restores ====================
+
+    @property
+    def nas(self):
+        """TrueNASManager for the same system, for shares and dataset properties"""
+        if self._nas is None:
+            self._nas = load_tool('truenas-manager.py').TrueNASManager(self.config_path)
+        return self._nas
+
+    @staticmethod
+    def _value(record: Dict[str, Any], key: str) -> Any:
+        value = record.get(key)
+        return value.get('value') if isinstance(value, dict) else value
+
+    def create_restore_clone(self, snapshot_id: str, ttl: timedelta, share: bool = True,
+                             share_name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Clone a snapshot to a read-only dataset, optionally shared over SMB,
+        that sweep_restore_clones destroys once the TTL has passed. The UTC
+        expiry is stored on the clone as a user property (and shown in its
+        name), so clones are found and cleaned up from the NAS alone, even if
+        whoever created them is gone.
+        """
+        dataset, _, snap_name = snapshot_id.partition('@')
+        expires = (datetime.now(timezone.utc) + ttl).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        label = re.sub(r'[^A-Za-z0-9_.-]+', '-', f"{dataset.split('/')[-1]}-{snap_name}")
+        clone = f"{dataset.split('/')[0]}/{CLONE_PREFIX}{label}-{expires.strftime(CLONE_EXPIRY_FORMAT)}"
+
+        self.clone_snapshot(snapshot_id, clone)
+        try:
+            self._request('PUT', f'pool/dataset/id/{clone}', json={
+                'readonly': 'ON',
+                'user_properties_update': [{'key': CLONE_EXPIRES_PROPERTY,
+                                            'value': expires.strftime(CLONE_EXPIRES_FORMAT)}],
+            })
+            shared = None
+            if share:
+                path = f"/mnt/{clone}"
+                shared = self.nas.create_smb_share(
+                    path, share_name or f"{CLONE_PREFIX}{label}"[:80], ro=True, browsable=True,
+                    comment=f"Read-only {snapshot_id}, removed after {expires.strftime('%Y-%m-%d %H:%M')} UTC")
+        except (SystemExit, Exception):
+            # Never leave a writable or half-configured clone behind
+            self._request('DELETE', f'pool/dataset/id/{clone}', params={'recursive': True})
+            raise
+
+        return {'clone': clone, 'snapshot': snapshot_id, 'expires': expires, 'share': shared}
+
+    def restore_clones(self) -> List[Dict[str, Any]]:
+        """
+        Restore clones on the NAS with their origin, UTC expiry and SMB shares.
+        A dataset counts only if it is named like one, is a clone (has an
+        origin) and carries the expiry property create_restore_clone sets, so
+        a dataset that merely matches the name is never swept.
+        """
+        shares = self.nas.get_smb_shares()
+        clones = []
+        # Always the API listing: zfs list output has no origin or user properties
+        for ds in self._make_request('GET', 'pool/dataset').json():
+            if ds['name'].count('/') != 1 or not CLONE_NAME.match(ds['name'].split('/', 1)[-1]):
+                continue
+            origin = self._value(ds, 'origin')
+            stamp = self._value(ds.get('user_properties') or {}, CLONE_EXPIRES_PROPERTY)
+            if not origin or not stamp:
+                continue
+            try:
+                expires = datetime.strptime(stamp, CLONE_EXPIRES_FORMAT).replace(tzinfo=timezone.utc)
+            except ValueError:
+                continue
+            mountpoint = self._value(ds, 'mountpoint') or f"/mnt/{ds['name']}"
+            clones.append({
+                'clone': ds['name'],
+                'origin': origin,
+                'expires': expires,
+                'shares': [sh for sh in shares if sh.get('path') == mountpoint],
+            })
+        return clones
+
+    def drop_restore_clone(self, clone: Dict[str, Any]):
+        """Remove a restore clone's shares, then the clone itself"""
+        for share in clone['shares']:
+            self._request('DELETE', f"sharing/smb/id/{share['id']}")
+        self._request('DELETE', f"pool/dataset/id/{clone['clone']}", params={'recursive': True})
+
+    def sweep_restore_clones(self, now: Optional[datetime] = None) -> Tuple[List[str], List[str]]:
+        """Drop every expired restore clone; returns (dropped, failed) clone names"""
+        now = now or datetime.now(timezone.utc)
+        dropped, failed = [], []
+        for clone in self.restore_clones():
+            if clone['expires'] > now:
+                continue
+            try:
+                self.drop_restore_clone(clone)
+                dropped.append(clone['clone'])
+            except request_errors() as e:
+                click.echo(f"Warning: Failed to remove {clone['clone']}: {e}", err=True)
+                failed.append(clone['clone'])
+        return dropped, failed
+
     def rollback_snapshot(self, snapshot_id: str, force: bool = False) -> bool:
         """Rollback to a snapshot"""
         data = {'force': force}
@@ -119,6 +402,8 @@ class SnapshotManager:
 
     def get_datasets(self) -> List[Dict[str, Any]]:
         """Get all datasets"""
+        if self.backend == 'zfs':
+            return self._zfs_listing(lambda zfs: zfs.datasets())
         response = self._make_request('GET', 'pool/dataset')
         return response.json()
 
@@ -149,6 +434,18 @@ class SnapshotManager:
 
         return filtered
 
+    def query_snapshots(self, query: 'Query | str', dataset: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Snapshots matching a query expression (see truenas_query), evaluated in
+        one pass. A query pinned to one dataset lists only that dataset (with
+        the zfs backend, 'zfs list -d 1 DATASET' instead of every snapshot).
+        """
+        if isinstance(query, str):
+            query = Query(query)
+        if dataset is None and query.datasets is not None and len(query.datasets) == 1:
+            dataset = next(iter(query.datasets))
+        return query.filter(self.get_snapshots(dataset))
+
     def _parse_creation_time(self, snapshot: Dict[str, Any]) -> datetime:
         """Parse snapshot creation time"""
         creation_str = snapshot.get('properties', {}).get('creation', {}).get('value', '')
@@ -157,14 +454,74 @@ class SnapshotManager:
         except:
             return datetime.min
 
-    def apply_retention_policy(self, dataset: str, policy: Dict[str, int], dry_run: bool = False) -> Dict[str, Any]:
+    def find_redundant_snapshots(self, snapshots: List[Dict[str, Any]], threshold: int = 0) -> Dict[str, Any]:
+        """
+        Snapshots that only repeat their neighbours' content, per dataset.
+        Pass every snapshot of the datasets concerned: 'written' is relative
+        to the previous snapshot, so runs are only meaningful over the full
+        history. Returns the redundant snapshots and the runs they collapse,
+        each with the snapshots kept at its boundaries.
+        """
+        by_dataset: Dict[str, List[Dict[str, Any]]] = {}
+        for snap in snapshots:
+            by_dataset.setdefault(snap['dataset'], []).append(snap)
+
+        redundant, runs = [], []
+        for dataset, snaps in sorted(by_dataset.items()):
+            snaps.sort(key=self._parse_creation_time)
+            sizes = [(self._prop(s, 'used'), self._prop(s, 'written')) for s in snaps]
+            for first, last in redundant_runs(sizes, threshold):
+                collapsed = snaps[first + 1:last]
+                redundant.extend(collapsed)
+                runs.append({
+                    'dataset': dataset,
+                    'first': snaps[first],
+                    'last': snaps[last],
+                    'collapsed': collapsed,
+                    'written': sum(written for _, written in sizes[first + 1:last + 1]),
+                })
+        return {'redundant': redundant, 'runs': runs}
+
+    def apply_retention_policy(self, dataset: str, policy: Dict[str, int], dry_run: bool = False,
+                               redundant_threshold: Optional[int] = None,
+                               journal: Optional[Journal] = None, discard: bool = False,
+                               plan: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Apply retention policy to snapshots
         Policy format: {'hourly': 24, 'daily': 7, 'weekly': 4, 'monthly': 12}
+        With redundant_threshold, snapshots inside runs of (nearly) unchanged
+        content are deleted first and do not use up any period's count.
+        Deletions go through a journal (by default the dataset's retention
+        journal), so an interrupted run can be resumed; see delete_snapshots
+        for discard. With plan (an earlier dry run's result), that plan is
+        carried out instead of listing and planning again.
         """
+        if plan is None:
+            plan = self._plan_retention(dataset, policy, redundant_threshold)
+        if not plan['deleted'] and not plan['kept']:
+            return {'deleted': [], 'kept': [], 'message': 'No snapshots found'}
+        deleted, kept = plan['deleted'], plan['kept']
+
+        if deleted and not dry_run:
+            self.delete_snapshots(deleted, 'retention', journal or Journal(journal_name('snapshot', 'retention', dataset)),
+                                  discard, dataset=dataset, policy=policy)
+
+        return {
+            'deleted': deleted,
+            'kept': kept,
+            'message': f"{'Would delete' if dry_run else 'Deleted'} {len(deleted)} snapshots, kept {len(kept)}"
+        }
+
+    def _plan_retention(self, dataset: str, policy: Dict[str, int],
+                        redundant_threshold: Optional[int]) -> Dict[str, List[Dict[str, Any]]]:
+        """The snapshots apply_retention_policy keeps and deletes"""
         snapshots = self.get_snapshots(dataset)
         if not snapshots:
-            return {'deleted': [], 'kept': [], 'message': 'No snapshots found'}
+            return {'deleted': [], 'kept': []}
+
+        redundant = set()
+        if redundant_threshold is not None:
+            redundant = {s['id'] for s in self.find_redundant_snapshots(snapshots, redundant_threshold)['redundant']}
 
         # Sort by creation time (newest first)
         snapshots.sort(key=lambda s: self._parse_creation_time(s), reverse=True)
@@ -173,11 +530,8 @@ class SnapshotManager:
         kept = []
         deleted = []
 
-        # Categorize snapshots by retention period
-        hourly_count = 0
-        daily_count = 0
-        weekly_count = 0
-        monthly_count = 0
+        # Snapshots kept so far by each retention period
+        counts = {tier: 0 for tier, _ in RETENTION_TIERS}
 
         for snap in snapshots:
             creation = self._parse_creation_time(snap)
@@ -185,57 +539,427 @@ class SnapshotManager:
 
             keep = False
 
-            # Hourly retention (last 24 hours)
-            if 'hourly' in policy and age <= timedelta(hours=1) and hourly_count < policy['hourly']:
-                keep = True
-                hourly_count += 1
-
-            # Daily retention (last N days)
-            elif 'daily' in policy and age <= timedelta(days=1) and daily_count < policy['daily']:
-                keep = True
-                daily_count += 1
-
-            # Weekly retention (last N weeks)
-            elif 'weekly' in policy and age <= timedelta(weeks=1) and weekly_count < policy['weekly']:
-                keep = True
-                weekly_count += 1
-
-            # Monthly retention (last N months)
-            elif 'monthly' in policy and age <= timedelta(days=30) and monthly_count < policy['monthly']:
-                keep = True
-                monthly_count += 1
+            # First period (hourly, daily, weekly, monthly) covering the snapshot with room left;
+            # redundant snapshots never take a period's place
+            tiers = [] if snap['id'] in redundant else RETENTION_TIERS
+            for tier, window in tiers:
+                if tier in policy and age <= window and counts[tier] < policy[tier]:
+                    keep = True
+                    counts[tier] += 1
+                    break
 
             if keep:
                 kept.append(snap)
             else:
                 deleted.append(snap)
-                if not dry_run:
-                    try:
-                        self.delete_snapshot(snap['id'])
-                    except Exception as e:
-                        click.echo(f"Warning: Failed to delete {snap['name']}: {e}", err=True)
+
+        return {'deleted': deleted, 'kept': kept}
+
+    # ==================== Reclaimable Space ====================
+
+    @staticmethod
+    def _prop(item: Dict[str, Any], name: str) -> int:
+        value = item.get('properties', item).get(name, {})
+        return int(value.get('parsed') or 0) if isinstance(value, dict) else 0
+
+    def reclaim_context(self) -> Dict[str, Any]:
+        """Snapshots per dataset in creation order plus usedbysnapshots, shared by repeated estimates"""
+        ordered: Dict[str, List[Dict[str, Any]]] = {}
+        for snap in self.get_snapshots():
+            ordered.setdefault(snap['dataset'], []).append(snap)
+        for snaps in ordered.values():
+            snaps.sort(key=self._parse_creation_time)
+        return {'ordered': ordered, 'usedbysnapshots': None}
+
+    @staticmethod
+    def _runs(ordered: List[Dict[str, Any]], selected: set) -> List[List[Dict[str, Any]]]:
+        """Selected snapshots grouped into runs that are adjacent in creation order"""
+        runs, current = [], []
+        for snap in ordered:
+            if snap['id'] in selected:
+                current.append(snap)
+            elif current:
+                runs.append(current)
+                current = []
+        if current:
+            runs.append(current)
+        return runs
+
+    def _reclaim_zfs(self, dataset: str, runs: List[List[Dict[str, Any]]]) -> int:
+        """Exact space freed by destroying the runs, from 'zfs destroy -nvp' (one call per dataset)"""
+        spec = ','.join(run[0]['snapshot_name'] if len(run) == 1
+                        else f"{run[0]['snapshot_name']}%{run[-1]['snapshot_name']}"
+                        for run in runs)
+        for line in self.ssh.stream(['zfs', 'destroy', '-nvp', f"{dataset}@{spec}"]):
+            fields = line.split('\t')
+            if fields[0] == 'reclaim' and len(fields) > 1:
+                return int(fields[1])
+        raise SSHError(f"zfs destroy -nvp reported no reclaim figure for {dataset}")
+
+    def _reclaim_accounting(self, ordered: List[Dict[str, Any]], runs: List[List[Dict[str, Any]]],
+                            usedbysnapshots: Optional[int]) -> Tuple[int, int]:
+        """
+        Bounds on the space freed, from snapshot properties. Each snapshot's 'used'
+        is freed for certain; blocks shared inside a run are only freed if born
+        within it, so 'written' summed over the run bounds it from above.
+        """
+        low = sum(self._prop(snap, 'used') for run in runs for snap in run)
+        high = sum(self._prop(snap, 'written') for run in runs for snap in run)
+        # usedbysnapshots caps the total, unless it is stale (below what the snapshots account for)
+        if usedbysnapshots is not None and usedbysnapshots >= low:
+            if sum(len(run) for run in runs) == len(ordered):
+                return usedbysnapshots, usedbysnapshots
+            high = min(high, usedbysnapshots)
+        return low, max(low, high)
+
+    def estimate_reclaimable(self, snapshots: List[Dict[str, Any]], method: str = 'auto',
+                             context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Space freed by deleting a set of snapshots, batched per dataset.
+        method: 'zfs' (dry-run destroy over SSH, exact), 'accounting' (low/high
+        bounds from used/written/usedbysnapshots) or 'auto' (zfs, else accounting).
+        """
+        context = context or self.reclaim_context()
+        selected: Dict[str, set] = {}
+        for snap in snapshots:
+            selected.setdefault(snap['dataset'], set()).add(snap['id'])
+
+        datasets = {}
+        for dataset, ids in selected.items():
+            ordered = context['ordered'].get(dataset, [])
+            runs = self._runs(ordered, ids)
+            entry = {'snapshots': len(ids), 'runs': len(runs)}
+            if method in ('auto', 'zfs') and not context.get('zfs_failed'):
+                try:
+                    entry['low'] = entry['high'] = self._reclaim_zfs(dataset, runs)
+                    entry['method'] = 'zfs'
+                except SSHError as e:
+                    if method == 'zfs':
+                        raise
+                    context['zfs_failed'] = True
+                    click.echo(f"Warning: zfs dry-run unavailable ({e}); using property accounting", err=True)
+            if 'method' not in entry:
+                if context['usedbysnapshots'] is None:
+                    context['usedbysnapshots'] = {
+                        ds['name']: self._prop(ds, 'usedbysnapshots') for ds in self.get_datasets()
+                        if 'usedbysnapshots' in ds
+                    }
+                entry['low'], entry['high'] = self._reclaim_accounting(
+                    ordered, runs, context['usedbysnapshots'].get(dataset))
+                entry['method'] = 'accounting'
+            datasets[dataset] = entry
 
         return {
-            'deleted': deleted,
-            'kept': kept,
-            'message': f"{'Would delete' if dry_run else 'Deleted'} {len(deleted)} snapshots, kept {len(kept)}"
+            'datasets': datasets,
+            'low': sum(e['low'] for e in datasets.values()),
+            'high': sum(e['high'] for e in datasets.values()),
+            'exact': all(e['method'] == 'zfs' for e in datasets.values()),
         }
 
+    def plan_free_target(self, candidates: List[Dict[str, Any]], target: int,
+                         method: str = 'auto') -> Dict[str, Any]:
+        """
+        Smallest oldest-first subset of the candidates whose guaranteed reclaim
+        (the low estimate) meets the target, found by binary search since
+        deleting more snapshots never frees less space.
+        """
+        context = self.reclaim_context()
+        ordered = sorted(candidates, key=self._parse_creation_time)
+
+        estimate = self.estimate_reclaimable(ordered, method, context)
+        if estimate['low'] < target:
+            return {'snapshots': ordered, 'estimate': estimate, 'met': False}
+
+        lo, hi = 1, len(ordered)
+        best = estimate
+        while lo < hi:
+            mid = (lo + hi) // 2
+            trial = self.estimate_reclaimable(ordered[:mid], method, context)
+            if trial['low'] >= target:
+                hi, best = mid, trial
+            else:
+                lo = mid + 1
+        return {'snapshots': ordered[:hi], 'estimate': best, 'met': True}
+
+    # ==================== Snapshot Diff ====================
+
+    @property
+    def ssh(self) -> SSHRunner:
+        """SSH runner for the NAS (the REST API has no zfs diff)"""
+        if self._ssh is None:
+            self._ssh = runner_from_config(self.config)
+        return self._ssh
+
+    def stream_snapshot_diff(self, older_id: str, newer_id: str) -> Iterator[Dict[str, Any]]:
+        """
+        Changed paths between two snapshots of one dataset, yielded as 'zfs diff'
+        produces them. Closing the iterator stops the remote command.
+        """
+        for line in self.ssh.stream(['zfs', 'diff', '-FHt', older_id, newer_id]):
+            change = parse_zfs_diff_line(line)
+            if change:
+                yield change
+
+
+# ==================== Snapshot Diff Helpers ====================
+
+# File type characters as printed by 'zfs diff -F'
+DIFF_TYPES = {
+    'F': 'file', '/': 'directory', '@': 'symlink', 'B': 'block device', 'C': 'character device',
+    '|': 'fifo', '=': 'socket', '>': 'door', 'P': 'event port',
+}
+
+
+def _unescape_zfs_path(path: str) -> str:
+    """zfs diff prints unusual bytes (including spaces) as 4-digit backslash-octal escapes"""
+    if '\\' not in path:
+        return path
+    raw = re.sub(rb'\\([0-7]{4})', lambda m: bytes([int(m.group(1), 8)]), path.encode('utf-8'))
+    return raw.decode('utf-8', errors='replace')
+
+
+def parse_zfs_diff_line(line: str) -> Optional[Dict[str, Any]]:
+    """Parse one line of 'zfs diff -FHt' output: time, change, type, path[, new path]"""
+    fields = line.split('\t')
+    if len(fields) < 4:
+        return None
+    change = {
+        'change': fields[1],
+        'type': fields[2],
+        'path': _unescape_zfs_path(fields[3]),
+        'time': float(fields[0]) if fields[0] else None,
+    }
+    if fields[1] == 'R' and len(fields) > 4:
+        change['new_path'] = _unescape_zfs_path(fields[4])
+    return change
+
+
+_Entry = namedtuple('_Entry', 'type inode size mtime_ns')
+
+
+def _type_char(mode: int) -> str:
+    if stat.S_ISDIR(mode):
+        return '/'
+    if stat.S_ISLNK(mode):
+        return '@'
+    if stat.S_ISREG(mode):
+        return 'F'
+    if stat.S_ISFIFO(mode):
+        return '|'
+    if stat.S_ISSOCK(mode):
+        return '='
+    if stat.S_ISBLK(mode):
+        return 'B'
+    if stat.S_ISCHR(mode):
+        return 'C'
+    return 'F'
+
+
+class SnapshotTreeDiff:
+    """
+    Compare two snapshot directory trees (e.g. .zfs/snapshot/<name> on a mounted
+    dataset or share) with parallel directory scans. Files with equal size and
+    mtime are treated as unchanged without being read. Entries whose inode moved
+    to another path are reported as renames; only unmatched additions and
+    removals are held until the walk ends, everything else streams out as found.
+    """
+
+    def __init__(self, old_root: Path, new_root: Path, workers: int = 8):
+        self.old_root = old_root
+        self.new_root = new_root
+        self.workers = workers
+
+    @staticmethod
+    def _scan(directory: Path) -> Dict[str, _Entry]:
+        entries = {}
+        try:
+            with os.scandir(directory) as it:
+                for item in it:
+                    try:
+                        st = item.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    entries[item.name] = _Entry(_type_char(st.st_mode), item.inode() or st.st_ino,
+                                                st.st_size, st.st_mtime_ns)
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            pass
+        return entries
+
+    def _compare(self, old_rel: Optional[str], new_rel: Optional[str]
+                 ) -> Tuple[List[Tuple[str, _Entry, str]], List[Tuple[Optional[str], Optional[str]]]]:
+        """Changes in one directory pair, and the subdirectory pairs to compare next"""
+        old = self._scan(self.old_root / old_rel.lstrip('/')) if old_rel is not None else {}
+        new = self._scan(self.new_root / new_rel.lstrip('/')) if new_rel is not None else {}
+        changes = []
+        pairs = []
+
+        for name in sorted(old.keys() | new.keys()):
+            o, n = old.get(name), new.get(name)
+            old_path = f"{old_rel}/{name}" if old_rel is not None else None
+            new_path = f"{new_rel}/{name}" if new_rel is not None else None
+            # Directories pair up by name; files must also keep their inode (when the filesystem reports one)
+            same_object = o and n and o.type == n.type and (
+                o.type == '/' or not o.inode or not n.inode or o.inode == n.inode)
+            if same_object:
+                if o.type == '/':
+                    pairs.append((old_path, new_path))
+                    if o.mtime_ns != n.mtime_ns:
+                        changes.append(('M', n, new_path))
+                elif (o.size, o.mtime_ns) != (n.size, n.mtime_ns):
+                    changes.append(('M', n, new_path))
+                continue
+            if o:
+                changes.append(('-', o, old_path))
+            if n:
+                changes.append(('+', n, new_path))
+        return changes, pairs
+
+    @staticmethod
+    def _record(kind: str, entry: _Entry, path: str, new_path: Optional[str] = None) -> Dict[str, Any]:
+        change = {'change': kind, 'type': entry.type, 'path': path or '/', 'time': entry.mtime_ns / 1e9}
+        if new_path is not None:
+            change['new_path'] = new_path
+        return change
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        # inode -> (entry, path) for additions and removals not yet paired as renames
+        removed: Dict[int, Tuple[_Entry, str]] = {}
+        added: Dict[int, Tuple[_Entry, str]] = {}
+        walked = set()  # unpaired directories whose contents have been scanned
+
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        pending = {pool.submit(self._compare, '', '')}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    changes, pairs = future.result()
+                    for old_path, new_path in pairs:
+                        pending.add(pool.submit(self._compare, old_path, new_path))
+
+                    for kind, entry, path in changes:
+                        if kind == 'M' or not entry.inode:
+                            yield self._record(kind, entry, path)
+                            if kind != 'M' and entry.type == '/':
+                                pending.add(pool.submit(self._compare, *((path, None) if kind == '-' else (None, path))))
+                            continue
+
+                        mine, other = (removed, added) if kind == '-' else (added, removed)
+                        match = other.pop(entry.inode, None)
+                        if match is None:
+                            mine[entry.inode] = (entry, path)
+                            continue
+                        old_path, new_path = (path, match[1]) if kind == '-' else (match[1], path)
+                        yield self._record('R', entry, old_path, new_path)
+                        if entry.type != '/':
+                            continue
+                        old_walked, new_walked = ('-', old_path) in walked, ('+', new_path) in walked
+                        if not old_walked and not new_walked:
+                            # A renamed directory's contents are compared against each other
+                            pending.add(pool.submit(self._compare, old_path, new_path))
+                        elif not new_walked:
+                            pending.add(pool.submit(self._compare, None, new_path))
+                        elif not old_walked:
+                            pending.add(pool.submit(self._compare, old_path, None))
+
+                if pending:
+                    continue
+                # Unpaired directories may hold the other half of a move; scan them first
+                for kind, table in (('-', removed), ('+', added)):
+                    for entry, path in table.values():
+                        if entry.type == '/' and (kind, path) not in walked:
+                            walked.add((kind, path))
+                            pending.add(pool.submit(self._compare, *((path, None) if kind == '-' else (None, path))))
+                if not pending:
+                    for kind, table in (('-', removed), ('+', added)):
+                        for entry, path in sorted(table.values(), key=lambda item: item[1]):
+                            yield self._record(kind, entry, path)
+                        table.clear()
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=True)
+
+
+# ==================== CLI Helpers ====================
+
+def run_query(manager: SnapshotManager, expression: str, dataset: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Snapshots matching a --query expression, exiting on a malformed query"""
+    try:
+        return manager.query_snapshots(expression, dataset)
+    except QueryError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+
+def resume_journal(manager: SnapshotManager, *name: str):
+    """Finish an interrupted deletion run from its journal"""
+    try:
+        journal = Journal(journal_name('snapshot', *name)).load()
+    except JournalError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    total = journal.completed + len(journal.items)
+    click.echo(f"Resuming {journal.operation} started {journal.started}: "
+               f"{journal.completed} of {total} snapshots already deleted")
+    result = manager.resume_deletes(journal)
+    click.echo(f"\nDeleted {journal.completed} of {total} snapshots")
+    return result
+
+
+def snapshot_rows(snapshots: Iterable[Dict[str, Any]], **extra) -> Iterator[Dict[str, Any]]:
+    """Output rows for SNAPSHOT_COLUMNS (plus any extra fixed values)"""
+    for snap in snapshots:
+        yield dict({
+            'id': snap['id'],
+            'name': snap['name'],
+            'dataset': snap['dataset'],
+            'created': creation_time(snap),
+            'used': snap.get('properties', {}).get('used', {}).get('parsed', 0),
+        }, **extra)
+
+
+def echo_reclaim(estimate: Dict[str, Any]):
+    """Print a reclaimable-space estimate per dataset and in total"""
+    gib = 1024 ** 3
+    table_data = []
+    for dataset, entry in estimate['datasets'].items():
+        size = (f"{entry['low'] / gib:.3f} GB" if entry['low'] == entry['high']
+                else f"{entry['low'] / gib:.3f} - {entry['high'] / gib:.3f} GB")
+        table_data.append([dataset, entry['snapshots'], entry['runs'], size, entry['method']])
+    click.echo(tabulate(table_data, headers=['Dataset', 'Snapshots', 'Ranges', 'Reclaimable', 'Method'],
+                        tablefmt='grid'))
+    if estimate['exact']:
+        click.echo(f"Reclaimable space: {estimate['low'] / gib:.3f} GB")
+    else:
+        click.echo(f"Reclaimable space: {estimate['low'] / gib:.3f} - {estimate['high'] / gib:.3f} GB "
+                   "(estimated from snapshot accounting)")
+
 
 # ==================== CLI Commands ====================
 
-@click.group()
+@click.group(cls=TracedGroup)
 @click.option('--config', type=click.Path(), help='Path to config file')
+@click.option('--backend', type=click.Choice(['api', 'zfs']),
+              help="Snapshot/dataset listings from the REST API or 'zfs list' over SSH "
+                   "(default: the config's listing_backend, else api)")
+@trace_option
+@profile_option
 @click.pass_context
-def cli(ctx, config):
+def cli(ctx, config, backend):
     """TrueNAS Snapshot Manager"""
-    ctx.ensure_object(dict)
-    config_path = Path(config) if config else None
-    try:
-        ctx.obj['manager'] = SnapshotManager(config_path)
-    except FileNotFoundError as e:
-        click.echo(str(e), err=True)
-        sys.exit(1)
+    obj = ctx.ensure_object(LazyObject)
+    config_path = Path(config) if config else obj.get('config_path')
+    defer_client(ctx, 'manager', lambda: SnapshotManager(config_path, backend))
+
+
+SNAPSHOT_COLUMNS = [
+    Column('ID', 'id'),
+    Column('Name', 'name'),
+    Column('Dataset', 'dataset'),
+    Column('Created', 'created', lambda v: v.strftime('%Y-%m-%d %H:%M:%S')),
+    Column('Used', 'used', gigabytes(3)),
+]
 
 
 @cli.command('list')
@@ -244,13 +968,19 @@ def cli(ctx, config):
 @click.option('--dataset-pattern', help='Filter by dataset pattern (regex)')
 @click.option('--created-after', help='Filter by creation date (YYYY-MM-DD)')
 @click.option('--created-before', help='Filter by creation date (YYYY-MM-DD)')
+@click.option('--query', '-q', help="Query expression, e.g. 'dataset^tank/backups and used>1G and age<7d'")
 @click.option('--sort', type=click.Choice(['name', 'created', 'size']), default='created')
 @click.option('--reverse', is_flag=True, help='Reverse sort order')
+@output_options
 @click.pass_context
-def list_snapshots(ctx, dataset, name_pattern, dataset_pattern, created_after, created_before, sort, reverse):
+def list_snapshots(ctx, dataset, name_pattern, dataset_pattern, created_after, created_before, query, sort,
+                   reverse, output_format, page_size):
     """List snapshots with filtering options"""
     manager = ctx.obj['manager']
-    snapshots = manager.get_snapshots(dataset)
+    if query:
+        snapshots = run_query(manager, query, dataset)
+    else:
+        snapshots = manager.get_snapshots(dataset)
 
     # Apply filters
     filters = {}
@@ -275,28 +1005,13 @@ def list_snapshots(ctx, dataset, name_pattern, dataset_pattern, created_after, c
         snapshots.sort(key=lambda s: s.get('properties', {}).get('used', {}).get('parsed', 0), reverse=reverse)
 
     if not snapshots:
-        click.echo("No snapshots found")
+        echo_summary(output_format, "No snapshots found")
         return
 
     # Display results
-    table_data = []
-    for snap in snapshots:
-        creation_time = manager._parse_creation_time(snap)
-        used_gb = snap.get('properties', {}).get('used', {}).get('parsed', 0) / (1024**3)
-
-        table_data.append([
-            snap['id'],
-            snap['name'],
-            snap['dataset'],
-            creation_time.strftime('%Y-%m-%d %H:%M:%S'),
-            f"{used_gb:.3f} GB"
-        ])
+    write_rows(snapshot_rows(snapshots), SNAPSHOT_COLUMNS, output_format, page_size)
 
-    click.echo(tabulate(table_data, headers=[
-        'ID', 'Name', 'Dataset', 'Created', 'Used'
-    ], tablefmt='grid'))
-
-    click.echo(f"\nTotal: {len(snapshots)} snapshots")
+    echo_summary(output_format, f"\nTotal: {len(snapshots)} snapshots")
 
 
 @cli.command('create')
@@ -323,6 +1038,64 @@ def create_snapshot(ctx, dataset, name, recursive, comment):
         sys.exit(1)
 
 
+@cli.command('group-create')
+@click.argument('datasets', nargs=-1, required=True)
+@click.option('--name', help='Snapshot name shared by the group (default: timestamp)')
+@click.option('--comment', help='Snapshot comment')
+@click.option('--mode', type=click.Choice(['auto', 'recursive', 'concurrent']), default='auto',
+              help='One atomic recursive snapshot, parallel per-dataset snapshots, or recursive when possible')
+@click.option('--workers', type=int, default=8, help='Parallel requests in concurrent mode')
+@click.pass_context
+def create_snapshot_group(ctx, datasets, name, comment, mode, workers):
+    """Snapshot several datasets (names or globs) under one name"""
+    manager = ctx.obj['manager']
+
+    properties = {}
+    if comment:
+        properties['org.truenas:comment'] = comment
+
+    try:
+        group, names = manager.resolve_datasets(list(datasets))
+        result = manager.create_snapshot_group(group, name, properties or None, mode, names, workers)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+    if result['mode'] == 'recursive':
+        click.echo(f"Recursive snapshot of {result['root']} ({len(group)} datasets, atomic)")
+    else:
+        click.echo(f"Concurrent snapshots of {len(group)} datasets")
+
+    rolled_back = set(result['rolled_back'])
+    table_data = []
+    for r in result['results']:
+        snapshot_id = f"{r['dataset']}@{result['name']}"
+        table_data.append([
+            snapshot_id,
+            f"{r['started'] * 1000:.1f}",
+            f"{r['latency'] * 1000:.1f}",
+            'FAILED' if r['error'] else 'ROLLED BACK' if snapshot_id in rolled_back else 'OK',
+        ])
+    click.echo(tabulate(table_data, headers=['Snapshot', 'Start (ms)', 'Latency (ms)', 'Status'],
+                        tablefmt='grid'))
+
+    finished = [r['started'] + r['latency'] for r in result['results']]
+    started = [r['started'] for r in result['results']]
+    if result['mode'] == 'concurrent' and len(group) > 1:
+        # Each snapshot is taken somewhere inside its request, so this bounds the drift
+        click.echo(f"\nPoint-in-time spread: at most {(max(finished) - min(started)) * 1000:.1f} ms")
+
+    if not result['ok']:
+        for r in result['results']:
+            if r['error']:
+                click.echo(f"Error: {r['dataset']}: {r['error']}", err=True)
+        if result['rolled_back']:
+            click.echo(f"Rolled back {len(result['rolled_back'])} snapshots from the partial group", err=True)
+        sys.exit(1)
+
+    click.echo(f"\nCreated {len(group)} snapshots named {result['name']}")
+
+
 @cli.command('delete')
 @click.argument('snapshot_id')
 @click.option('--defer', is_flag=True, help='Defer deletion')
@@ -340,16 +1113,33 @@ def delete_snapshot(ctx, snapshot_id, defer):
 
 
 @cli.command('bulk-delete')
-@click.option('--dataset', required=True, help='Dataset to filter')
+@click.option('--dataset', help='Dataset to filter (required unless --query is given)')
 @click.option('--name-pattern', help='Filter by name pattern (regex)')
+@click.option('--query', '-q', help="Query expression, e.g. 'dataset^tank/backups and name~^auto- and age>30d'")
 @click.option('--older-than', type=int, help='Delete snapshots older than N days')
 @click.option('--dry-run', is_flag=True, help='Show what would be deleted without deleting')
+@click.option('--estimate', is_flag=True, help='Show the space the deletion would free')
+@click.option('--free-target', help='Only delete the oldest matches needed to free this much (e.g. 500G)')
+@click.option('--estimate-method', type=click.Choice(['auto', 'zfs', 'accounting']), default='auto',
+              help='zfs dry-run destroy over SSH (exact) or used/written accounting (bounds)')
+@click.option('--resume', is_flag=True, help='Finish an interrupted bulk-delete from its journal')
+@click.option('--discard-journal', is_flag=True, help="Start over, dropping an interrupted bulk-delete's journal")
 @click.confirmation_option(prompt='Are you sure you want to delete these snapshots?')
 @click.pass_context
-def bulk_delete(ctx, dataset, name_pattern, older_than, dry_run):
+def bulk_delete(ctx, dataset, name_pattern, query, older_than, dry_run, estimate, free_target, estimate_method,
+                resume, discard_journal):
     """Delete multiple snapshots matching criteria"""
     manager = ctx.obj['manager']
-    snapshots = manager.get_snapshots(dataset)
+    if resume:
+        resume_journal(manager, 'bulk-delete')
+        return
+    if not dataset and not query:
+        click.echo("Error: --dataset or --query is required", err=True)
+        sys.exit(1)
+    if query:
+        snapshots = run_query(manager, query, dataset)
+    else:
+        snapshots = manager.get_snapshots(dataset)
 
     # Apply filters
     filters = {}
@@ -365,23 +1155,96 @@ def bulk_delete(ctx, dataset, name_pattern, older_than, dry_run):
         click.echo("No snapshots match the criteria")
         return
 
+    reclaim = None
+    try:
+        if free_target:
+            target = parse_size(free_target)
+            plan = manager.plan_free_target(snapshots, target, estimate_method)
+            snapshots, reclaim = plan['snapshots'], plan['estimate']
+            if not plan['met']:
+                click.echo(f"Warning: deleting every match frees less than {free_target}", err=True)
+        elif estimate:
+            reclaim = manager.estimate_reclaimable(snapshots, estimate_method)
+    except SSHError as e:
+        click.echo(f"Error: zfs dry-run failed: {e}", err=True)
+        sys.exit(1)
+
     click.echo(f"Found {len(snapshots)} snapshots to delete:")
     for snap in snapshots:
         click.echo(f"  - {snap['name']}")
 
+    if reclaim:
+        click.echo()
+        echo_reclaim(reclaim)
+
     if dry_run:
         click.echo("\nDry run mode - no snapshots were deleted")
         return
 
-    deleted_count = 0
-    for snap in snapshots:
+    try:
+        result = manager.delete_snapshots(snapshots, 'bulk-delete', discard=discard_journal, dataset=dataset,
+                                          query=query, name_pattern=name_pattern, older_than=older_than)
+    except JournalError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    click.echo(f"\nDeleted {result['done']} of {len(snapshots)} snapshots")
+
+
+@cli.command('prune')
+@click.option('--dataset', help='Only this dataset (default: every dataset)')
+@click.option('--threshold', default='0', help='Bytes a run may change and still count as unchanged (e.g. 64K)')
+@click.option('--dry-run', is_flag=True, help='Show the runs that would be collapsed without deleting')
+@click.option('--estimate', is_flag=True, help='Show the space the deletion would free')
+@click.option('--estimate-method', type=click.Choice(['auto', 'zfs', 'accounting']), default='auto',
+              help='zfs dry-run destroy over SSH (exact) or used/written accounting (bounds)')
+@click.option('--resume', is_flag=True, help='Finish an interrupted prune from its journal')
+@click.option('--discard-journal', is_flag=True, help="Start over, dropping an interrupted prune's journal")
+@click.confirmation_option(prompt='Are you sure you want to delete the redundant snapshots?')
+@click.pass_context
+def prune_redundant(ctx, dataset, threshold, dry_run, estimate, estimate_method, resume, discard_journal):
+    """Collapse runs of empty or near-empty snapshots, keeping each run's first and last"""
+    manager = ctx.obj['manager']
+    if resume:
+        resume_journal(manager, 'prune')
+        return
+    result = manager.find_redundant_snapshots(manager.get_snapshots(dataset), parse_size(threshold))
+    if not result['runs']:
+        click.echo("No redundant snapshots found")
+        return
+
+    table_data = []
+    for run in result['runs']:
+        table_data.append([
+            run['dataset'],
+            run['first']['snapshot_name'],
+            run['last']['snapshot_name'],
+            len(run['collapsed']),
+            f"{run['written'] / 1024:.1f} KB",
+        ])
+    click.echo(tabulate(table_data, headers=['Dataset', 'Keep First', 'Keep Last', 'Collapsed', 'Changed'],
+                        tablefmt='grid'))
+    snapshots = result['redundant']
+    click.echo(f"{len(snapshots)} redundant snapshots in {len(result['runs'])} runs")
+
+    if estimate:
+        click.echo()
         try:
-            manager.delete_snapshot(snap['id'])
-            deleted_count += 1
-        except Exception as e:
-            click.echo(f"Warning: Failed to delete {snap['name']}: {e}", err=True)
+            echo_reclaim(manager.estimate_reclaimable(snapshots, estimate_method))
+        except SSHError as e:
+            click.echo(f"Error: zfs dry-run failed: {e}", err=True)
+            sys.exit(1)
 
-    click.echo(f"\nDeleted {deleted_count} of {len(snapshots)} snapshots")
+    if dry_run:
+        click.echo("\nDry run mode - no snapshots were deleted")
+        return
+
+    try:
+        result = manager.delete_snapshots(snapshots, 'prune', discard=discard_journal, dataset=dataset,
+                                          threshold=threshold)
+    except JournalError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    click.echo(f"\nDeleted {result['done']} of {len(snapshots)} snapshots")
 
 
 @cli.command('clone')
@@ -399,6 +1262,108 @@ def clone_snapshot(ctx, snapshot_id, new_dataset):
         sys.exit(1)
 
 
+@cli.command('clone-restore')
+@click.argument('snapshot_id')
+@click.option('--ttl', default='8h', help='Remove the clone after this long (e.g. 30m, 8h, 2d)')
+@click.option('--share-name', help='SMB share name (default: restore-<dataset>-<snapshot>)')
+@click.option('--no-share', is_flag=True, help='Clone only, without an SMB share')
+@click.pass_context
+def clone_restore(ctx, snapshot_id, ttl, share_name, no_share):
+    """Browse a snapshot instantly through a read-only clone and SMB share"""
+    manager = ctx.obj['manager']
+    try:
+        lifetime = timedelta(seconds=parse_duration(ttl))
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+    # Clean up after abandoned restores before adding another
+    dropped, _ = manager.sweep_restore_clones()
+    for clone in dropped:
+        click.echo(f"Removed expired restore clone {clone}")
+
+    started = datetime.now()
+    try:
+        result = manager.create_restore_clone(snapshot_id, lifetime, not no_share, share_name)
+    except request_errors() as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    elapsed = (datetime.now() - started).total_seconds()
+
+    click.echo(f"Clone ready in {elapsed:.1f}s: {result['clone']} (read-only)")
+    if result['share']:
+        click.echo(f"  SMB share: \\\\{manager.host.split(':')[0]}\\{result['share']['name']}")
+    click.echo(f"  Expires: {result['expires'].astimezone().strftime('%Y-%m-%d %H:%M')} "
+               f"(removed by the next 'clone-sweep' or 'clone-restore' after that)")
+
+
+@cli.command('clones')
+@click.pass_context
+def list_clones(ctx):
+    """List restore clones and when they expire"""
+    manager = ctx.obj['manager']
+    clones = manager.restore_clones()
+    if not clones:
+        click.echo("No restore clones")
+        return
+
+    now = datetime.now(timezone.utc)
+    table_data = []
+    for clone in clones:
+        remaining = clone['expires'] - now
+        table_data.append([
+            clone['clone'],
+            clone['origin'],
+            ', '.join(sh['name'] for sh in clone['shares']) or '-',
+            clone['expires'].astimezone().strftime('%Y-%m-%d %H:%M'),
+            format_duration(remaining.total_seconds()) if remaining.total_seconds() > 0 else 'EXPIRED',
+        ])
+    click.echo(tabulate(table_data, headers=['Clone', 'Snapshot', 'Share', 'Expires', 'Remaining'],
+                        tablefmt='grid'))
+
+
+@cli.command('clone-sweep')
+@click.option('--watch', is_flag=True, help='Keep running and sweep every --interval')
+@click.option('--interval', default='5m', help='Time between sweeps with --watch')
+@click.pass_context
+def sweep_clones(ctx, watch, interval):
+    """Remove restore clones (and their shares) whose TTL has passed"""
+    manager = ctx.obj['manager']
+    try:
+        pause = parse_duration(interval)
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+    while True:
+        dropped, failed = manager.sweep_restore_clones()
+        for clone in dropped:
+            click.echo(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} Removed expired restore clone {clone}")
+        if not watch:
+            if not dropped:
+                click.echo("No expired restore clones")
+            sys.exit(1 if failed else 0)
+        time.sleep(pause)
+
+
+@cli.command('clone-drop')
+@click.argument('clone')
+@click.pass_context
+def drop_clone(ctx, clone):
+    """Remove a restore clone and its shares now"""
+    manager = ctx.obj['manager']
+    match = next((c for c in manager.restore_clones() if c['clone'] == clone), None)
+    if match is None:
+        click.echo(f"Error: {clone} is not a restore clone", err=True)
+        sys.exit(1)
+    try:
+        manager.drop_restore_clone(match)
+    except request_errors() as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    click.echo(f"Removed {clone}")
+
+
 @cli.command('rollback')
 @click.argument('snapshot_id')
 @click.option('--force', is_flag=True, help='Force rollback (destroy newer snapshots)')
@@ -422,10 +1387,24 @@ def rollback_snapshot(ctx, snapshot_id, force):
 @click.option('--weekly', type=int, help='Keep N weekly snapshots')
 @click.option('--monthly', type=int, help='Keep N monthly snapshots')
 @click.option('--dry-run', is_flag=True, help='Show what would be deleted without deleting')
+@click.option('--estimate', is_flag=True, help='Show the space the deletions would free')
+@click.option('--estimate-method', type=click.Choice(['auto', 'zfs', 'accounting']), default='auto',
+              help='zfs dry-run destroy over SSH (exact) or used/written accounting (bounds)')
+@click.option('--prune-redundant', is_flag=True,
+              help='Also delete snapshots inside runs of unchanged content, keeping each run\'s boundaries')
+@click.option('--redundant-threshold', default='0',
+              help='Bytes a run may change and still count as unchanged (e.g. 64K)')
+@click.option('--resume', is_flag=True, help='Finish an interrupted retention run from its journal')
+@click.option('--discard-journal', is_flag=True, help="Start over, dropping an interrupted retention run's journal")
 @click.pass_context
-def apply_retention(ctx, dataset, hourly, daily, weekly, monthly, dry_run):
+def apply_retention(ctx, dataset, hourly, daily, weekly, monthly, dry_run, estimate, estimate_method,
+                    prune_redundant, redundant_threshold, resume, discard_journal):
     """Apply retention policy to dataset snapshots"""
     manager = ctx.obj['manager']
+    if resume:
+        resume_journal(manager, 'retention', dataset)
+        return
+    threshold = parse_size(redundant_threshold) if prune_redundant else None
 
     policy = {}
     if hourly:
@@ -444,8 +1423,27 @@ def apply_retention(ctx, dataset, hourly, daily, weekly, monthly, dry_run):
     click.echo(f"Applying retention policy to {dataset}:")
     for key, value in policy.items():
         click.echo(f"  {key}: keep {value}")
+    if threshold is not None:
+        click.echo(f"  redundant: delete (runs changing at most {redundant_threshold})")
+
+    plan = None
+    if estimate:
+        # Estimate from the plan before anything is destroyed, then carry out that same plan
+        plan = manager.apply_retention_policy(dataset, policy, dry_run=True, redundant_threshold=threshold)
+        if plan['deleted']:
+            click.echo()
+            try:
+                echo_reclaim(manager.estimate_reclaimable(plan['deleted'], estimate_method))
+            except SSHError as e:
+                click.echo(f"Error: zfs dry-run failed: {e}", err=True)
+                sys.exit(1)
 
-    result = manager.apply_retention_policy(dataset, policy, dry_run)
+    try:
+        result = manager.apply_retention_policy(dataset, policy, dry_run, redundant_threshold=threshold,
+                                                discard=discard_journal, plan=plan)
+    except JournalError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
 
     click.echo(f"\n{result['message']}")
 
@@ -458,11 +1456,100 @@ def apply_retention(ctx, dataset, hourly, daily, weekly, monthly, dry_run):
             click.echo(f"  ... and {len(result['deleted']) - 10} more")
 
 
+@cli.command('simulate')
+@click.option('--hourly', help='Hourly counts to try: N, a list (0,12,24) or a range (0-48:6)')
+@click.option('--daily', help='Daily counts to try')
+@click.option('--weekly', help='Weekly counts to try')
+@click.option('--monthly', help='Monthly counts to try')
+@click.option('--days', type=float, default=365, help='Length of the simulated timeline in days')
+@click.option('--cadence', default='1h', help='Interval between snapshots (e.g. 15m, 1h, 1d)')
+@click.option('--run-every', default='1d', help='Interval between retention runs')
+@click.option('--change-rate', default='10G', help='Data rewritten per day, for space estimates')
+@click.option('--sort', type=click.Choice(['space', 'snapshots', 'horizon', 'gap']), default='space',
+              help='Order the policies by this figure')
+@click.option('--top', type=int, default=20, help='Show the best N policies')
+@click.option('--timeline', type=click.Path(dir_okay=False),
+              help='Write every retention run of every policy to this CSV file')
+def simulate_policies(hourly, daily, weekly, monthly, days, cadence, run_every, change_rate,
+                      sort, top, timeline):
+    """Simulate retention policies over a synthetic snapshot timeline"""
+    try:
+        counts = {tier: parse_counts(value) for tier, value in
+                  (('hourly', hourly), ('daily', daily), ('weekly', weekly), ('monthly', monthly))}
+        cadence_s = parse_duration(cadence)
+        run_every_s = parse_duration(run_every)
+        rate = parse_size(change_rate) / 86400
+    except (ValueError, click.BadParameter) as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+    policies = [p for p in policy_grid(**counts) if p]
+    if not policies:
+        click.echo("Error: No retention policy specified", err=True)
+        sys.exit(1)
+    if cadence_s <= 0 or run_every_s <= 0:
+        click.echo("Error: --cadence and --run-every must be positive", err=True)
+        sys.exit(1)
+
+    started = datetime.now()
+    result = simulate_retention(policies, days, cadence_s, run_every_s, rate)
+    summary = summarize(result)
+    elapsed = (datetime.now() - started).total_seconds()
+
+    keys = {
+        'space': lambda i: summary[i]['peak_space'],
+        'snapshots': lambda i: summary[i]['peak_count'],
+        'horizon': lambda i: -summary[i]['min_horizon'],
+        'gap': lambda i: summary[i]['worst_gap'],
+    }
+    order = sorted(range(len(policies)), key=keys[sort])[:top]
+
+    table_data = []
+    for i in order:
+        row = summary[i]
+        table_data.append([
+            policy_label(policies[i]),
+            f"{row['mean_count']:.1f}",
+            row['peak_count'],
+            f"{row['peak_space'] / (1024**3):.2f}",
+            format_duration(row['min_horizon']),
+            format_duration(row['worst_gap']),
+        ])
+
+    click.echo(f"Simulated {len(policies)} policies over {days:g} days "
+               f"(snapshot every {cadence}, retention every {run_every}) in {elapsed:.2f}s\n")
+    click.echo(tabulate(
+        table_data,
+        headers=['Policy (h/d/w/m)', 'Avg Snapshots', 'Peak', 'Peak Space (GB)',
+                 'Oldest Restore Point', 'Worst Gap'],
+        tablefmt='grid'
+    ))
+
+    if timeline:
+        import csv
+        with open(timeline, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['policy', 'day', 'snapshots', 'space_bytes', 'oldest_seconds', 'worst_gap_seconds'])
+            for r, when in enumerate(result['times']):
+                for i, policy in enumerate(policies):
+                    writer.writerow([policy_label(policy), f"{when / 86400:g}", result['count'][r, i],
+                                     int(result['space'][r, i]), int(result['horizon'][r, i]),
+                                     result['worst_gap'][r, i]])
+        click.echo(f"\nTimeline written to {timeline}")
+
+
 @cli.command('compare')
 @click.argument('snapshot_id_1')
 @click.argument('snapshot_id_2')
+@click.option('--diff', is_flag=True, help='List changed files (zfs diff over SSH)')
+@click.option('--local', type=click.Path(exists=True, file_okay=False),
+              help='Diff the .zfs/snapshot trees under this mounted dataset path instead of using SSH')
+@click.option('--workers', type=int, default=8, help='Parallel directory scans for --local')
+@click.option('--offset', type=int, default=0,
+              help='Skip the first N changes (zfs diff cannot start mid-way: they are still computed and read)')
+@click.option('--limit', type=int, help='Stop after N changes (ends the zfs diff or directory walk there)')
 @click.pass_context
-def compare_snapshots(ctx, snapshot_id_1, snapshot_id_2):
+def compare_snapshots(ctx, snapshot_id_1, snapshot_id_2, diff, local, workers, offset, limit):
     """Compare two snapshots"""
     manager = ctx.obj['manager']
 
@@ -473,6 +1560,10 @@ def compare_snapshots(ctx, snapshot_id_1, snapshot_id_2):
         click.echo("Error: One or both snapshots not found", err=True)
         sys.exit(1)
 
+    if diff or local:
+        show_snapshot_diff(manager, snap1, snap2, local, workers, offset, limit)
+        return
+
     # Display comparison
     click.echo("Snapshot Comparison:")
     click.echo(f"\nSnapshot 1: {snap1['name']}")
@@ -495,6 +1586,142 @@ def compare_snapshots(ctx, snapshot_id_1, snapshot_id_2):
     click.echo(f"Time difference: {time_diff / 3600:.2f} hours")
 
 
+def show_snapshot_diff(manager: SnapshotManager, snap1: Dict[str, Any], snap2: Dict[str, Any],
+                       local: Optional[str], workers: int, offset: int, limit: Optional[int]):
+    """Stream changed paths between two snapshots, oldest first"""
+    if snap1['dataset'] != snap2['dataset']:
+        click.echo("Error: --diff needs two snapshots of the same dataset", err=True)
+        sys.exit(1)
+    older, newer = sorted([snap1, snap2], key=manager._parse_creation_time)
+
+    if local:
+        snapshot_dir = Path(local) / '.zfs' / 'snapshot'
+        old_root, new_root = snapshot_dir / older['snapshot_name'], snapshot_dir / newer['snapshot_name']
+        if not old_root.is_dir() or not new_root.is_dir():
+            click.echo(f"Error: snapshots not visible under {snapshot_dir} "
+                       "(is this the dataset's mountpoint, with snapdir visible or reachable?)", err=True)
+            sys.exit(1)
+        changes = iter(SnapshotTreeDiff(old_root, new_root, workers=workers))
+    else:
+        changes = manager.stream_snapshot_diff(older['id'], newer['id'])
+
+    click.echo(f"Changes from {older['id']} to {newer['id']}:", err=True)
+    counts: Dict[str, int] = {}
+    end = offset + limit if limit is not None else None
+    try:
+        for index, change in enumerate(changes):
+            if end is not None and index >= end:
+                break
+            if index < offset:
+                continue
+            counts[change['change']] = counts.get(change['change'], 0) + 1
+            path = change['path']
+            if 'new_path' in change:
+                path = f"{path} -> {change['new_path']}"
+            click.echo(f"{change['change']}\t{change['type']}\t{path}")
+    except SSHError as e:
+        click.echo(f"Error: zfs diff failed: {e}", err=True)
+        sys.exit(1)
+    finally:
+        # Stops the remote zfs diff or the directory walk when --limit cuts it short
+        changes.close()
+
+    labels = [('+', 'added'), ('-', 'removed'), ('M', 'modified'), ('R', 'renamed')]
+    click.echo(f"{sum(counts.values())} changes (" +
+               ', '.join(f"{counts.get(k, 0)} {label}" for k, label in labels) + ")", err=True)
+
+
+@cli.command('timeline')
+@click.argument('datasets', nargs=-1, required=True)
+@click.option('--window', type=int, default=24, help='Intervals in the rolling growth window')
+@click.option('--threshold', type=float, default=3.5, help='Robust z-score above which an interval is an outlier')
+@click.option('--width', type=int, default=60, help='Sparkline width in characters')
+@click.option('--top', type=int, default=10, help='Outlier intervals to list for a single dataset')
+@click.option('--export', 'export_file', type=click.Path(exists=True, dir_okay=False),
+              help='Read snapshots from an export file instead of the API')
+@click.option('--ascii', 'ascii_only', is_flag=True, help='Draw sparklines with ASCII characters')
+@click.pass_context
+def snapshot_timeline(ctx, datasets, window, threshold, width, top, export_file, ascii_only):
+    """Write rate, growth and outlier intervals across a dataset's snapshots"""
+    if export_file:
+        snapshots = load_export(export_file, None, None)[1]
+    else:
+        manager = ctx.obj['manager']
+        single = len(datasets) == 1 and not any(c in datasets[0] for c in '*?[')
+        snapshots = manager.get_snapshots(datasets[0] if single else None)
+
+    by_dataset: Dict[str, List[Dict[str, Any]]] = {}
+    for snap in snapshots:
+        if any(fnmatch.fnmatchcase(snap['dataset'], pattern) for pattern in datasets):
+            by_dataset.setdefault(snap['dataset'], []).append(snap)
+    if not by_dataset:
+        click.echo(f"Error: No snapshots found for {', '.join(datasets)}", err=True)
+        sys.exit(1)
+
+    if not ascii_only:
+        try:
+            SPARK_CHARS.encode(sys.stdout.encoding or 'ascii')
+        except (UnicodeEncodeError, LookupError):
+            ascii_only = True
+
+    timelines = {}
+    for dataset, snaps in sorted(by_dataset.items()):
+        # A snapshot without a usable creation time has no place on the time axis
+        dated = [s for s in snaps if creation_time(s) != datetime.min]
+        if len(dated) < len(snaps):
+            click.echo(f"Warning: {dataset}: ignoring {len(snaps) - len(dated)} snapshots with no creation time",
+                       err=True)
+        snaps = dated
+        if len(snaps) < 2:
+            click.echo(f"Skipping {dataset}: needs at least two snapshots", err=True)
+            continue
+        created = [creation_time(s).timestamp() for s in snaps]
+        written = [s.get('properties', {}).get('written', {}).get('parsed') or 0 for s in snaps]
+        timelines[dataset] = change_timeline(created, written, window, threshold)
+    if not timelines:
+        sys.exit(1)
+
+    if len(timelines) > 1:
+        # One line per dataset, most anomalous first, to spot runaway writers
+        table_data = []
+        for dataset, t in sorted(timelines.items(), key=lambda item: -item[1]['score'].max()):
+            table_data.append([
+                dataset,
+                len(t['rate']) + 1,
+                sparkline(t['rate'], width, ascii_only),
+                f"{human_size(t['rate'].max())}/h",
+                f"{human_size(t['rate'][-1])}/h",
+                int(t['outlier'].sum()),
+            ])
+        click.echo(tabulate(table_data, headers=['Dataset', 'Snapshots', 'Write Rate', 'Peak', 'Latest', 'Outliers'],
+                            tablefmt='grid'))
+        return
+
+    dataset, t = next(iter(timelines.items()))
+    first, last = datetime.fromtimestamp(t['start'][0]), datetime.fromtimestamp(t['end'][-1])
+    click.echo(f"{dataset}: {len(t['rate']) + 1} snapshots, {first:%Y-%m-%d %H:%M} to {last:%Y-%m-%d %H:%M}, "
+               f"{human_size(t['written'].sum())} written")
+    click.echo(f"  Write rate   {sparkline(t['rate'], width, ascii_only)}  "
+               f"peak {human_size(t['rate'].max())}/h, median {human_size(t['median_rate'])}/h")
+    click.echo(f"  Growth       {sparkline(t['growth'], width, ascii_only)}  "
+               f"latest {human_size(t['growth'][-1])} over {min(window, len(t['rate']))} intervals")
+    marks = sparkline(t['outlier'], width, ascii_only) if t['outlier'].any() else ''
+    click.echo(f"  Outliers     {marks}  {int(t['outlier'].sum())} intervals above z={threshold:g}")
+
+    outliers = [i for i in t['score'].argsort()[::-1] if t['outlier'][i]][:top]
+    if outliers:
+        click.echo()
+        table_data = [[
+            f"{datetime.fromtimestamp(t['start'][i]):%Y-%m-%d %H:%M}",
+            f"{datetime.fromtimestamp(t['end'][i]):%Y-%m-%d %H:%M}",
+            f"{t['hours'][i]:.1f}",
+            human_size(t['written'][i]),
+            f"{human_size(t['rate'][i])}/h",
+            f"{t['score'][i]:.1f}",
+        ] for i in outliers]
+        click.echo(tabulate(table_data, headers=['From', 'To', 'Hours', 'Written', 'Rate', 'Score'], tablefmt='grid'))
+
+
 @cli.command('info')
 @click.argument('snapshot_id')
 @click.pass_context
@@ -510,5 +1737,276 @@ def snapshot_info(ctx, snapshot_id):
     click.echo(json.dumps(snap, indent=2))
 
 
+@cli.command('export')
+@click.argument('export_file', type=click.Path(dir_okay=False))
+@click.option('--dataset', help='Only this dataset')
+@click.option('--query', '-q', help="Only snapshots matching a query expression")
+@click.pass_context
+def export_snapshots(ctx, export_file, dataset, query):
+    """Save the snapshot list to a compact file for offline use ('import')"""
+    manager = ctx.obj['manager']
+    snapshots = run_query(manager, query, dataset) if query else manager.get_snapshots(dataset)
+    result = write_export(Path(export_file), snapshots, source=manager.host)
+    per_snapshot = result['bytes'] / result['rows'] if result['rows'] else 0
+    click.echo(f"Exported {result['rows']} snapshots to {export_file} "
+               f"({result['bytes'] / 1024:.1f} KB, {per_snapshot:.0f} bytes per snapshot)")
+
+
+EXPORT_SUMMARY_COLUMNS = [
+    Column('Dataset', 'dataset'),
+    Column('Snapshots', 'snapshots'),
+    Column('Used', 'used', gigabytes(3)),
+    Column('Written', 'written', gigabytes(3)),
+    Column('Oldest', 'oldest', lambda v: v.strftime('%Y-%m-%d %H:%M') if v else '-'),
+    Column('Newest', 'newest', lambda v: v.strftime('%Y-%m-%d %H:%M') if v else '-'),
+]
+
+
+def load_export(path: str, dataset: Optional[str], query: Optional[str]) -> Tuple[SnapshotExport, List[Dict[str, Any]]]:
+    """An export file and its snapshots narrowed by --dataset/--query, exiting on a bad file or query"""
+    try:
+        export = SnapshotExport(Path(path))
+    except ExportError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    try:
+        parsed = Query(query) if query else None
+    except QueryError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+
+    # Narrow on the mapped columns first so only candidate rows become records
+    bounds = {}
+    if dataset:
+        bounds['datasets'] = {dataset}
+    if parsed and parsed.narrows:
+        if parsed.datasets is not None:
+            bounds['datasets'] = parsed.datasets & bounds.get('datasets', parsed.datasets)
+        bounds.update(dataset_prefix=parsed.dataset_prefix, created_after=parsed.created_after,
+                      created_before=parsed.created_before)
+    snapshots = export.records(export.select(**bounds) if bounds else None)
+    return export, parsed.filter(snapshots) if parsed else list(snapshots)
+
+
+@cli.command('import')
+@click.argument('export_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--dataset', help='Only this dataset')
+@click.option('--query', '-q', help="Query expression, e.g. 'dataset^tank/backups and used>1G'")
+@click.option('--summary', is_flag=True, help='Per-dataset totals instead of the snapshot list')
+@click.option('--compare', 'other_file', type=click.Path(exists=True, dir_okay=False),
+              help='Another export (e.g. from the backup host): show snapshots only one side has')
+@output_options
+def import_snapshots(export_file, dataset, query, summary, other_file, output_format, page_size):
+    """List, summarize or compare exported snapshots without the API"""
+    if summary:
+        try:
+            with SnapshotExport(Path(export_file)) as export:
+                rows = [row for row in export.summary() if not dataset or row['dataset'] == dataset]
+        except ExportError as e:
+            click.echo(f"Error: {e}", err=True)
+            sys.exit(1)
+        write_rows(rows, EXPORT_SUMMARY_COLUMNS, output_format, page_size)
+        echo_summary(output_format, f"\nTotal: {sum(r['snapshots'] for r in rows)} snapshots "
+                                    f"in {len(rows)} datasets")
+        return
+
+    export, snapshots = load_export(export_file, dataset, query)
+    label = export.source or export_file
+    click.echo(f"{export_file}: {len(export)} snapshots from {label}, exported {export.exported}", err=True)
+    if not other_file:
+        write_rows(snapshot_rows(snapshots), SNAPSHOT_COLUMNS, output_format, page_size)
+        echo_summary(output_format, f"\nTotal: {len(snapshots)} snapshots")
+        return
+
+    other, other_snapshots = load_export(other_file, dataset, query)
+    other_label = other.source or other_file
+    if other_label == label:
+        label, other_label = export_file, other_file
+    ids = {s['id'] for s in snapshots}
+    other_ids = {s['id'] for s in other_snapshots}
+    only_here = [s for s in snapshots if s['id'] not in other_ids]
+    only_there = [s for s in other_snapshots if s['id'] not in ids]
+
+    columns = SNAPSHOT_COLUMNS + [Column('Only On', 'side')]
+    rows = itertools.chain(snapshot_rows(only_here, side=label), snapshot_rows(only_there, side=other_label))
+    write_rows(rows, columns, output_format, page_size)
+    echo_summary(output_format, f"\n{len(ids & other_ids)} snapshots on both, {len(only_here)} only on {label}, "
+                                f"{len(only_there)} only on {other_label}")
+
+
+@cli.command('restore')
+@click.argument('snapshot')
+@click.argument('paths', nargs=-1, required=True)
+@click.option('--root', type=click.Path(exists=True, file_okay=False),
+              help='Mount point of the dataset (default: looked up from the API for DATASET@NAME)')
+@click.option('--target', type=click.Path(file_okay=False),
+              help='Restore under this directory instead of into the live dataset')
+@click.option('--workers', type=int, default=8, help='Files copied in parallel')
+@click.option('--overwrite', is_flag=True, help='Replace live files that differ from the snapshot')
+@click.option('--method', 'methods', multiple=True, type=click.Choice(METHODS),
+              help='Copy mechanisms to try, in order (default: all, fastest first)')
+@click.option('--dry-run', is_flag=True, help='Show what would be restored')
+@click.pass_context
+def restore_paths(ctx, snapshot, paths, root, target, workers, overwrite, methods, dry_run):
+    """Copy PATHS (relative to the dataset root) out of a snapshot, resuming interrupted restores"""
+    dataset, _, name = snapshot.rpartition('@')
+    if root is None:
+        if not dataset:
+            click.echo("Error: Give the snapshot as DATASET@NAME or pass --root", err=True)
+            sys.exit(1)
+        manager = ctx.obj['manager']
+        record = next((ds for ds in manager.get_datasets() if ds['name'] == dataset), None)
+        root = record and (record.get('mountpoint') or '')
+        if isinstance(root, dict):
+            root = root.get('value')
+        if not root or not Path(root).is_dir():
+            click.echo(f"Error: {dataset} is not mounted here; pass --root", err=True)
+            sys.exit(1)
+
+    bad = [p for p in paths if unsafe_path(p)]
+    if bad:
+        click.echo(f"Error: Restore paths may not contain '..': {', '.join(bad)}", err=True)
+        sys.exit(1)
+
+    source = snapshot_dirs(Path(root)).get(name)
+    if source is None:
+        click.echo(f"Error: Snapshot {name} not found under {root}", err=True)
+        sys.exit(1)
+    missing = [p for p in paths if not os.path.lexists(source / p.strip('/'))]
+    if missing:
+        click.echo(f"Error: Not in snapshot {name}: {', '.join(missing)}", err=True)
+        sys.exit(1)
+
+    def report(result):
+        if result['status'] == 'restored':
+            copied = result['size'] - result['resumed_from']
+            rate = copied / result['seconds'] / (1024**2) if result['seconds'] > 0 else 0
+            resumed = f", resumed at {result['resumed_from']} bytes" if result['resumed_from'] else ''
+            click.echo(f"  {result['path']}  {result['size'] / (1024**2):.1f} MB  {rate:.1f} MB/s  "
+                       f"({result['method']}{resumed})")
+        elif result['status'] == 'conflict':
+            click.echo(f"  {result['path']}  differs from the live copy; skipped (use --overwrite)", err=True)
+        elif result['status'] == 'error':
+            click.echo(f"  {result['path']}  failed: {result['error']}", err=True)
+
+    restorer = Restorer(source, Path(target) if target else Path(root), workers, overwrite,
+                        list(methods) or None, on_file=report)
+    result = restorer.restore(list(paths), dry_run)
+    totals = result['totals']
+
+    if dry_run:
+        click.echo(f"Would restore {totals['files']} files and {totals['directories']} directories "
+                   f"({totals['bytes'] / (1024**3):.3f} GB) from {source}")
+        return
+
+    seconds = result['seconds']
+    rate = totals['bytes'] / seconds / (1024**2) if seconds > 0 else 0
+    methods_used = ', '.join(f"{count} by {method}" for method, count in result['by_method'].items())
+    click.echo(f"\nRestored {totals['files']} files ({totals['bytes'] / (1024**3):.3f} GB) in {seconds:.2f}s "
+               f"- {rate:.1f} MB/s" + (f" [{methods_used}]" if methods_used else ''))
+    if totals['skipped'] or totals['resumed']:
+        click.echo(f"Already restored: {totals['skipped']} skipped, {totals['resumed']} resumed")
+    if totals['conflicts'] or totals['errors']:
+        click.echo(f"Warning: {totals['conflicts']} conflicts, {totals['errors']} errors", err=True)
+        sys.exit(1)
+
+
+# ==================== Catalog Commands ====================
+
+@cli.group()
+def catalog():
+    """Versioned file catalog across a dataset's snapshots"""
+    pass
+
+
+def open_catalog(root: str, db: Optional[str]) -> SnapshotCatalog:
+    return SnapshotCatalog(Path(db) if db else default_catalog_path(Path(root)))
+
+
+@catalog.command('build')
+@click.argument('root', type=click.Path(exists=True, file_okay=False))
+@click.option('--dataset', help='Dataset mounted at ROOT; orders snapshots by their API creation time')
+@click.option('--db', type=click.Path(dir_okay=False), help='Catalog file (default: ~/.truenas/catalog/)')
+@click.option('--hash', 'hash_files', is_flag=True, help='Also record a content hash of each new file version')
+@click.pass_context
+def catalog_build(ctx, root, dataset, db, hash_files):
+    """Index the snapshots of a mounted dataset (ROOT/.zfs/snapshot) or a test tree"""
+    dirs = snapshot_dirs(Path(root))
+    if dataset:
+        manager = ctx.obj['manager']
+        created = {s['snapshot_name']: manager._parse_creation_time(s) for s in manager.get_snapshots(dataset)}
+        ordered = sorted((name for name in dirs if name in created), key=lambda n: created[n])
+        snapshots = [(name, dirs[name], created[name].timestamp()) for name in ordered]
+    else:
+        snapshots = [(name, dirs[name], None) for name in sorted(dirs)]
+
+    if not snapshots:
+        click.echo(f"No snapshots found under {root}")
+        return
+
+    cat = open_catalog(root, db)
+    started = datetime.now()
+    try:
+        stats = cat.build(snapshots, hash_files, progress=lambda name, entries, changed: click.echo(
+            f"  {name}: {entries} entries, {changed} new versions"))
+    except ValueError as e:
+        click.echo(f"Error: {e}", err=True)
+        sys.exit(1)
+    finally:
+        totals = cat.stats()
+        cat.close()
+
+    elapsed = (datetime.now() - started).total_seconds()
+    click.echo(f"\nIndexed {stats['snapshots']} new snapshots ({stats['entries']} entries, "
+               f"{stats['new_versions']} new versions) in {elapsed:.1f}s")
+    click.echo(f"Catalog: {totals['snapshots']} snapshots, {totals['paths']} paths, "
+               f"{totals['versions']} versions in {cat.db_path}")
+
+
+@catalog.command('versions')
+@click.argument('root', type=click.Path())
+@click.argument('path')
+@click.option('--db', type=click.Path(dir_okay=False, exists=True), help='Catalog file')
+@click.option('--at', 'when', help='Only the version current at this time (YYYY-MM-DD[ HH:MM])')
+def catalog_versions(root, path, db, when):
+    """Show which snapshots hold versions of PATH (relative to the dataset root)"""
+    cat = open_catalog(root, db)
+    try:
+        if when:
+            try:
+                moment = datetime.fromisoformat(when)
+            except ValueError:
+                click.echo(f"Error: Invalid time: {when}", err=True)
+                sys.exit(1)
+            version = cat.version_at(path, moment)
+            versions = [version] if version else []
+        else:
+            versions = cat.versions(path)
+    finally:
+        cat.close()
+
+    if not versions:
+        click.echo(f"No versions of {path} found")
+        return
+
+    table_data = []
+    for v in versions:
+        snaps = v['snapshots']
+        table_data.append([
+            v['mtime'].strftime('%Y-%m-%d %H:%M:%S'),
+            v['size'],
+            v['type'],
+            v['hash'] or '',
+            len(snaps),
+            snaps[0] if len(snaps) == 1 else f"{snaps[0]} .. {snaps[-1]}",
+        ])
+    click.echo(tabulate(table_data, headers=['Modified', 'Size', 'Type', 'Hash', 'Snapshots', 'Held By'],
+                        tablefmt='grid'))
+    if when:
+        snapshot_dir = snapshot_dirs(Path(root)).get(versions[0]['snapshot'])
+        if snapshot_dir:
+            click.echo(f"\nAs of {when}: {snapshot_dir}{versions[0]['path']}")
+
+
 if __name__ == '__main__':
     cli(obj={})
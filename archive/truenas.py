@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+TrueNAS - Single entry point for the TrueNAS tools
+Subcommands are loaded from the individual tool scripts only when invoked, so
+'truenas health system' imports just the manager it needs, and the config file is
+not read until a command talks to the API.
+
+    python truenas.py health system
+    python truenas.py snapshot list --dataset tank/data
+    python truenas.py replication status
+    python truenas.py dashboard --refresh 2
+"""
+
+from pathlib import Path
+
+import click
+
+from truenas_cli import LazyObject, defer_client, load_tool
+from truenas_profile import profile_option
+from truenas_trace import trace_option, TracedGroup
+
+
+# Subcommand -> (tool script, attribute, help shown without importing the script)
+COMMANDS = {
+    'pool': ('truenas-manager.py', 'pool', 'Pool management commands'),
+    'dataset': ('truenas-manager.py', 'dataset', 'Dataset management commands'),
+    'smb': ('truenas-manager.py', 'smb', 'SMB share management commands'),
+    'user': ('truenas-manager.py', 'user', 'User management commands'),
+    'health': ('truenas-manager.py', 'health', 'System health monitoring commands'),
+    'snapshot': ('truenas-snapshot-manager.py', 'cli', 'Snapshot management and retention'),
+    'replication': ('truenas-replication-manager.py', 'cli', 'Replication tasks, history and monitoring'),
+}
+
+
+class LazyGroup(TracedGroup):
+    """Group that imports a subcommand's tool script only when the subcommand runs"""
+
+    def list_commands(self, ctx):
+        return sorted(list(COMMANDS) + list(self.commands))
+
+    def get_command(self, ctx, name):
+        if name in self.commands:
+            return self.commands[name]
+        if name not in COMMANDS:
+            return None
+        filename, attribute, _ = COMMANDS[name]
+        return getattr(load_tool(filename), attribute)
+
+    def format_commands(self, ctx, formatter):
+        rows = [(name, help_text) for name, (_, _, help_text) in COMMANDS.items()]
+        rows += [(name, cmd.get_short_help_str()) for name, cmd in self.commands.items()]
+        with formatter.section('Commands'):
+            formatter.write_dl(sorted(rows))
+
+
+@click.group(cls=LazyGroup)
+@click.option('--config', type=click.Path(), help='Path to config file')
+@trace_option
+@profile_option
+@click.pass_context
+def cli(ctx, config):
+    """TrueNAS tools"""
+    obj = ctx.ensure_object(LazyObject)
+    obj['config_path'] = Path(config) if config else None
+    # The manager's own subgroups run without its group callback, so register its client here
+    defer_client(ctx, 'manager', lambda: load_tool('truenas-manager.py').TrueNASManager(obj['config_path']))
+
+
+@cli.command('dashboard', context_settings={'ignore_unknown_options': True, 'allow_extra_args': True},
+             add_help_option=False)
+@click.pass_context
+def dashboard(ctx):
+    """Real-time dashboard (takes the dashboard's own options)"""
+    args = list(ctx.args)
+    config_path = ctx.obj['config_path']
+    if config_path and '--config' not in args:
+        args = ['--config', str(config_path)] + args
+    load_tool('truenas-dashboard.py').main(args)
+
+
+if __name__ == '__main__':
+    cli(obj={})
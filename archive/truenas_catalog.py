@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Catalog - Versioned file catalog across snapshots
+Indexes every path in every snapshot of a dataset into a SQLite file, so
+"which snapshots hold a version of P" and "P as of last Tuesday" are single
+indexed lookups instead of walks through .zfs/snapshot by hand.
+
+Each version row covers a run of adjacent snapshots: an entry whose inode,
+size and mtime match the previous snapshot's just stays open, so only
+changed paths are written (and hashed) per snapshot. Builds are incremental:
+newly created snapshots are appended and removed ones are marked as gone.
+
+The source is a mounted dataset (its .zfs/snapshot directory) or, for
+testing, any directory whose subdirectories stand in for snapshots.
+"""
+
+import hashlib
+import os
+import sqlite3
+import stat
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+CATALOG_DIR = Path.home() / ".truenas" / "catalog"
+HASH_CHUNK = 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS snapshots (
+    position INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    created REAL,
+    removed INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS paths (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY,
+    path_id INTEGER NOT NULL REFERENCES paths(id),
+    first INTEGER NOT NULL,
+    last INTEGER,
+    type TEXT NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    hash TEXT
+);
+CREATE INDEX IF NOT EXISTS versions_path ON versions(path_id);
+CREATE INDEX IF NOT EXISTS versions_open ON versions(last) WHERE last IS NULL;
+"""
+
+
+def default_catalog_path(root: Path) -> Path:
+    """Catalog file for a dataset mount point or test tree"""
+    slug = str(Path(root).resolve()).strip('/').replace('/', '_') or 'root'
+    return CATALOG_DIR / f"{slug}.db"
+
+
+def snapshot_dirs(root: Path) -> Dict[str, Path]:
+    """Snapshot name -> directory: .zfs/snapshot/* on a dataset, else the subdirectories"""
+    root = Path(root)
+    source = root / '.zfs' / 'snapshot'
+    if not source.is_dir():
+        source = root
+    return {entry.name: Path(entry.path) for entry in os.scandir(source)
+            if entry.is_dir(follow_symlinks=False)}
+
+
+def _type_of(mode: int) -> str:
+    if stat.S_ISDIR(mode):
+        return 'directory'
+    if stat.S_ISLNK(mode):
+        return 'symlink'
+    return 'file' if stat.S_ISREG(mode) else 'other'
+
+
+def _walk(top: Path) -> Iterator[Tuple[str, os.stat_result]]:
+    """(relative path, lstat) of everything below top, parents before children"""
+    stack = ['']
+    while stack:
+        rel = stack.pop()
+        try:
+            entries = list(os.scandir(top / rel.lstrip('/') if rel else top))
+        except OSError:
+            continue
+        for entry in entries:
+            path = f"{rel}/{entry.name}"
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except OSError:
+                continue
+            yield path, st
+            if stat.S_ISDIR(st.st_mode):
+                stack.append(path)
+
+
+def _hash_file(path: Path) -> Optional[str]:
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+class SnapshotCatalog:
+    """SQLite catalog of file versions across one dataset's snapshots"""
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(self.db_path))
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # ---------- building ----------
+
+    def _path_ids(self, paths: List[str]) -> Dict[str, int]:
+        self.db.executemany("INSERT OR IGNORE INTO paths (path) VALUES (?)", ((p,) for p in paths))
+        ids = {}
+        for start in range(0, len(paths), 500):
+            chunk = paths[start:start + 500]
+            rows = self.db.execute(
+                f"SELECT id, path FROM paths WHERE path IN ({','.join('?' * len(chunk))})", chunk)
+            ids.update((row['path'], row['id']) for row in rows)
+        return ids
+
+    def _open_versions(self) -> Dict[str, Tuple[int, int, int, int]]:
+        """path -> (version id, inode, size, mtime_ns) for versions present in the newest snapshot"""
+        rows = self.db.execute(
+            "SELECT v.id, p.path, v.inode, v.size, v.mtime_ns FROM versions v "
+            "JOIN paths p ON p.id = v.path_id WHERE v.last IS NULL")
+        return {row['path']: (row['id'], row['inode'], row['size'], row['mtime_ns']) for row in rows}
+
+    def build(self, snapshots: List[Tuple[str, Path, Optional[float]]], hash_files: bool = False,
+              progress=None) -> Dict[str, int]:
+        """
+        Index snapshots given oldest first as (name, directory, creation
+        timestamp or None). Snapshots already in the catalog are skipped and
+        ones no longer listed are marked removed; new snapshots must be newer
+        than everything indexed so far, or the catalog is rebuilt.
+        """
+        names = [name for name, _, _ in snapshots]
+        indexed = [row['name'] for row in self.db.execute(
+            "SELECT name FROM snapshots WHERE removed = 0 ORDER BY position")]
+        listed = set(names)
+        # Kept snapshots must keep their order and every new one must come after them
+        kept = [n for n in indexed if n in listed]
+        if kept != names[:len(kept)]:
+            self.db.executescript("DELETE FROM versions; DELETE FROM paths; DELETE FROM snapshots;")
+            kept = []
+        if hash_files != (self._meta('hash') == '1') and kept:
+            raise ValueError("Catalog was built with a different --hash setting; delete it to rebuild")
+        self._set_meta('hash', '1' if hash_files else '0')
+
+        with self.db:
+            self.db.executemany("UPDATE snapshots SET removed = 1 WHERE name = ?",
+                                ((n,) for n in indexed if n not in listed))
+
+        stats = {'snapshots': 0, 'entries': 0, 'new_versions': 0, 'hashed': 0}
+        position = self.db.execute("SELECT COALESCE(MAX(position), -1) FROM snapshots").fetchone()[0]
+        current = self._open_versions()
+
+        for name, directory, created in snapshots[len(kept):]:
+            position += 1
+            if created is None:
+                created = directory.stat().st_mtime
+            seen = set()
+            changed: List[Tuple[str, os.stat_result]] = []
+            for path, st in _walk(directory):
+                seen.add(path)
+                previous = current.get(path)
+                if previous and previous[1:] == (st.st_ino, st.st_size, st.st_mtime_ns):
+                    continue  # same inode, unchanged: the open version carries on
+                changed.append((path, st))
+            closed = [path for path in current if path not in seen]
+            closed += [path for path, _ in changed if path in current]
+
+            with self.db:
+                # A destroyed snapshot's name can come back (a rolling 'daily'); its
+                # row is only kept marked removed, so drop it to keep names unique
+                self.db.execute("DELETE FROM snapshots WHERE name = ? AND removed = 1", (name,))
+                self.db.execute("INSERT INTO snapshots (position, name, created) VALUES (?, ?, ?)",
+                                (position, name, created))
+                self.db.executemany("UPDATE versions SET last = ? WHERE id = ?",
+                                    ((position - 1, current.pop(path)[0]) for path in closed))
+                ids = self._path_ids([path for path, _ in changed])
+                for path, st in changed:
+                    digest = None
+                    if hash_files and stat.S_ISREG(st.st_mode):
+                        digest = _hash_file(directory / path.lstrip('/'))
+                        stats['hashed'] += 1
+                    cursor = self.db.execute(
+                        "INSERT INTO versions (path_id, first, type, inode, size, mtime_ns, hash) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        (ids[path], position, _type_of(st.st_mode), st.st_ino, st.st_size,
+                         st.st_mtime_ns, digest))
+                    current[path] = (cursor.lastrowid, st.st_ino, st.st_size, st.st_mtime_ns)
+
+            stats['snapshots'] += 1
+            stats['entries'] += len(seen)
+            stats['new_versions'] += len(changed)
+            if progress:
+                progress(name, len(seen), len(changed))
+        return stats
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    # ---------- lookups ----------
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        """Indexed snapshots still present, oldest first"""
+        return [dict(row) for row in self.db.execute(
+            "SELECT position, name, created FROM snapshots WHERE removed = 0 ORDER BY position")]
+
+    def versions(self, path: str) -> List[Dict[str, Any]]:
+        """
+        Every version of a path, oldest first, each with the snapshots that
+        hold it (one indexed lookup plus a range scan over the snapshot table)
+        """
+        path = '/' + path.strip('/')
+        rows = self.db.execute(
+            "SELECT v.* FROM versions v JOIN paths p ON p.id = v.path_id WHERE p.path = ? ORDER BY v.first",
+            (path,)).fetchall()
+        if not rows:
+            return []
+        newest = self.db.execute("SELECT MAX(position) FROM snapshots").fetchone()[0]
+        result = []
+        for row in rows:
+            last = newest if row['last'] is None else row['last']
+            snaps = self.db.execute(
+                "SELECT name, created FROM snapshots WHERE position BETWEEN ? AND ? AND removed = 0 "
+                "ORDER BY position", (row['first'], last)).fetchall()
+            if not snaps:
+                continue  # every snapshot holding this version has been destroyed
+            result.append({
+                'path': path,
+                'type': row['type'],
+                'size': row['size'],
+                'mtime': datetime.fromtimestamp(row['mtime_ns'] / 1e9),
+                'inode': row['inode'],
+                'hash': row['hash'],
+                'snapshots': [s['name'] for s in snaps],
+                'first_created': datetime.fromtimestamp(snaps[0]['created']),
+                'last_created': datetime.fromtimestamp(snaps[-1]['created']),
+            })
+        return result
+
+    def version_at(self, path: str, when: datetime) -> Optional[Dict[str, Any]]:
+        """The version of a path in the newest snapshot taken at or before a time"""
+        snapshot = self.db.execute(
+            "SELECT position, name FROM snapshots WHERE removed = 0 AND created <= ? "
+            "ORDER BY position DESC LIMIT 1", (when.timestamp(),)).fetchone()
+        if snapshot is None:
+            return None
+        for version in self.versions(path):
+            if snapshot['name'] in version['snapshots']:
+                return dict(version, snapshot=snapshot['name'])
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        """Catalog size: snapshots, distinct paths and stored versions"""
+        return {
+            'snapshots': self.db.execute("SELECT COUNT(*) FROM snapshots WHERE removed = 0").fetchone()[0],
+            'paths': self.db.execute("SELECT COUNT(*) FROM paths").fetchone()[0],
+            'versions': self.db.execute("SELECT COUNT(*) FROM versions").fetchone()[0],
+        }
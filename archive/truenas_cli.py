@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+TrueNAS CLI - Startup helpers shared by the TrueNAS tools
+Keeps short commands fast: API clients are only built (and the config file only
+read) when a command first uses them, heavy libraries such as tabulate are
+imported on first use rather than when a tool is loaded, and API requests go
+through the resident agent (truenas-agent.py) when one is running.
+"""
+
+import importlib.util
+import json
+import os
+import re
+import socket
+import sys
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import click
+
+
+SCRIPT_DIR = Path(__file__).parent
+
+AGENT_SOCKET_ENV = 'TRUENAS_AGENT_SOCKET'
+DEFAULT_AGENT_SOCKET = Path.home() / ".truenas" / "agent.sock"
+
+# Request arguments the agent can relay; anything else is sent directly
+AGENT_KWARGS = {'headers', 'verify', 'timeout', 'json', 'params'}
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4, 'P': 1024 ** 5}
+
+
+class LazyObject(dict):
+    """Context object whose deferred entries are built on first access"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._factories: Dict[str, Callable[[], Any]] = {}
+
+    def defer(self, key: str, factory: Callable[[], Any]):
+        """Build self[key] with factory the first time it is looked up"""
+        self.pop(key, None)
+        self._factories[key] = factory
+
+    def __missing__(self, key):
+        if key not in self._factories:
+            raise KeyError(key)
+        value = self[key] = self._factories.pop(key)()
+        return value
+
+
+def defer_client(ctx: click.Context, key: str, factory: Callable[[], Any]):
+    """
+    Register an API client as ctx.obj[key] without creating it yet.
+    A missing config file is reported when a command first needs the client.
+    """
+    def build():
+        try:
+            return factory()
+        except FileNotFoundError as e:
+            click.echo(str(e), err=True)
+            sys.exit(1)
+
+    ctx.ensure_object(LazyObject).defer(key, build)
+
+
+def http():
+    """The requests module, imported on the first API call"""
+    import requests
+    import urllib3
+
+    # Disable SSL warnings for self-signed certificates
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    return requests
+
+
+def request_errors():
+    """Exception type raised for failed API requests (for use in except clauses)"""
+    return http().exceptions.RequestException
+
+
+def not_found(error: Exception) -> bool:
+    """Whether a failed API request was a 404 (the object does not exist)"""
+    return getattr(getattr(error, 'response', None), 'status_code', None) == 404
+
+
+def tabulate(*args, **kwargs) -> str:
+    """tabulate.tabulate, imported on first call"""
+    from tabulate import tabulate as _tabulate
+    return _tabulate(*args, **kwargs)
+
+
+def parse_size(value: str) -> int:
+    """Parse a size such as '500G' or '1.5T' into bytes"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGTP]?)(i?B)?\s*', value, re.IGNORECASE)
+    if not match:
+        raise click.BadParameter(f"invalid size '{value}' (e.g. 500G, 1.5T)")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def load_tool(filename: str):
+    """Import one of the hyphen-named tool scripts (once per process)"""
+    name = filename.replace('.py', '').replace('-', '_')
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, SCRIPT_DIR / filename)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
+
+
+# ==================== Agent ====================
+
+def agent_socket_path() -> Path:
+    """Unix socket the agent listens on (TRUENAS_AGENT_SOCKET overrides)"""
+    return Path(os.environ.get(AGENT_SOCKET_ENV) or DEFAULT_AGENT_SOCKET)
+
+
+def agent_call(message: Dict[str, Any], timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Send one message to the agent and return its reply header, with any
+    body under 'content'. Returns None when no agent is listening.
+    """
+    path = agent_socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not path.exists():
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(str(path))
+        except OSError:
+            return None  # stale socket file: the agent is not running
+        try:
+            sock.sendall(json.dumps(message).encode() + b'\n')
+            reader = sock.makefile('rb')
+            header = json.loads(reader.readline())
+            header['content'] = reader.read(header.get('length', 0))
+        except (OSError, ValueError) as e:
+            raise http().exceptions.ConnectionError(f"Agent at {path} failed: {e}")
+        return header
+    finally:
+        sock.close()
+
+
+class AgentResponse:
+    """Response relayed by the agent, with the parts of requests.Response the tools use"""
+
+    def __init__(self, url: str, status_code: int, headers: Dict[str, str], content: bytes,
+                 cached: bool = False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.cached = cached
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    @property
+    def text(self) -> str:
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self, **kwargs):
+        return json.loads(self.content, **kwargs)
+
+    def raise_for_status(self):
+        if not self.ok:
+            requests = http()
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+def agent_select(url: str, field: str, value: Any, **kwargs) -> Optional[AgentResponse]:
+    """
+    The records of a list endpoint whose field equals value, served from the
+    agent's in-memory index of its cached response. None when no agent is
+    running (the caller then lists and filters as usual).
+    """
+    if not set(kwargs) <= AGENT_KWARGS:
+        return None
+    timeout = kwargs.get('timeout')
+    reply = agent_call({'op': 'select', 'url': url, 'field': field, 'value': value, **kwargs},
+                       timeout=timeout + 5 if timeout else None)
+    if reply is None or 'error' in reply:
+        return None
+    return AgentResponse(url, reply['status'], reply['headers'], reply['content'], cached=reply.get('cached', False))
+
+
+def send_request(method: str, url: str, **kwargs):
+    """Send an API request through the agent when it is running, else directly"""
+    if set(kwargs) <= AGENT_KWARGS:
+        timeout = kwargs.get('timeout')
+        reply = agent_call({'op': 'request', 'method': method, 'url': url, **kwargs},
+                           timeout=timeout + 5 if timeout else None)
+        if reply is not None:
+            if 'error' in reply:
+                raise http().exceptions.ConnectionError(reply['error'])
+            return AgentResponse(url, reply['status'], reply['headers'], reply['content'],
+                                 cached=reply.get('cached', False))
+    return http().request(method, url, **kwargs)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Export - Compact columnar snapshot list files
+Stores a snapshot listing (id, dataset, name, creation to the second, used,
+written, referenced and user properties) as one binary file for offline analysis and
+comparing hosts without the API.
+
+Layout: an 8-byte magic, the JSON header length, the header (row count,
+dictionaries and where each column lives), then each column as a packed
+little-endian array aligned to 8 bytes. Dataset names and user property names
+are dictionary-encoded into the smallest integer type that fits; names and
+property values are one UTF-8 blob plus offsets. Reading maps the file and
+views the columns in place (numpy.frombuffer over mmap), so loading costs no
+more than the columns actually used.
+"""
+
+import json
+import mmap
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from truenas_query import creation_time
+
+
+MAGIC = b'TNSNAPX1'
+VERSION = 1
+ALIGN = 8
+EPOCH = datetime(1970, 1, 1)
+NO_TIME = -(2 ** 63)  # creation could not be parsed
+SIZE_PROPERTIES = ('used', 'written', 'referenced')
+
+
+class ExportError(Exception):
+    """The file is not a snapshot export this version can read"""
+
+
+def _code_dtype(count: int) -> str:
+    """Smallest unsigned type that can index a dictionary of count entries"""
+    return '<u1' if count <= 2 ** 8 else '<u2' if count <= 2 ** 16 else '<u4'
+
+
+def _strings(values: List[str]) -> Tuple[Any, Any]:
+    """UTF-8 blob and offsets (len + 1) for a string column"""
+    import numpy as np
+
+    encoded = [v.encode() for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(e) for e in encoded], out=offsets[1:])
+    dtype = '<u4' if offsets[-1] < 2 ** 32 else '<u8'
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets.astype(dtype)
+
+
+def _seconds(snapshot: Dict[str, Any]) -> int:
+    created = creation_time(snapshot)
+    if created == datetime.min:
+        return NO_TIME
+    return int((created.replace(tzinfo=None) - EPOCH).total_seconds())
+
+
+def _size(snapshot: Dict[str, Any], name: str) -> int:
+    value = snapshot.get('properties', {}).get(name, {})
+    return int(value.get('parsed') or 0) if isinstance(value, dict) else 0
+
+
+def write_export(path: Path, snapshots: List[Dict[str, Any]], source: str = '') -> Dict[str, int]:
+    """Write snapshots (API records) to path; returns rows and file size"""
+    import numpy as np
+
+    datasets = sorted({s['dataset'] for s in snapshots})
+    dataset_codes = {name: i for i, name in enumerate(datasets)}
+    # Only the part after '@' is stored; the dataset is already a column
+    names = [s['snapshot_name'] for s in snapshots]
+
+    user_rows, user_keys, user_values = [], [], []
+    for row, snap in enumerate(snapshots):
+        for key, value in snap.get('properties', {}).items():
+            if ':' in key:  # ZFS user properties are module:property
+                user_rows.append(row)
+                user_keys.append(key)
+                user_values.append(str(value.get('value', '') if isinstance(value, dict) else value))
+    properties = sorted(set(user_keys))
+    property_codes = {name: i for i, name in enumerate(properties)}
+
+    name_blob, name_offsets = _strings(names)
+    value_blob, value_offsets = _strings(user_values)
+    columns = {
+        'dataset': np.array([dataset_codes[s['dataset']] for s in snapshots], dtype=_code_dtype(len(datasets))),
+        'creation': np.array([_seconds(s) for s in snapshots], dtype='<i8'),
+        'name_offsets': name_offsets,
+        'name_blob': name_blob,
+        'prop_rows': np.array(user_rows, dtype='<u4'),
+        'prop_keys': np.array([property_codes[k] for k in user_keys], dtype=_code_dtype(len(properties))),
+        'prop_value_offsets': value_offsets,
+        'prop_value_blob': value_blob,
+    }
+    for name in SIZE_PROPERTIES:
+        columns[name] = np.array([_size(s, name) for s in snapshots], dtype='<u8')
+
+    layout, offset = {}, 0
+    for name, array in columns.items():
+        layout[name] = {'dtype': array.dtype.str, 'count': len(array), 'offset': offset}
+        offset += -(-array.nbytes // ALIGN) * ALIGN
+
+    header = json.dumps({
+        'version': VERSION,
+        'rows': len(snapshots),
+        'exported': datetime.now().isoformat(timespec='seconds'),
+        'source': source,
+        'datasets': datasets,
+        'properties': properties,
+        'columns': layout,
+    }).encode()
+    header += b' ' * (-(len(MAGIC) + 8 + len(header)) % ALIGN)
+
+    path = Path(path)
+    with open(path, 'wb') as f:
+        f.write(MAGIC + len(header).to_bytes(8, 'little') + header)
+        for array in columns.values():
+            data = array.tobytes()
+            f.write(data + b'\0' * (-len(data) % ALIGN))
+    return {'rows': len(snapshots), 'bytes': path.stat().st_size}
+
+
+class SnapshotExport:
+    """A snapshot export mapped into memory; columns are numpy views of the file"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise ExportError(f"{self.path} is empty")
+        if self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ExportError(f"{self.path} is not a snapshot export")
+        length = int.from_bytes(self._map[len(MAGIC):len(MAGIC) + 8], 'little')
+        self._data = len(MAGIC) + 8 + length
+        self.header = json.loads(self._map[len(MAGIC) + 8:self._data])
+        if self.header.get('version') != VERSION:
+            self._map.close()
+            raise ExportError(f"{self.path} is export version {self.header.get('version')}, expected {VERSION}")
+        self.datasets: List[str] = self.header['datasets']
+        self.properties: List[str] = self.header['properties']
+        self.source: str = self.header.get('source', '')
+        self.exported: str = self.header.get('exported', '')
+
+    def close(self):
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # a column view is still in use; the map closes when it is released
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.header['rows']
+
+    def column(self, name: str):
+        """One column as a read-only numpy view of the mapped file"""
+        import numpy as np
+
+        spec = self.header['columns'][name]
+        return np.frombuffer(self._map, dtype=np.dtype(spec['dtype']), count=spec['count'],
+                             offset=self._data + spec['offset'])
+
+    def _decode(self, prefix: str, rows: Optional[List[int]] = None) -> List[str]:
+        offsets = self.column(f"{prefix}_offsets")
+        starts, ends = offsets[:-1], offsets[1:]
+        if rows is not None:
+            starts, ends = starts[rows], ends[rows]
+        base = self._data + self.header['columns'][f"{prefix}_blob"]['offset']
+        blob = self._map
+        return [blob[base + a:base + b].decode() for a, b in zip(starts.tolist(), ends.tolist())]
+
+    def names(self, rows: Optional[List[int]] = None) -> List[str]:
+        """Snapshot names (the part after '@'), of every row or just the given ones"""
+        return self._decode('name', rows)
+
+    def select(self, datasets: Optional[Iterable[str]] = None, dataset_prefix: Optional[str] = None,
+               created_after: Optional[datetime] = None, created_before: Optional[datetime] = None) -> List[int]:
+        """
+        Rows within dataset and creation bounds, found on the columns (dataset
+        codes and creation seconds) without decoding any records
+        """
+        import numpy as np
+
+        mask = np.ones(len(self), dtype=bool)
+        if datasets is not None or dataset_prefix is not None:
+            wanted = [i for i, name in enumerate(self.datasets)
+                      if (datasets is None or name in datasets)
+                      and (dataset_prefix is None or name.startswith(dataset_prefix))]
+            mask &= np.isin(self.column('dataset'), wanted)
+        creation = self.column('creation')
+        if created_after is not None:
+            mask &= (creation != NO_TIME) & (creation >= (created_after - EPOCH).total_seconds())
+        if created_before is not None:
+            mask &= (creation != NO_TIME) & (creation <= (created_before - EPOCH).total_seconds())
+        return np.flatnonzero(mask).tolist()
+
+    def records(self, rows: Optional[List[int]] = None) -> Iterator[Dict[str, Any]]:
+        """Snapshots as API-shaped records, in export order (every row or just the given ones)"""
+        datasets = self.datasets
+        if rows is None:
+            rows = range(len(self))
+        codes = self.column('dataset').tolist()
+        creation = self.column('creation').tolist()
+        sizes = {name: self.column(name).tolist() for name in SIZE_PROPERTIES}
+
+        user: Dict[int, Dict[str, Any]] = {}
+        if len(self.column('prop_rows')):
+            for row, key, value in zip(self.column('prop_rows').tolist(), self.column('prop_keys').tolist(),
+                                       self._decode('prop_value')):
+                user.setdefault(row, {})[self.properties[key]] = {'value': value, 'parsed': value}
+
+        for row, name in zip(rows, self.names(None if isinstance(rows, range) else rows)):
+            dataset = datasets[codes[row]]
+            snapshot_id = f"{dataset}@{name}"
+            seconds = creation[row]
+            properties = {
+                'creation': {'value': '' if seconds == NO_TIME else (EPOCH + timedelta(seconds=seconds)).isoformat(),
+                             'parsed': None if seconds == NO_TIME else seconds},
+            }
+            for prop in SIZE_PROPERTIES:
+                properties[prop] = {'value': str(sizes[prop][row]), 'parsed': sizes[prop][row]}
+            properties.update(user.get(row, {}))
+            yield {
+                'id': snapshot_id,
+                'name': snapshot_id,
+                'snapshot_name': name,
+                'dataset': dataset,
+                'pool': dataset.split('/', 1)[0],
+                'type': 'SNAPSHOT',
+                'properties': properties,
+            }
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per-dataset count, space and creation range, computed on the columns directly"""
+        import numpy as np
+
+        codes = self.column('dataset')
+        n = len(self.datasets)
+        count = np.bincount(codes, minlength=n)
+        totals = {prop: np.bincount(codes, weights=self.column(prop), minlength=n) for prop in SIZE_PROPERTIES}
+        creation = self.column('creation')
+        known = creation != NO_TIME
+        oldest = np.full(n, np.iinfo(np.int64).max)
+        newest = np.full(n, np.iinfo(np.int64).min)
+        np.minimum.at(oldest, codes[known], creation[known])
+        np.maximum.at(newest, codes[known], creation[known])
+        dated = np.bincount(codes[known], minlength=n)
+
+        def when(i: int, seconds) -> Optional[datetime]:
+            return EPOCH + timedelta(seconds=int(seconds)) if dated[i] else None
+
+        return [{
+            'dataset': dataset,
+            'snapshots': int(count[i]),
+            'used': int(totals['used'][i]),
+            'written': int(totals['written'][i]),
+            'referenced': int(totals['referenced'][i]),
+            'oldest': when(i, oldest[i]),
+            'newest': when(i, newest[i]),
+        } for i, dataset in enumerate(self.datasets)]
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Journal - Write-ahead journal for bulk operations
+A bulk run (deleting snapshots, datasets or shares) first writes its whole plan
+to ~/.truenas/journal/<name>.jsonl and syncs it to disk, then appends one line
+per item as it completes. An interrupted run can therefore be resumed from
+the journal alone: the remaining items are carried out without listing or
+planning anything again on the NAS.
+
+The journal is compacted (rewritten as a plan of the remaining items) once the
+completion lines outnumber the items left, so it stays proportional to the
+work outstanding, and it is removed when every item has completed. A new run
+refuses to replace a journal that still has items pending unless told to
+discard it.
+"""
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import click
+
+
+JOURNAL_DIR = Path.home() / ".truenas" / "journal"
+# Never compact for fewer completion lines than this
+COMPACT_MIN = 256
+
+
+class JournalError(Exception):
+    """The journal is missing or cannot be read"""
+
+
+def journal_name(*parts: str) -> str:
+    """File-safe journal name, e.g. journal_name('retention', 'tank/data')"""
+    return '-'.join(part.replace('/', '_').replace('@', '_') for part in parts if part)
+
+
+class Journal:
+    """
+    One bulk operation's plan and progress. Items are dicts with a unique
+    'key' plus whatever the operation needs to carry them out.
+    """
+
+    def __init__(self, name: str, directory: Optional[Path] = None):
+        self.name = name
+        self.path = Path(directory or JOURNAL_DIR) / f"{name}.jsonl"
+        self.operation: Optional[str] = None
+        self.params: Dict[str, Any] = {}
+        self.started: Optional[str] = None
+        self.items: Dict[str, Dict[str, Any]] = {}  # pending, in plan order
+        self.completed = 0
+        self.failed: Dict[str, str] = {}
+        self._lines = 0  # completion lines since the plan was written
+        self._file = None
+
+    # ---------- writing ----------
+
+    def _write(self, record: Dict[str, Any], sync: bool = True):
+        self._file.write(json.dumps(record, default=str) + '\n')
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    def _write_plan(self):
+        """Write the pending items as a fresh journal and switch to it atomically"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temp = self.path.with_suffix('.tmp')
+        with open(temp, 'w') as f:
+            f.write(json.dumps({
+                'plan': self.operation,
+                'params': self.params,
+                'started': self.started,
+                'completed': self.completed,
+                'items': list(self.items.values()),
+            }, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path)
+        if self._file:
+            self._file.close()
+        self._file = open(self.path, 'a')
+        self._lines = 0
+
+    def begin(self, operation: str, items: List[Dict[str, Any]], discard: bool = False, **params):
+        """
+        Record the plan before anything is done. An earlier journal with items
+        still pending is only replaced with discard; otherwise JournalError.
+        """
+        if not discard and self.path.exists():
+            previous = Journal(self.name, self.path.parent)
+            try:
+                previous._replay()
+            except JournalError:
+                pass  # no readable plan, so nothing that could be resumed
+            if previous.items:
+                raise JournalError(
+                    f"An interrupted {previous.operation} started {previous.started} still has "
+                    f"{len(previous.items)} items left; finish it with --resume or start over with --discard-journal")
+        self.operation = operation
+        self.params = params
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self.items = {str(item['key']): item for item in items}
+        self.completed = 0
+        self.failed = {}
+        self._write_plan()
+
+    def complete(self, key: Any):
+        key = str(key)
+        self.items.pop(key, None)
+        self.failed.pop(key, None)
+        self.completed += 1
+        self._write({'done': key})
+        self._lines += 1
+        if self._lines >= max(COMPACT_MIN, len(self.items)):
+            self.compact()
+
+    def fail(self, key: Any, error: str):
+        """Record a failed item; it stays pending for the next --resume"""
+        key = str(key)
+        self.failed[key] = error
+        self._write({'failed': key, 'error': error})
+        self._lines += 1
+
+    def compact(self):
+        """Rewrite the journal as a plan of the items still pending"""
+        self._write_plan()
+
+    def close(self):
+        """Close the journal, removing it once nothing is left to do"""
+        if self._file:
+            self._file.close()
+            self._file = None
+        if not self.items and self.path.exists():
+            self.path.unlink()
+
+    # ---------- reading ----------
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def load(self) -> 'Journal':
+        """Replay the journal: the plan, minus completed items, with failures noted"""
+        self._replay()
+        # Resume from a compact journal (also drops any torn line)
+        self._write_plan()
+        return self
+
+    def _replay(self):
+        """Read the plan and completion lines into this journal, leaving the file as it is"""
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            raise JournalError(f"No interrupted run to resume ({self.path} not found)")
+
+        try:
+            plan = json.loads(lines[0])
+        except (IndexError, ValueError):
+            raise JournalError(f"Journal {self.path} has no readable plan")
+        self.operation = plan['plan']
+        self.params = plan.get('params', {})
+        self.started = plan.get('started')
+        self.completed = plan.get('completed', 0)
+        self.items = {str(item['key']): item for item in plan['items']}
+        self.failed = {}
+
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  # torn final line from a crash: everything before it is intact
+            if 'done' in record:
+                if self.items.pop(record['done'], None) is not None:
+                    self.completed += 1
+                self.failed.pop(record['done'], None)
+            elif 'failed' in record:
+                self.failed[record['failed']] = record.get('error', '')
+
+    def pending(self) -> List[Dict[str, Any]]:
+        return list(self.items.values())
+
+
+def run_journal(journal: Journal, action: Callable[[Dict[str, Any]], None],
+                describe: Callable[[Dict[str, Any]], str] = lambda item: str(item['key'])) -> Dict[str, int]:
+    """
+    Carry out the journal's pending items in plan order. Failures are recorded
+    and skipped; an interruption (Ctrl-C, or an API error that exits) leaves
+    the journal in place with a hint to resume.
+    """
+    done = failed = 0
+    finished = False
+    try:
+        for item in journal.pending():
+            try:
+                action(item)
+            except Exception as e:
+                journal.fail(item['key'], str(e))
+                click.echo(f"Warning: Failed on {describe(item)}: {e}", err=True)
+                failed += 1
+                continue
+            journal.complete(item['key'])
+            done += 1
+        finished = True
+    finally:
+        left = len(journal.items)
+        journal.close()
+        if left and not finished:
+            click.echo(f"\nInterrupted with {left} items left; run the same command with --resume to continue",
+                       err=True)
+        elif left:
+            click.echo(f"{left} items failed; run the same command with --resume to retry them", err=True)
+    return {'done': done, 'failed': failed, 'left': left}
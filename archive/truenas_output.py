@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Output - Row output shared by the list commands
+Rows are written as they are produced: one JSON object per line (ndjson),
+CSV or TSV with raw values (sizes in bytes) for scripts, or the usual grid
+table. With --page-size the table is rendered a page at a time, through the
+terminal pager when output is interactive, so large listings start showing
+immediately instead of after every row has been formatted.
+"""
+
+import csv
+import json
+import sys
+from datetime import date, datetime
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+import click
+
+from truenas_cli import tabulate
+
+
+FORMATS = ['table', 'ndjson', 'csv', 'tsv']
+
+
+class Column(NamedTuple):
+    """One output column: table header, record key and how the table shows the value"""
+    header: str
+    key: str
+    display: Optional[Callable[[Any], Any]] = None
+
+
+def gigabytes(decimals: int = 2) -> Callable[[Any], str]:
+    """Table display of a byte count in GB"""
+    return lambda value: f"{(value or 0) / (1024**3):.{decimals}f} GB"
+
+
+def human_size(value: float) -> str:
+    """Byte count in the largest unit that keeps it at or above 1: '512 B', '3.2 MB', '1.5 TB'"""
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if abs(value) < 1024 or unit == 'TB':
+            return f"{value:.0f} {unit}" if unit == 'B' else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+def yes_no(value: Any) -> str:
+    return 'Yes' if value else 'No'
+
+
+def output_options(f):
+    """--format and --page-size options for a list command"""
+    f = click.option('--page-size', type=int, default=0,
+                     help='Show the table in pages of N rows (through the pager on a terminal)')(f)
+    f = click.option('--format', 'output_format', type=click.Choice(FORMATS), default='table',
+                     help='Output format; ndjson, csv and tsv stream raw values')(f)
+    return f
+
+
+def _raw(value: Any) -> Any:
+    """JSON-friendly form of a record value"""
+    return value.isoformat() if isinstance(value, (datetime, date)) else value
+
+
+def _cell(value: Any) -> Any:
+    """CSV/TSV form of a record value: lists become comma-separated text"""
+    if isinstance(value, (list, tuple)):
+        return ','.join(str(v) for v in value)
+    return _raw(value)
+
+
+def _table_pages(rows: Iterator[Dict[str, Any]], columns: List[Column], page_size: int,
+                 tablefmt: str) -> Iterator[str]:
+    headers = [c.header for c in columns]
+    while True:
+        page = [[c.display(row.get(c.key)) if c.display else row.get(c.key) for c in columns]
+                for row in islice(rows, page_size)]
+        if not page:
+            return
+        yield tabulate(page, headers=headers, tablefmt=tablefmt) + '\n'
+
+
+def write_rows(rows: Iterable[Dict[str, Any]], columns: List[Column], output_format: str = 'table',
+               page_size: int = 0, tablefmt: str = 'grid') -> int:
+    """Write records in the chosen format as they arrive; returns how many were written"""
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    if output_format == 'ndjson':
+        out = sys.stdout
+        for row in counted():
+            out.write(json.dumps({c.key: _raw(row.get(c.key)) for c in columns}, default=str) + '\n')
+    elif output_format in ('csv', 'tsv'):
+        writer = csv.writer(sys.stdout, delimiter=',' if output_format == 'csv' else '\t',
+                            lineterminator='\n')
+        writer.writerow([c.key for c in columns])
+        for row in counted():
+            writer.writerow([_cell(row.get(c.key)) for c in columns])
+    elif page_size > 0:
+        pages = _table_pages(counted(), columns, page_size, tablefmt)
+        if sys.stdout.isatty():
+            click.echo_via_pager(pages)
+        else:
+            for page in pages:
+                click.echo(page)
+    else:
+        table = list(_table_pages(counted(), columns, sys.maxsize, tablefmt))
+        click.echo(table[0].rstrip('\n') if table else tabulate([], headers=[c.header for c in columns],
+                                                                   tablefmt=tablefmt))
+    sys.stdout.flush()
+    return count
+
+
+def echo_summary(output_format: str, message: str):
+    """Print a footer such as a total, only in table output so the data formats stay clean"""
+    if output_format == 'table':
+        click.echo(message)
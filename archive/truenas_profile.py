@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Profile - Sampling profiler shared by the TrueNAS tools
+Samples every thread's Python stack at a fixed interval while a command runs,
+writes the samples as collapsed stacks (flamegraph.pl, speedscope, inferno) and
+prints the top self-time functions, separating local CPU work such as JSON
+parsing and table rendering from time spent waiting on the network.
+
+Enable with --profile PATH on any tool.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional, Dict, Any, List, Tuple
+
+import click
+
+
+DEFAULT_INTERVAL = 0.005
+
+# Leaf frames in these files mean the thread is blocked on a socket
+NETWORK_FILES = ('socket.py', 'ssl.py', 'selectors.py')
+NETWORK_FUNCTIONS = ('create_connection', 'getaddrinfo')
+# Leaf functions that block an idle thread (pool workers waiting for work, joins, sleeps);
+# used when a thread's CPU clock cannot tell
+IDLE_FUNCTIONS = ('wait', 'get', 'select', 'poll', 'recv', 'acquire', 'sleep', 'join', '_wait_for_tstate_lock')
+
+# Components that CPU time is attributed to, matched against frame file paths
+COMPONENTS = [
+    ('json', ('json' + os.sep,)),
+    ('tabulate', ('tabulate',)),
+    ('rich', ('rich' + os.sep,)),
+    ('click', ('click' + os.sep,)),
+    ('http client', ('requests' + os.sep, 'urllib3' + os.sep, 'http' + os.sep + 'client.py')),
+    ('ssl', ('ssl.py',)),
+    ('import', ('importlib', '<frozen')),
+]
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+TOOL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _component(stack: Tuple[Any, ...]) -> str:
+    """Innermost known component on the stack, stopping at the tools' own code"""
+    for code in reversed(stack):
+        if os.path.dirname(os.path.abspath(code.co_filename)) == TOOL_DIR:
+            return 'tool code'
+        for name, markers in COMPONENTS:
+            if any(marker in code.co_filename for marker in markers):
+                return name
+    return 'other'
+
+
+class SamplingProfiler:
+    """Low-overhead stack sampler running in a background thread"""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        self.interval = interval
+        self.output: Optional[str] = None
+        # (thread name, stack, state) -> seconds; each sample is weighted by the real
+        # time since the previous one, since the sampler competes for the GIL
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self._elapsed = 0.0
+        # Per-thread CPU clocks (None where unavailable) and their last readings
+        self._cpu_clocks: Dict[int, Optional[int]] = {}
+        self._cpu_last: Dict[int, float] = {}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, output: Optional[str] = None):
+        """Begin sampling; output is the collapsed-stack file to write"""
+        self.output = output
+        self._cpu_clocks, self._cpu_last = {}, {}
+        self._stop.clear()
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling"""
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._elapsed = time.perf_counter() - self._started
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        last = time.perf_counter()
+
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            self.sample_count += 1
+
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                stack.reverse()
+                state = self._classify(stack, self._busy(ident, weight))
+                self.samples[(names.get(ident, str(ident)), tuple(stack), state)] += weight
+
+            # Thread ids are reused: forget the clocks of threads that have ended
+            for ident in [i for i in self._cpu_clocks if i not in frames]:
+                del self._cpu_clocks[ident]
+                self._cpu_last.pop(ident, None)
+
+    def _busy(self, ident: int, weight: float) -> Optional[bool]:
+        """
+        Whether a thread was on CPU for most of the last interval, from its own
+        CPU clock (Unix); None when there is no clock or no earlier reading
+        """
+        if ident not in self._cpu_clocks:
+            try:
+                self._cpu_clocks[ident] = time.pthread_getcpuclockid(ident)
+            except (AttributeError, OSError, OverflowError):
+                self._cpu_clocks[ident] = None
+        clock = self._cpu_clocks[ident]
+        if clock is None:
+            return None
+        try:
+            cpu = time.clock_gettime(clock)
+        except OSError:
+            self._cpu_clocks[ident] = None
+            return None
+        previous, self._cpu_last[ident] = self._cpu_last.get(ident), cpu
+        return None if previous is None else (cpu - previous) >= weight * 0.5
+
+    @staticmethod
+    def _classify(stack: List[Any], busy: Optional[bool]) -> str:
+        leaf = stack[-1] if stack else None
+        if leaf is not None and (os.path.basename(leaf.co_filename) in NETWORK_FILES
+                                 or leaf.co_name in NETWORK_FUNCTIONS):
+            return 'network wait'
+        if busy is False or (busy is None and leaf is not None and leaf.co_name in IDLE_FUNCTIONS):
+            return 'other wait'
+        return 'cpu'
+
+    # ==================== Output ====================
+
+    def collapsed_stacks(self) -> List[str]:
+        """'thread;outer;...;leaf microseconds' lines for flame graph tools"""
+        lines = Counter()
+        for (thread, stack, state), seconds in self.samples.items():
+            frames = [thread] + [_frame_label(code) for code in stack]
+            if state != 'cpu':
+                frames.append(f"[{state}]")
+            lines[';'.join(frames)] += seconds
+        return [f"{stack} {int(seconds * 1e6)}" for stack, seconds in sorted(lines.items())]
+
+    def self_time(self) -> List[Dict[str, Any]]:
+        """Leaf functions by sampled self time"""
+        totals: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for (_, stack, state), seconds in self.samples.items():
+            if not stack:
+                continue
+            key = (_frame_label(stack[-1]), state)
+            entry = totals.setdefault(key, {
+                'function': key[0], 'state': state,
+                'component': _component(stack) if state == 'cpu' else '-', 'ms': 0.0
+            })
+            entry['ms'] += seconds * 1000
+        return sorted(totals.values(), key=lambda r: r['ms'], reverse=True)
+
+    def breakdown(self) -> Dict[str, float]:
+        """Sampled milliseconds per state, with CPU split by component"""
+        result: Counter = Counter()
+        for (_, stack, state), seconds in self.samples.items():
+            label = f"cpu: {_component(stack)}" if state == 'cpu' else state
+            result[label] += seconds * 1000
+        return dict(result.most_common())
+
+    def print_report(self, top: int = 15, file=None):
+        """Print the component breakdown and top self-time functions"""
+        from tabulate import tabulate
+
+        file = file or sys.stderr
+        print(f"\nProfile: {self.sample_count} samples (target interval {self.interval * 1000:.0f} ms) "
+              f"over {self._elapsed * 1000:.0f} ms wall", file=file)
+        if not self.samples:
+            return
+
+        breakdown = self.breakdown()
+        sampled_ms = sum(breakdown.values())
+        print(tabulate([[label, f"{ms:.0f}", f"{ms / sampled_ms:.1%}"] for label, ms in breakdown.items()],
+                       headers=['Where', 'ms', 'Share'], tablefmt='simple'), file=file)
+        print(file=file)
+        print(tabulate([[r['function'], r['state'], r['component'], f"{r['ms']:.0f}"]
+                        for r in self.self_time()[:top]],
+                       headers=['Function (self time)', 'State', 'Component', 'ms'], tablefmt='simple'),
+              file=file)
+
+    def finish(self):
+        """Stop sampling, write the collapsed stacks and print the report"""
+        if not self.running:
+            return
+        self.stop()
+        if self.output:
+            with open(self.output, 'w') as f:
+                f.write('\n'.join(self.collapsed_stacks()) + '\n')
+        self.print_report()
+        if self.output:
+            print(f"Collapsed stacks written to: {self.output}", file=sys.stderr)
+
+
+profiler = SamplingProfiler()
+
+
+# ==================== Click Integration ====================
+
+def _enable_profile(ctx, param, value):
+    if value:
+        profiler.start(value)
+        ctx.call_on_close(profiler.finish)
+    return value
+
+
+profile_option = click.option(
+    '--profile', type=click.Path(dir_okay=False), metavar='PATH', expose_value=False,
+    is_eager=True, callback=_enable_profile,
+    help='Sample the command and write collapsed stacks (flame graph input) to PATH'
+)
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Query - Compact snapshot query expressions
+Compiles an expression such as
+
+    dataset^tank/backups and used>1G and age<7d and name~^auto-
+
+into one Python predicate that evaluates every condition in a single pass,
+and extracts the dataset and creation-time bounds, so a listing can be
+narrowed before the predicate runs (one dataset's listing, or the dataset and
+creation columns of a snapshot export) and skip snapshots that cannot match.
+
+Fields: name (the snapshot name after '@'), dataset, id (the full
+dataset@name), used, referenced, written (sizes such as 1.5G),
+age (durations such as 36h or 7d), created (dates such as 2024-01-31), and
+prop.NAME for any other property. Operators: = != < <= > >=, ~ and !~
+(regex search), ^ (starts with), $ (ends with). Combine with and, or, not
+and parentheses; quote values containing spaces or parentheses.
+"""
+
+import re
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import click
+
+from truenas_cli import parse_size
+from truenas_retention import parse_duration
+
+
+SIZE_FIELDS = ('used', 'referenced', 'written')
+TEXT_FIELDS = ('name', 'dataset', 'id')
+
+TOKEN = re.compile(r'''
+    \s*(?:
+        (?P<paren>[()])
+      | (?P<field>[A-Za-z_][\w.:-]*?)\s*(?P<op>!~|!=|<=|>=|~|\^|\$|=|<|>)\s*
+        (?P<value>"(?:[^"\\]|\\.)*"|'[^']*'|[^\s()]+)
+      | (?P<word>[A-Za-z]+)
+    )''', re.VERBOSE)
+
+COMPARISONS = {'=': '==', '!=': '!=', '<': '<', '<=': '<=', '>': '>', '>=': '>='}
+# age<7d means created after now-7d, so the comparison flips
+FLIPPED = {'<': '>', '<=': '>=', '>': '<', '>=': '<=', '=': '=', '!=': '!='}
+
+
+class QueryError(ValueError):
+    """A query expression could not be parsed"""
+
+
+def creation_time(snapshot: Dict[str, Any]) -> datetime:
+    """Snapshot creation time, as SnapshotManager._parse_creation_time reads it"""
+    creation = snapshot.get('properties', {}).get('creation', {}).get('value', '')
+    try:
+        return datetime.fromisoformat(creation)
+    except (TypeError, ValueError):
+        return datetime.min
+
+
+def _size(snapshot: Dict[str, Any], name: str) -> int:
+    value = snapshot.get('properties', {}).get(name, {})
+    return int(value.get('parsed') or 0) if isinstance(value, dict) else 0
+
+
+def _text(snapshot: Dict[str, Any], name: str) -> str:
+    value = snapshot.get('properties', {}).get(name, {})
+    return str(value.get('value', '')) if isinstance(value, dict) else ''
+
+
+class Query:
+    """A compiled query: call it on a snapshot record, or read its dataset and creation bounds"""
+
+    def __init__(self, expression: str, now: Optional[datetime] = None):
+        self.expression = expression
+        self.now = now or datetime.now()
+        self._constants: List[Any] = []
+        self._tokens = self._tokenize(expression)
+        self._pos = 0
+
+        tree = self._parse_or()
+        if self._pos != len(self._tokens):
+            raise QueryError(f"Unexpected '{self._describe(self._tokens[self._pos])}' in query")
+
+        self.source = f"lambda s: {self._emit(tree)}"
+        namespace = {f"_c{i}": c for i, c in enumerate(self._constants)}
+        namespace.update(_size=_size, _text=_text, _created=creation_time)
+        self.predicate: Callable[[Dict[str, Any]], bool] = eval(compile(self.source, '<query>', 'eval'), namespace)
+        self._bounds(tree)
+
+    def __call__(self, snapshot: Dict[str, Any]) -> bool:
+        return self.predicate(snapshot)
+
+    def filter(self, snapshots: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Matching snapshots, in one pass"""
+        predicate = self.predicate
+        return [s for s in snapshots if predicate(s)]
+
+    # ---------- parsing ----------
+
+    @staticmethod
+    def _tokenize(expression: str) -> List[Any]:
+        tokens, pos = [], 0
+        expression = expression.rstrip()
+        while pos < len(expression):
+            match = TOKEN.match(expression, pos)
+            if not match or match.end() == pos:
+                raise QueryError(f"Cannot parse query at: {expression[pos:].strip()}")
+            pos = match.end()
+            if match.group('paren'):
+                tokens.append(match.group('paren'))
+            elif match.group('field'):
+                value = match.group('value')
+                if value[0] in '"\'':
+                    value = re.sub(r'\\(.)', r'\1', value[1:-1]) if value[0] == '"' else value[1:-1]
+                tokens.append(('cmp', match.group('field'), match.group('op'), value))
+            else:
+                word = match.group('word').lower()
+                if word not in ('and', 'or', 'not'):
+                    raise QueryError(f"Expected a condition such as name^auto- but found '{word}'")
+                tokens.append(word)
+        if not tokens:
+            raise QueryError("Empty query")
+        return tokens
+
+    @staticmethod
+    def _describe(token) -> str:
+        return ''.join(token[1:]) if isinstance(token, tuple) else token
+
+    def _peek(self):
+        return self._tokens[self._pos] if self._pos < len(self._tokens) else None
+
+    def _parse_or(self):
+        terms = [self._parse_and()]
+        while self._peek() == 'or':
+            self._pos += 1
+            terms.append(self._parse_and())
+        return terms[0] if len(terms) == 1 else ('or', terms)
+
+    def _parse_and(self):
+        terms = [self._parse_not()]
+        while self._peek() == 'and':
+            self._pos += 1
+            terms.append(self._parse_not())
+        return terms[0] if len(terms) == 1 else ('and', terms)
+
+    def _parse_not(self):
+        if self._peek() == 'not':
+            self._pos += 1
+            return ('not', self._parse_not())
+        return self._parse_atom()
+
+    def _parse_atom(self):
+        token = self._peek()
+        if token is None:
+            raise QueryError("Query ends where a condition was expected")
+        self._pos += 1
+        if token == '(':
+            tree = self._parse_or()
+            if self._peek() != ')':
+                raise QueryError("Missing ')' in query")
+            self._pos += 1
+            return tree
+        if not isinstance(token, tuple):
+            raise QueryError(f"Unexpected '{token}' in query")
+        return self._condition(*token[1:])
+
+    def _condition(self, field: str, op: str, raw: str):
+        """Normalize one comparison to (field, op, typed value)"""
+        try:
+            if field in SIZE_FIELDS:
+                value = parse_size(raw)
+            elif field == 'age':
+                # Ages become creation times so age and created share one index
+                field, op = 'created', FLIPPED.get(op, op)
+                value = self.now - timedelta(seconds=parse_duration(raw))
+            elif field == 'created':
+                value = datetime.fromisoformat(raw)
+            elif field in TEXT_FIELDS or field.startswith('prop.'):
+                value = raw
+            else:
+                raise QueryError(f"Unknown field '{field}' (use {', '.join(TEXT_FIELDS + SIZE_FIELDS)}, "
+                                 "age, created or prop.NAME)")
+        except (ValueError, click.BadParameter) as e:
+            if isinstance(e, QueryError):
+                raise
+            raise QueryError(f"Bad value for {field}: {raw} ({e})")
+
+        if op in ('~', '!~', '^', '$') and not isinstance(value, str):
+            raise QueryError(f"'{op}' only applies to text fields, not {field}")
+        if op in ('~', '!~'):
+            try:
+                value = re.compile(value)
+            except re.error as e:
+                raise QueryError(f"Bad regex {raw}: {e}")
+        return ('cmp', field, op, value)
+
+    # ---------- code generation ----------
+
+    def _constant(self, value: Any) -> str:
+        self._constants.append(value)
+        return f"_c{len(self._constants) - 1}"
+
+    @staticmethod
+    def _accessor(field: str) -> str:
+        if field == 'name':
+            return "s['snapshot_name']"
+        if field in TEXT_FIELDS:
+            return f"s[{field!r}]"
+        if field in SIZE_FIELDS:
+            return f"_size(s, {field!r})"
+        if field == 'created':
+            return "_created(s)"
+        return f"_text(s, {field[len('prop.'):]!r})"
+
+    def _emit(self, tree) -> str:
+        kind = tree[0]
+        if kind in ('and', 'or'):
+            return '(' + f" {kind} ".join(self._emit(t) for t in tree[1]) + ')'
+        if kind == 'not':
+            return f"(not {self._emit(tree[1])})"
+
+        _, field, op, value = tree
+        subject = self._accessor(field)
+        constant = self._constant(value)
+        if op == '~':
+            return f"({constant}.search({subject}) is not None)"
+        if op == '!~':
+            return f"({constant}.search({subject}) is None)"
+        if op == '^':
+            return f"{subject}.startswith({constant})"
+        if op == '$':
+            return f"{subject}.endswith({constant})"
+        return f"({subject} {COMPARISONS[op]} {constant})"
+
+    # ---------- bounds ----------
+
+    def _bounds(self, tree):
+        """
+        Dataset and creation constraints every match must satisfy, taken from
+        the top-level 'and' terms (anything under 'or' or 'not' is ignored)
+        """
+        self.datasets: Optional[set] = None
+        self.dataset_prefix: Optional[str] = None
+        self.created_after: Optional[datetime] = None
+        self.created_before: Optional[datetime] = None
+
+        terms = tree[1] if tree[0] == 'and' else [tree]
+        for term in terms:
+            if term[0] != 'cmp':
+                continue
+            _, field, op, value = term
+            if field == 'dataset' and op == '=':
+                self.datasets = {value} if self.datasets is None else self.datasets & {value}
+            elif field == 'dataset' and op == '^':
+                if self.dataset_prefix is None or value.startswith(self.dataset_prefix):
+                    self.dataset_prefix = value
+            elif field == 'created' and op in ('>', '>=', '='):
+                self.created_after = value if self.created_after is None else max(self.created_after, value)
+            if field == 'created' and op in ('<', '<=', '='):
+                self.created_before = value if self.created_before is None else min(self.created_before, value)
+
+    @property
+    def narrows(self) -> bool:
+        """Whether the bounds can rule out snapshots before the predicate runs"""
+        return any(b is not None for b in (self.datasets, self.dataset_prefix,
+                                           self.created_after, self.created_before))
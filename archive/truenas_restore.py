@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Restore - Copy paths out of a snapshot into the live dataset
+Files are copied with the cheapest mechanism the filesystem offers: a reflink
+(FICLONE, block cloning on OpenZFS 2.2+), then copy_file_range and sendfile,
+which keep the data in the kernel, and finally a userspace copy. Large trees
+are copied in parallel and ownership, mode, timestamps and extended
+attributes are preserved.
+
+Restores are resumable: files already restored (same size and mtime) are
+skipped, and a file interrupted mid-copy continues from its partial copy. A
+sidecar next to each partial copy records which snapshot file it came from,
+so a partial copy from another snapshot (or a changed source) starts over.
+
+The live tree is never trusted: every directory below the target is opened
+with O_NOFOLLOW and files are created relative to it, so a symlink planted
+where the snapshot has a directory cannot redirect the restore elsewhere.
+"""
+
+import errno
+import json
+import os
+import stat
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+CHUNK = 64 * 1024 * 1024
+PART_SUFFIX = '.restore-part'
+SOURCE_SUFFIX = '.restore-source'  # sidecar: identity of the file the partial copy is from
+DIR_FLAGS = os.O_RDONLY | os.O_DIRECTORY | os.O_NOFOLLOW
+# Extended attribute errors meaning "not supported or not permitted here"
+XATTR_SKIP = {errno.ENOTSUP, errno.ENODATA, errno.EINVAL, errno.EPERM, errno.EACCES}
+
+# Errors meaning "this mechanism does not work between these files"
+UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EINVAL, errno.ENOSYS,
+               errno.ENOTTY, errno.EBADF}
+
+METHODS = ['reflink', 'copy_file_range', 'sendfile', 'userspace']
+
+
+def _reflink(src_fd: int, dst_fd: int, offset: int, size: int):
+    import fcntl
+    if offset:
+        raise OSError(errno.EINVAL, "reflink clones whole files only")
+    fcntl.ioctl(dst_fd, FICLONE, src_fd)
+
+
+def _copy_file_range(src_fd: int, dst_fd: int, offset: int, size: int):
+    while offset < size:
+        copied = os.copy_file_range(src_fd, dst_fd, min(CHUNK, size - offset), offset, offset)
+        if copied == 0:
+            break
+        offset += copied
+
+
+def _sendfile(src_fd: int, dst_fd: int, offset: int, size: int):
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, min(CHUNK, size - offset))
+        if sent == 0:
+            break
+        offset += sent
+
+
+def _userspace(src_fd: int, dst_fd: int, offset: int, size: int):
+    os.lseek(src_fd, offset, os.SEEK_SET)
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while True:
+        data = os.read(src_fd, CHUNK)
+        if not data:
+            break
+        os.write(dst_fd, data)
+
+
+COPIERS: Dict[str, Callable[[int, int, int, int], None]] = {
+    'reflink': _reflink,
+    'copy_file_range': _copy_file_range,
+    'sendfile': _sendfile,
+    'userspace': _userspace,
+}
+
+
+def copy_attributes(src: Path, dst_fd: int, st: os.stat_result):
+    """Ownership (when permitted), extended attributes, mode and timestamps, onto an open file or directory"""
+    try:
+        os.fchown(dst_fd, st.st_uid, st.st_gid)
+    except (PermissionError, NotImplementedError):
+        pass  # not running as root: keep the restoring user's ownership
+    try:
+        for name in os.listxattr(src, follow_symlinks=False):
+            try:
+                os.setxattr(dst_fd, name, os.getxattr(src, name, follow_symlinks=False))
+            except OSError as e:
+                if e.errno not in XATTR_SKIP:
+                    raise
+    except OSError as e:
+        if e.errno not in XATTR_SKIP:
+            raise
+    os.fchmod(dst_fd, stat.S_IMODE(st.st_mode))
+    os.utime(dst_fd, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def source_identity(src: Path, st: os.stat_result) -> Dict[str, Any]:
+    """What a partial copy must have been copied from to be resumed"""
+    return {'source': str(src), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+            'ino': st.st_ino, 'dev': st.st_dev}
+
+
+def unsafe_path(path: str) -> bool:
+    """Whether a restore path could leave the snapshot or the target ('..' components)"""
+    return '..' in Path(path.strip('/')).parts
+
+
+class Restorer:
+    """Parallel, resumable copier from a snapshot directory into a target tree"""
+
+    def __init__(self, source: Path, target: Path, workers: int = 8, overwrite: bool = False,
+                 methods: Optional[List[str]] = None, on_file: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.source = Path(source)
+        self.target = Path(target)
+        self.workers = workers
+        self.overwrite = overwrite
+        self.methods = list(methods or METHODS)
+        self.on_file = on_file
+        self._lock = threading.Lock()
+        self.totals = {'files': 0, 'bytes': 0, 'skipped': 0, 'conflicts': 0, 'errors': 0,
+                       'resumed': 0, 'directories': 0, 'links': 0}
+        self.by_method: Dict[str, int] = {}
+
+    # ---------- planning ----------
+
+    def _entries(self, rel: str) -> Iterator[Tuple[str, os.stat_result]]:
+        """rel and everything below it, parents first"""
+        st = os.lstat(self.source / rel)
+        yield rel, st
+        if stat.S_ISDIR(st.st_mode):
+            for entry in os.scandir(self.source / rel):
+                yield from self._entries(f"{rel}/{entry.name}" if rel else entry.name)
+
+    # ---------- the live tree ----------
+
+    def _open_dir(self, rel: str, create: bool = False) -> Tuple[int, bool]:
+        """
+        Open target/rel one component at a time without following symlinks.
+        Missing directories are created when create is set; a symlink (or
+        other non-directory) in the way is replaced with --overwrite, and
+        otherwise refused. Returns the directory fd and whether rel was created.
+        """
+        fd = os.open(self.target, os.O_RDONLY | os.O_DIRECTORY)
+        created = False
+        try:
+            for part in Path(rel).parts if rel else ():
+                try:
+                    child = os.open(part, DIR_FLAGS, dir_fd=fd)
+                    created = False
+                except FileNotFoundError:
+                    if not create:
+                        raise
+                    os.mkdir(part, dir_fd=fd)
+                    child = os.open(part, DIR_FLAGS, dir_fd=fd)
+                    created = True
+                except (NotADirectoryError, OSError) as e:
+                    if e.errno not in (errno.ELOOP, errno.ENOTDIR):
+                        raise
+                    if not (create and self.overwrite):
+                        raise OSError(errno.ELOOP, f"{self.target / rel}: '{part}' in the live tree is not a "
+                                                   f"directory (a symlink?); not following it (use --overwrite)")
+                    os.unlink(part, dir_fd=fd)
+                    os.mkdir(part, dir_fd=fd)
+                    child = os.open(part, DIR_FLAGS, dir_fd=fd)
+                    created = True
+                os.close(fd)
+                fd = child
+        except BaseException:
+            os.close(fd)
+            raise
+        return fd, created
+
+    @staticmethod
+    def _lstat(name: str, dir_fd: int) -> Optional[os.stat_result]:
+        try:
+            return os.stat(name, dir_fd=dir_fd, follow_symlinks=False)
+        except FileNotFoundError:
+            return None
+
+    # ---------- copying ----------
+
+    def _count(self, key: str, amount: int = 1):
+        with self._lock:
+            self.totals[key] += amount
+
+    @staticmethod
+    def _part_source(name: str, dir_fd: int) -> Optional[Dict[str, Any]]:
+        """The identity recorded for a partial copy, if any"""
+        try:
+            fd = os.open(name + SOURCE_SUFFIX, os.O_RDONLY | os.O_NOFOLLOW, dir_fd=dir_fd)
+        except OSError:
+            return None
+        try:
+            with os.fdopen(fd) as f:
+                return json.load(f)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _write_part_source(name: str, dir_fd: int, identity: Dict[str, Any]):
+        fd = os.open(name + SOURCE_SUFFIX, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW, 0o600,
+                     dir_fd=dir_fd)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(identity, f)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _copy_data(self, src: Path, st: os.stat_result, name: str, dir_fd: int) -> Tuple[str, int]:
+        """
+        Copy src into NAME.restore-part (relative to dir_fd), continuing after any
+        bytes already there if they were copied from this same source file
+        """
+        part = name + PART_SUFFIX
+        size = st.st_size
+        identity = source_identity(src, st)
+        existing = self._lstat(part, dir_fd)
+        offset = existing.st_size if existing is not None and stat.S_ISREG(existing.st_mode) else 0
+        if offset > size or (offset and self._part_source(name, dir_fd) != identity):
+            offset = 0  # another snapshot's (or an older source's) partial copy: start over
+        if existing is not None and not stat.S_ISREG(existing.st_mode):
+            raise OSError(errno.EEXIST, f"{part} exists and is not a regular file")
+        if not offset:
+            self._write_part_source(name, dir_fd, identity)
+
+        src_fd = os.open(src, os.O_RDONLY)
+        try:
+            dst_fd = os.open(part, os.O_WRONLY | os.O_CREAT | os.O_NOFOLLOW | (0 if offset else os.O_TRUNC),
+                             0o600, dir_fd=dir_fd)
+            try:
+                for method in list(self.methods):
+                    if method == 'reflink' and offset:
+                        continue
+                    try:
+                        COPIERS[method](src_fd, dst_fd, offset, size)
+                    except OSError as e:
+                        if e.errno not in UNSUPPORTED or method == 'userspace':
+                            raise
+                        # Unsupported here: later files skip straight to the next mechanism
+                        with self._lock:
+                            if method in self.methods and len(self.methods) > 1:
+                                self.methods.remove(method)
+                        os.ftruncate(dst_fd, offset)
+                        continue
+                    copy_attributes(src, dst_fd, st)
+                    return method, offset
+                raise OSError(errno.ENOTSUP, "no copy mechanism available")
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+
+    def _restore_file(self, rel: str, st: os.stat_result) -> Dict[str, Any]:
+        src = self.source / rel
+        parent, name = os.path.split(rel)
+        result = {'path': rel, 'size': st.st_size, 'status': 'restored', 'method': None,
+                  'seconds': 0.0, 'resumed_from': 0}
+        started = time.perf_counter()
+        try:
+            dir_fd, _ = self._open_dir(parent, create=True)
+        except OSError as e:
+            result.update(status='error', error=str(e))
+            self._count('errors')
+            return result
+
+        try:
+            existing = self._lstat(name, dir_fd)
+            if existing is not None:
+                if (stat.S_ISREG(existing.st_mode) and existing.st_size == st.st_size
+                        and existing.st_mtime_ns == st.st_mtime_ns):
+                    result['status'] = 'skipped'  # restored by an earlier run
+                    self._count('skipped')
+                    return result
+                if not self.overwrite:
+                    result['status'] = 'conflict'
+                    self._count('conflicts')
+                    return result
+
+            try:
+                method, resumed_from = self._copy_data(src, st, name, dir_fd)
+                os.replace(name + PART_SUFFIX, name, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+                os.unlink(name + SOURCE_SUFFIX, dir_fd=dir_fd)
+            except OSError as e:
+                result.update(status='error', error=str(e))
+                self._count('errors')
+                return result
+        finally:
+            os.close(dir_fd)
+
+        result.update(method=method, seconds=time.perf_counter() - started, resumed_from=resumed_from)
+        with self._lock:
+            self.totals['files'] += 1
+            self.totals['bytes'] += st.st_size - resumed_from
+            self.totals['resumed'] += 1 if resumed_from else 0
+            self.by_method[method] = self.by_method.get(method, 0) + 1
+        return result
+
+    def _restore_link(self, rel: str, st: os.stat_result):
+        parent, name = os.path.split(rel)
+        link = os.readlink(self.source / rel)
+        dir_fd, _ = self._open_dir(parent, create=True)
+        try:
+            existing = self._lstat(name, dir_fd)
+            if existing is not None:
+                if stat.S_ISLNK(existing.st_mode) and os.readlink(name, dir_fd=dir_fd) == link:
+                    self._count('skipped')
+                    return
+                if not self.overwrite or stat.S_ISDIR(existing.st_mode):
+                    self._count('conflicts')
+                    return
+                os.unlink(name, dir_fd=dir_fd)
+            os.symlink(link, name, dir_fd=dir_fd)
+            try:
+                os.chown(name, st.st_uid, st.st_gid, dir_fd=dir_fd, follow_symlinks=False)
+            except (PermissionError, NotImplementedError):
+                pass
+            os.utime(name, ns=(st.st_atime_ns, st.st_mtime_ns), dir_fd=dir_fd, follow_symlinks=False)
+        finally:
+            os.close(dir_fd)
+        self._count('links')
+
+    def restore(self, paths: List[str], dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Restore paths (relative to the snapshot root) into the target.
+        Returns the totals, per-method file counts and elapsed seconds.
+        """
+        bad = [path for path in paths if unsafe_path(path)]
+        if bad:
+            raise ValueError(f"Restore paths may not contain '..': {', '.join(bad)}")
+        started = time.perf_counter()
+        directories: List[Tuple[str, os.stat_result]] = []
+        files: List[Tuple[str, os.stat_result]] = []
+        for path in paths:
+            for rel, st in self._entries(path.strip('/')):
+                if stat.S_ISDIR(st.st_mode):
+                    directories.append((rel, st))
+                elif stat.S_ISREG(st.st_mode) or stat.S_ISLNK(st.st_mode):
+                    files.append((rel, st))
+
+        if dry_run:
+            return {'totals': {'files': len(files), 'directories': len(directories),
+                               'bytes': sum(st.st_size for _, st in files if stat.S_ISREG(st.st_mode))},
+                    'by_method': {}, 'seconds': 0.0, 'dry_run': True}
+
+        created = set()
+        for rel, _ in directories:
+            try:
+                fd, was_created = self._open_dir(rel, create=True)
+            except OSError:
+                self._count('errors')  # its files fail (and are counted) on the same check
+                continue
+            os.close(fd)
+            if was_created:
+                created.add(rel)
+
+        regular = [(rel, st) for rel, st in files if stat.S_ISREG(st.st_mode)]
+        # Biggest first so one large file does not finish the run alone
+        regular.sort(key=lambda item: item[1].st_size, reverse=True)
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as pool:
+            for result in pool.map(lambda item: self._restore_file(*item), regular):
+                if self.on_file:
+                    self.on_file(result)
+
+        for rel, st in files:
+            if stat.S_ISLNK(st.st_mode):
+                try:
+                    self._restore_link(rel, st)
+                except OSError:
+                    self._count('errors')
+
+        # Directory times last (deepest first), since creating children changes them.
+        # Existing live directories keep their attributes unless overwriting.
+        for rel, st in reversed(directories):
+            if rel not in created and not self.overwrite:
+                continue
+            try:
+                fd, _ = self._open_dir(rel)
+                try:
+                    copy_attributes(self.source / rel, fd, st)
+                finally:
+                    os.close(fd)
+                self._count('directories')
+            except OSError:
+                self._count('errors')
+
+        return {'totals': dict(self.totals), 'by_method': dict(self.by_method),
+                'seconds': time.perf_counter() - started, 'dry_run': False}
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Retention - Retention policy rules and a policy simulator
+The tier rules here are the ones SnapshotManager.apply_retention_policy applies.
+The simulator replays months of snapshot creation through many policy variants
+at once (numpy, one array row per policy) and reports, for each retention run,
+how many snapshots survive, the space they hold and how far back and how
+densely restore points reach.
+
+Redundancy pruning works on content rather than age: runs of snapshots that
+wrote (next to) nothing since their predecessor hold the same data, so only
+the snapshots bounding each run are worth keeping.
+"""
+
+import re
+from datetime import timedelta
+from typing import Optional, Dict, Any, List, Tuple
+
+# Tiers in the order a snapshot is offered to them: a snapshot is kept by the
+# first tier whose window it falls in that still has room, newest snapshots first
+RETENTION_TIERS = [
+    ('hourly', timedelta(hours=1)),
+    ('daily', timedelta(days=1)),
+    ('weekly', timedelta(weeks=1)),
+    ('monthly', timedelta(days=30)),
+]
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 604800}
+
+
+def parse_duration(value: str) -> int:
+    """Seconds in a duration such as '15m', '1h', '7d' or '2w'"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhdw])\s*', value.lower())
+    if not match:
+        raise ValueError(f"Invalid duration: {value} (use e.g. 15m, 1h, 1d, 1w)")
+    return int(float(match.group(1)) * DURATION_UNITS[match.group(2)])
+
+
+def format_duration(seconds: float) -> str:
+    """Short human form of a duration: '45m', '6h', '3d 4h'"""
+    if seconds == float('inf'):
+        return 'none'
+    seconds = int(round(seconds))
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    if days:
+        return f"{days}d {hours}h" if hours else f"{days}d"
+    if hours:
+        return f"{hours}h {rest // 60}m" if rest >= 60 else f"{hours}h"
+    return f"{rest // 60}m" if rest >= 60 else f"{rest}s"
+
+
+def parse_counts(value: Optional[str]) -> List[int]:
+    """Values swept for one tier: '24', '0,12,24', '4-12' or '0-48:6' (start-stop:step)"""
+    if value is None:
+        return [0]
+    counts = []
+    for part in value.split(','):
+        match = re.fullmatch(r'\s*(\d+)\s*(?:-\s*(\d+)\s*(?::\s*(\d+)\s*)?)?', part)
+        if not match:
+            raise ValueError(f"Invalid count list: {value} (use e.g. 24, 0,12,24, 4-12 or 0-48:6)")
+        start, stop, step = match.groups()
+        if stop is None:
+            counts.append(int(start))
+        else:
+            counts.extend(range(int(start), int(stop) + 1, int(step or 1)))
+    return sorted(set(counts))
+
+
+def policy_grid(**counts: List[int]) -> List[Dict[str, int]]:
+    """Every combination of the per-tier counts, as apply_retention_policy policies"""
+    policies = [{}]
+    for tier, _ in RETENTION_TIERS:
+        policies = [dict(p, **({tier: n} if n else {})) for p in policies for n in counts.get(tier, [0])]
+    return policies
+
+
+def policy_label(policy: Dict[str, int]) -> str:
+    """hourly/daily/weekly/monthly counts, e.g. '24/7/4/12'"""
+    return '/'.join(str(policy.get(tier, 0)) for tier, _ in RETENTION_TIERS)
+
+
+def redundant_runs(sizes: List[Tuple[int, int]], threshold: int = 0) -> List[Tuple[int, int]]:
+    """
+    Runs of snapshots with (nearly) identical content, from (used, written)
+    per snapshot of one dataset, oldest first. Returns inclusive index ranges
+    (first, last): first wrote the run's content, every later snapshot up to
+    last wrote at most `threshold` bytes on top of it in total and holds at
+    most `threshold` bytes of its own. Only the snapshots strictly between
+    first and last are redundant; ranges without any are left out.
+
+    One pass: a snapshot either extends the open run or starts the next one.
+    """
+    runs = []
+    first, drift = 0, 0
+    for i in range(1, len(sizes)):
+        used, written = sizes[i]
+        if used <= threshold and drift + written <= threshold:
+            drift += written
+            continue
+        if i - 1 - first >= 2:
+            runs.append((first, i - 1))
+        first, drift = i, 0
+    if len(sizes) - 1 - first >= 2:
+        runs.append((first, len(sizes) - 1))
+    return runs
+
+
+def simulate_retention(policies: List[Dict[str, int]], days: float, cadence: int,
+                       run_every: int, change_rate: float = 0.0) -> Dict[str, Any]:
+    """
+    Replay snapshot creation every `cadence` seconds for `days`, applying every
+    policy each `run_every` seconds. Each retention run sees the snapshots that
+    survived the previous runs, as on the NAS.
+
+    Space assumes the churn (change_rate bytes per second) rewrites data that
+    predates the oldest snapshot, so snapshots hold everything overwritten
+    since it: the worst case for a steady rewrite workload.
+
+    Returns per-run arrays shaped (runs, policies): 'count', 'space',
+    'horizon' (age of the oldest restore point), 'worst_gap' (longest stretch
+    with no restore point, including the one up to now), plus 'times'.
+    """
+    import numpy as np
+
+    horizon_s = int(days * 86400)
+    created = np.arange(0, horizon_s + 1, cadence, dtype=np.int64)
+    runs = np.arange(run_every, horizon_s + 1, run_every, dtype=np.int64)
+    limits = np.array([[p.get(tier, 0) for tier, _ in RETENTION_TIERS] for p in policies],
+                      dtype=np.int64)
+    windows = [int(window.total_seconds()) for _, window in RETENTION_TIERS]
+    n_policies = len(policies)
+
+    # Survivors of the last run per policy, newest first, padded with -1. A policy
+    # keeps at most the sum of its counts, so runs only touch these plus the
+    # snapshots created since: a few dozen columns instead of the whole window.
+    width = max(int(limits.sum(axis=1).max()), 1)
+    survivors = np.full((n_policies, width), -1, dtype=np.int64)
+
+    shape = (len(runs), n_policies)
+    count = np.zeros(shape, dtype=np.int64)
+    oldest = np.zeros(shape)
+    worst_gap = np.full(shape, np.inf)
+
+    previous_run = -1
+    for i, now in enumerate(runs):
+        new = created[(created > previous_run) & (created <= now)][::-1]
+        previous_run = now
+        candidates = np.concatenate([np.broadcast_to(new, (n_policies, len(new))), survivors], axis=1)
+        ages = now - candidates
+        present = candidates >= 0
+
+        # Newest first, as apply_retention_policy walks them
+        kept = np.zeros(candidates.shape, dtype=bool)
+        for tier, window in enumerate(windows):
+            eligible = present & (ages <= window) & ~kept
+            rank = np.cumsum(eligible, axis=1, dtype=np.int32)
+            kept |= eligible & (rank <= limits[:, tier:tier + 1])
+
+        # Pack the kept snapshots to the front, keeping their order
+        order = np.argsort(~kept, axis=1, kind='stable')[:, :width]
+        survivors = np.where(np.take_along_axis(kept, order, axis=1),
+                             np.take_along_axis(candidates, order, axis=1), -1)
+
+        kept_count = kept.sum(axis=1)
+        kept_ages = np.where(survivors >= 0, now - survivors, np.nan)
+        count[i] = kept_count
+        oldest[i] = np.nan_to_num(np.nanmax(kept_ages, axis=1, initial=0))
+        # Longest stretch without a restore point: between kept snapshots, or up to now
+        gaps = np.nan_to_num(np.diff(kept_ages, axis=1), nan=0.0)
+        worst = np.maximum(gaps.max(axis=1, initial=0), kept_ages[:, 0])
+        worst_gap[i] = np.where(kept_count > 0, worst, np.inf)
+
+    space = oldest * change_rate
+
+    return {
+        'times': runs,
+        'count': count,
+        'space': space,
+        'horizon': oldest,
+        'worst_gap': worst_gap,
+    }
+
+
+def summarize(result: Dict[str, Any], warmup: int = 30 * 86400) -> List[Dict[str, float]]:
+    """
+    Per-policy figures over the steady-state runs (after the warm-up, when
+    there are any): mean and peak count and space, the shortest horizon and
+    the worst gap between restore points.
+    """
+    import numpy as np
+
+    steady = result['times'] >= warmup
+    if not steady.any():
+        steady = np.ones_like(steady)
+    # Mask each array once and reduce every policy column together
+    count = result['count'][steady]
+    space = result['space'][steady]
+    mean_count, peak_count = count.mean(axis=0), count.max(axis=0)
+    mean_space, peak_space = space.mean(axis=0), space.max(axis=0)
+    min_horizon = result['horizon'][steady].min(axis=0)
+    worst_gap = result['worst_gap'][steady].max(axis=0)
+    return [
+        {
+            'mean_count': float(mean_count[p]),
+            'peak_count': int(peak_count[p]),
+            'mean_space': float(mean_space[p]),
+            'peak_space': float(peak_space[p]),
+            'min_horizon': float(min_horizon[p]),
+            'worst_gap': float(worst_gap[p]),
+        }
+        for p in range(count.shape[1])
+    ]
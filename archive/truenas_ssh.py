@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+TrueNAS SSH - Shell command runner shared by the TrueNAS tools
+Runs zfs commands on the NAS for the operations the REST API does not offer
+(zfs diff, dry-run destroys), streaming their output line by line. Connections
+are multiplexed through an OpenSSH ControlMaster so repeated commands skip the
+handshake and authentication.
+
+Config keys (all optional): ssh_host (defaults to host), ssh_user (root),
+ssh_port (22), ssh_key, ssh_multiplex (true except on Windows). With ssh_local
+the commands run on this machine instead (a tool running on the NAS itself,
+or tests with stand-in commands found first on ssh_local_path).
+"""
+
+import os
+import shlex
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Iterator
+
+
+CONTROL_DIR = Path.home() / ".truenas"
+CONTROL_PERSIST = 300
+
+
+class SSHError(RuntimeError):
+    """A remote command could not be run or exited with an error"""
+
+
+class SSHRunner:
+    """Runs commands on the NAS through the ssh client"""
+
+    def __init__(self, host: str, user: str = 'root', port: int = 22,
+                 identity: Optional[str] = None, multiplex: Optional[bool] = None,
+                 connect_timeout: int = 10):
+        self.host = host
+        self.user = user
+        self.port = port
+        self.identity = identity
+        self.multiplex = (os.name != 'nt') if multiplex is None else multiplex
+        self.connect_timeout = connect_timeout
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'SSHRunner':
+        """Runner for the NAS described by a tool config file"""
+        host = config.get('ssh_host') or config['host'].split(':')[0]
+        return cls(
+            host,
+            user=config.get('ssh_user', 'root'),
+            port=int(config.get('ssh_port', 22)),
+            identity=config.get('ssh_key'),
+            multiplex=config.get('ssh_multiplex'),
+        )
+
+    def argv(self, args: List[str]) -> List[str]:
+        """ssh command line running args (quoted for the remote shell)"""
+        command = ['ssh', '-p', str(self.port), '-o', 'BatchMode=yes',
+                   '-o', f"ConnectTimeout={self.connect_timeout}"]
+        if self.identity:
+            command += ['-i', str(Path(self.identity).expanduser())]
+        if self.multiplex:
+            CONTROL_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+            command += ['-o', 'ControlMaster=auto',
+                        '-o', f"ControlPath={CONTROL_DIR / 'ssh-%r@%h:%p'}",
+                        '-o', f"ControlPersist={CONTROL_PERSIST}"]
+        return command + [f"{self.user}@{self.host}", '--', ' '.join(shlex.quote(a) for a in args)]
+
+    def _popen(self, args: List[str], stderr) -> subprocess.Popen:
+        return subprocess.Popen(self.argv(args), stdout=subprocess.PIPE, stderr=stderr,
+                                stdin=subprocess.DEVNULL)
+
+    def stream(self, args: List[str]) -> Iterator[str]:
+        """
+        Yield the command's output lines as they arrive. Closing the generator
+        early stops the remote command.
+        """
+        # stderr goes to a file so a chatty command cannot block on a full pipe
+        with tempfile.TemporaryFile() as errors:
+            try:
+                process = self._popen(args, errors)
+            except FileNotFoundError:
+                raise SSHError("ssh client not found; install OpenSSH or use a local mode")
+
+            finished = False
+            try:
+                for raw in process.stdout:
+                    yield raw.decode('utf-8', errors='replace').rstrip('\n')
+                finished = True
+            finally:
+                if not finished:
+                    process.kill()
+                process.stdout.close()
+                returncode = process.wait()
+            errors.seek(0)
+            stderr = errors.read().decode('utf-8', errors='replace').strip()
+        if returncode != 0:
+            raise SSHError(stderr or f"{args[0]} exited with status {returncode}")
+
+    def run(self, args: List[str]) -> str:
+        """Run a command and return its whole output"""
+        return '\n'.join(self.stream(args))
+
+
+class LocalRunner(SSHRunner):
+    """Runs the same commands on this machine, for use on the NAS itself or with test stand-ins"""
+
+    def __init__(self, path: Optional[str] = None):
+        super().__init__('localhost', multiplex=False)
+        self.path = path
+
+    def argv(self, args: List[str]) -> List[str]:
+        return list(args)
+
+    def _popen(self, args: List[str], stderr) -> subprocess.Popen:
+        env = None
+        if self.path:
+            env = dict(os.environ, PATH=os.pathsep.join([str(Path(self.path).expanduser()),
+                                                         os.environ.get('PATH', '')]))
+        try:
+            return subprocess.Popen(self.argv(args), stdout=subprocess.PIPE, stderr=stderr,
+                                    stdin=subprocess.DEVNULL, env=env)
+        except FileNotFoundError:
+            raise SSHError(f"{args[0]} not found on this machine")
+
+
+def runner_from_config(config: Dict[str, Any]) -> SSHRunner:
+    """LocalRunner when the config sets ssh_local, else an SSHRunner to the NAS"""
+    if config.get('ssh_local'):
+        return LocalRunner(config.get('ssh_local_path'))
+    return SSHRunner.from_config(config)
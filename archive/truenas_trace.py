@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Trace - Request tracing shared by the TrueNAS tools
+Records a span for every API call (method, endpoint, status, bytes, decode time
+and queue wait) nested under the CLI command that issued it, then writes a
+Chrome trace (chrome://tracing, Perfetto) and prints a per-endpoint summary.
+
+Enable with --trace PATH on any tool, or TRUENAS_TRACE=PATH in the environment.
+"""
+
+import json
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List
+
+import click
+
+
+TRACE_ENV = 'TRUENAS_TRACE'
+
+
+class Span:
+    """One timed operation in a trace"""
+
+    def __init__(self, tracer: 'Tracer', name: str, category: str,
+                 parent: Optional['Span'], args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.parent = parent
+        self.args = args
+        self.thread = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def set(self, **args):
+        """Attach extra fields to the span"""
+        self.args.update(args)
+
+    def record_response(self, response):
+        """Capture status and size, and time the caller's JSON decode"""
+        self.args['status'] = response.status_code
+        self.args['bytes'] = len(response.content)
+        self.args.setdefault('decode_ms', 0.0)
+
+        decode = response.json
+        span = self
+
+        def timed_json(**kwargs):
+            start = time.perf_counter()
+            try:
+                return decode(**kwargs)
+            finally:
+                span.args['decode_ms'] += (time.perf_counter() - start) * 1000
+
+        response.json = timed_json
+
+
+class Tracer:
+    """Collects spans for one process; disabled (and nearly free) by default"""
+
+    def __init__(self):
+        self.enabled = False
+        self.output: Optional[str] = None
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._root: Optional[Span] = None
+        self._origin = time.perf_counter()
+
+    def enable(self, output: Optional[str] = None):
+        """Start collecting spans; output is the Chrome trace file to write"""
+        self.enabled = True
+        self.output = output
+        self._origin = time.perf_counter()
+
+    def _stack(self) -> List[Span]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def current(self) -> Optional[Span]:
+        """Innermost open span on this thread, else the root command span"""
+        stack = self._stack()
+        return stack[-1] if stack else self._root
+
+    @contextmanager
+    def span(self, name: str, category: str = 'command', parent: Optional[Span] = None, **args):
+        """Time a block of work as a span nested under the current one"""
+        if not self.enabled:
+            yield None
+            return
+
+        span = Span(self, name, category, parent or self.current(), args)
+        stack = self._stack()
+        stack.append(span)
+        if self._root is None:
+            self._root = span
+        try:
+            yield span
+        finally:
+            span.end = time.perf_counter()
+            stack.remove(span)
+            if self._root is span:
+                self._root = None
+            with self._lock:
+                self.spans.append(span)
+
+    @contextmanager
+    def request(self, method: str, endpoint: str, queued_at: Optional[float] = None,
+                parent: Optional[Span] = None):
+        """Span for one API call; queued_at is when the call was handed to a worker"""
+        if not self.enabled:
+            yield None
+            return
+
+        queue_wait = (time.perf_counter() - queued_at) * 1000 if queued_at else 0.0
+        with self.span(f"{method} {endpoint}", 'request', parent=parent, method=method,
+                       endpoint=endpoint, queue_wait_ms=queue_wait) as span:
+            try:
+                yield span
+            except BaseException as e:
+                span.set(error=str(e) or type(e).__name__)
+                raise
+
+    # ==================== Output ====================
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Spans in Chrome trace event format"""
+        threads: Dict[int, int] = {}
+        ids = {id(span): n for n, span in enumerate(self.spans, 1)}
+        events = []
+        for span in sorted(self.spans, key=lambda s: s.start):
+            tid = threads.setdefault(span.thread, len(threads) + 1)
+            args = dict(span.args)
+            args['span_id'] = ids[id(span)]
+            if span.parent is not None and id(span.parent) in ids:
+                args['parent_id'] = ids[id(span.parent)]
+            events.append({
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': (span.start - self._origin) * 1e6,
+                'dur': span.duration * 1e6,
+                'pid': os.getpid(),
+                'tid': tid,
+                'args': args,
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    @staticmethod
+    def endpoint_key(endpoint: str) -> str:
+        """Collapse item ids so calls group by endpoint ('zfs/snapshot/id/{id}')"""
+        return re.sub(r'/id/.+?(/(run|clone|rollback))?$', r'/id/{id}\1', endpoint.split('?')[0])
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Per-endpoint call count, latency, bytes and decode time, slowest first"""
+        groups: Dict[str, List[Span]] = {}
+        for span in self.spans:
+            if span.category == 'request':
+                key = f"{span.args['method']} {self.endpoint_key(span.args['endpoint'])}"
+                groups.setdefault(key, []).append(span)
+
+        rows = []
+        for key, spans in groups.items():
+            durations = sorted(s.duration * 1000 for s in spans)
+            rows.append({
+                'endpoint': key,
+                'calls': len(spans),
+                'errors': sum(1 for s in spans if 'error' in s.args or s.args.get('status', 200) >= 400),
+                'total_ms': sum(durations),
+                'mean_ms': sum(durations) / len(durations),
+                'p95_ms': durations[int(0.95 * (len(durations) - 1))],
+                'max_ms': durations[-1],
+                'bytes': sum(s.args.get('bytes', 0) for s in spans),
+                'decode_ms': sum(s.args.get('decode_ms', 0.0) for s in spans),
+                'queue_ms': sum(s.args.get('queue_wait_ms', 0.0) for s in spans),
+            })
+        rows.sort(key=lambda r: r['total_ms'], reverse=True)
+        return rows
+
+    def print_summary(self, file=None):
+        """Print the per-endpoint summary table"""
+        from tabulate import tabulate
+
+        file = file or sys.stderr
+        rows = self.summary()
+        commands = [s for s in self.spans if s.category == 'command' and s.parent is None]
+        wall = sum(s.duration for s in commands) * 1000
+
+        print(f"\nTrace summary ({sum(r['calls'] for r in rows)} API calls, {wall:.1f} ms wall)", file=file)
+        if not rows:
+            return
+        print(tabulate([[
+            r['endpoint'], r['calls'], r['errors'],
+            f"{r['total_ms']:.1f}", f"{r['mean_ms']:.1f}", f"{r['p95_ms']:.1f}", f"{r['max_ms']:.1f}",
+            f"{r['bytes'] / 1024:.1f}", f"{r['decode_ms']:.1f}", f"{r['queue_ms']:.1f}"
+        ] for r in rows], headers=[
+            'Endpoint', 'Calls', 'Errors', 'Total ms', 'Mean ms', 'p95 ms', 'Max ms',
+            'KiB', 'Decode ms', 'Queue ms'
+        ], tablefmt='simple'), file=file)
+
+    def finish(self):
+        """Write the trace file and print the summary"""
+        if not self.enabled:
+            return
+        if self.output:
+            with open(self.output, 'w') as f:
+                json.dump(self.chrome_trace(), f)
+        self.print_summary()
+        if self.output:
+            print(f"Trace written to: {self.output}", file=sys.stderr)
+        self.enabled = False
+
+
+tracer = Tracer()
+
+
+# ==================== Click Integration ====================
+
+def _enable_trace(ctx, param, value):
+    if value:
+        tracer.enable(value)
+    return value
+
+
+trace_option = click.option(
+    '--trace', type=click.Path(dir_okay=False), metavar='PATH', envvar=TRACE_ENV, expose_value=False,
+    is_eager=True, callback=_enable_trace,
+    help=f"Write a Chrome trace of API calls to PATH and print a summary (or set {TRACE_ENV})"
+)
+
+
+class TracedCommand(click.Command):
+    """Command whose invocation is recorded as a span"""
+
+    def invoke(self, ctx):
+        with tracer.span(ctx.command_path):
+            return super().invoke(ctx)
+
+
+class TracedGroup(click.Group):
+    """
+    Group whose invocation, and that of every subcommand, is recorded as a span.
+    The top-level group writes the trace once the command has finished.
+    """
+
+    command_class = TracedCommand
+    group_class = type
+
+    def invoke(self, ctx):
+        try:
+            with tracer.span(ctx.command_path):
+                return super().invoke(ctx)
+        finally:
+            if ctx.parent is None:
+                tracer.finish()
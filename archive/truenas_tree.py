@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+TrueNAS Tree - Dataset hierarchy with per-subtree usage rollups
+pool/dataset returns datasets as a flat list. DatasetTree links them into
+their hierarchy in one pass over the list (a dict lookup of each parent, so
+the order of the list does not matter) and rolls usage up every subtree:
+space used, the tightest available space, space held by snapshots and the
+number of datasets.
+
+ZFS counts a dataset's children in its 'used', so usage never grows going
+down the tree. The largest datasets are therefore found by walking down from
+the pools, largest first, touching only the few branches that can hold them
+instead of sorting every dataset.
+
+The tree is kept between listings: refresh() and update() change only the
+datasets whose record differs and re-roll their ancestors.
+"""
+
+import heapq
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# Rollups that never grow from a dataset to its children, so largest() can prune on them
+MONOTONE_KEYS = ('total_used', 'total_snapshots', 'datasets')
+
+
+def _parsed(record: Dict[str, Any], prop: str) -> Optional[int]:
+    value = record.get(prop)
+    if isinstance(value, dict):
+        value = value.get('parsed')
+    return value if isinstance(value, int) else None
+
+
+class DatasetNode:
+    """
+    One dataset: its record, parent/child links, own usage and subtree rollups.
+    Ancestors missing from the listing (e.g. filtered out) become placeholder
+    nodes with no record.
+    """
+
+    __slots__ = ('name', 'record', 'parent', 'children', 'depth', 'used', 'available', 'snapshots',
+                 'total_used', 'min_available', 'total_snapshots', 'datasets')
+
+    def __init__(self, name: str, parent: Optional['DatasetNode'] = None):
+        self.name = name
+        self.record: Optional[Dict[str, Any]] = None
+        self.parent = parent
+        self.children: Dict[str, 'DatasetNode'] = {}
+        self.depth = name.count('/')
+        self.used = 0
+        self.available: Optional[int] = None
+        self.snapshots = 0
+        self.total_used = 0
+        self.min_available: Optional[int] = None
+        self.total_snapshots = 0
+        self.datasets = 0
+
+    def __repr__(self):
+        return f"DatasetNode({self.name!r}, used={self.total_used}, children={len(self.children)})"
+
+    @property
+    def short_name(self) -> str:
+        return self.name.rsplit('/', 1)[-1]
+
+    def set_record(self, record: Optional[Dict[str, Any]]):
+        """Take a new record (None makes this a placeholder) and its own usage"""
+        self.record = record
+        values = record or {}
+        self.used = _parsed(values, 'used') or 0
+        self.available = _parsed(values, 'available')
+        self.snapshots = _parsed(values, 'usedbysnapshots') or 0
+
+    def rollup(self) -> bool:
+        """Recompute the rollups from own values and the children's; returns whether any changed"""
+        used, snapshots, datasets = 0, self.snapshots, 1 if self.record is not None else 0
+        available = self.available
+        for child in self.children.values():
+            used += child.total_used
+            snapshots += child.total_snapshots
+            datasets += child.datasets
+            if child.min_available is not None and (available is None or child.min_available < available):
+                available = child.min_available
+        # 'used' already includes children; the sum only matters where the record is missing or stale
+        used = max(self.used, used)
+        before = (self.total_used, self.min_available, self.total_snapshots, self.datasets)
+        self.total_used, self.min_available, self.total_snapshots, self.datasets = used, available, snapshots, datasets
+        return before != (used, available, snapshots, datasets)
+
+
+class DatasetTree:
+    """Datasets linked into their hierarchy, with rollups kept current as records change"""
+
+    def __init__(self, records: Iterable[Dict[str, Any]] = ()):
+        self.nodes: Dict[str, DatasetNode] = {}
+        self.roots: Dict[str, DatasetNode] = {}
+        self.levels: Dict[int, Dict[str, DatasetNode]] = {}
+        self._load(records)
+
+    def __len__(self) -> int:
+        return sum(root.datasets for root in self.roots.values())
+
+    def __contains__(self, name: str) -> bool:
+        node = self.nodes.get(name)
+        return node is not None and node.record is not None
+
+    def get(self, name: str) -> Optional[DatasetNode]:
+        return self.nodes.get(name)
+
+    # ---------- linking ----------
+
+    def _load(self, records: Iterable[Dict[str, Any]]):
+        """Link every record in one pass, then roll up every subtree once"""
+        for record in records:
+            self._node(record['name']).set_record(record)
+        # Children before parents: the reverse of a pre-order walk
+        for node in reversed(list(self.walk())):
+            node.rollup()
+
+    def _node(self, name: str) -> DatasetNode:
+        """The node for name, creating it (and any missing ancestors) linked into the tree"""
+        node = self.nodes.get(name)
+        if node is not None:
+            return node
+        parent_name = name.rpartition('/')[0]
+        parent = self._node(parent_name) if parent_name else None
+        node = DatasetNode(name, parent)
+        self.nodes[name] = node
+        (parent.children if parent else self.roots)[name] = node
+        self.levels.setdefault(node.depth, {})[name] = node
+        return node
+
+    def _unlink(self, node: DatasetNode):
+        for descendant in self.walk(node):
+            del self.nodes[descendant.name]
+            del self.levels[descendant.depth][descendant.name]
+        (node.parent.children if node.parent else self.roots).pop(node.name)
+
+    def _rollup_from(self, *nodes: Optional[DatasetNode]):
+        """
+        Re-roll nodes and their ancestors, deepest first so each is rolled once,
+        stopping on branches where nothing changes any more
+        """
+        heap = [(-node.depth, node.name, node) for node in nodes if node is not None]
+        heapq.heapify(heap)
+        queued = {node.name for _, _, node in heap}
+        while heap:
+            _, _, node = heapq.heappop(heap)
+            parent = node.parent
+            if node.rollup() and parent is not None and parent.name not in queued:
+                queued.add(parent.name)
+                heapq.heappush(heap, (-parent.depth, parent.name, parent))
+
+    # ---------- incremental updates ----------
+
+    def update(self, record: Dict[str, Any]) -> DatasetNode:
+        """Add or replace one dataset's record"""
+        node = self._node(record['name'])
+        node.set_record(record)
+        self._rollup_from(node)
+        return node
+
+    def remove(self, name: str) -> bool:
+        """Remove a dataset and everything below it; returns whether it was in the tree"""
+        node = self.nodes.get(name)
+        if node is None:
+            return False
+        parent = node.parent
+        self._unlink(node)
+        # Drop placeholder ancestors left with nothing below them
+        while parent is not None and parent.record is None and not parent.children:
+            node, parent = parent, parent.parent
+            self._unlink(node)
+        self._rollup_from(parent)
+        return True
+
+    def refresh(self, records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Bring the tree in line with a fresh listing: only datasets whose record
+        changed are re-rolled (with their ancestors), and datasets no longer
+        listed are removed. Returns counts of added, changed and removed datasets.
+        """
+        if not self.nodes:
+            self._load(records)
+            return {'added': len(self), 'changed': 0, 'removed': 0}
+
+        seen = set()
+        dirty = []
+        added = changed = 0
+        for record in records:
+            name = record['name']
+            seen.add(name)
+            node = self.nodes.get(name)
+            if node is not None and node.record == record:
+                continue
+            if node is None or node.record is None:
+                added += 1
+            else:
+                changed += 1
+            node = self._node(name)
+            node.set_record(record)
+            dirty.append(node)
+
+        # Deepest first, so a dataset is gone before its parent is looked at
+        gone = sorted((node for name, node in self.nodes.items() if node.record is not None and name not in seen),
+                      key=lambda node: node.depth, reverse=True)
+        for node in gone:
+            parent = node.parent
+            if node.children:
+                node.set_record(None)  # still holds listed children
+                dirty.append(node)
+                continue
+            self._unlink(node)
+            while parent is not None and parent.record is None and not parent.children:
+                node, parent = parent, parent.parent
+                self._unlink(node)
+            dirty.append(parent)
+
+        self._rollup_from(*(node for node in dirty if node is None or node.name in self.nodes))
+        return {'added': added, 'changed': changed, 'removed': len(gone)}
+
+    # ---------- queries ----------
+
+    def walk(self, node: Optional[DatasetNode] = None, max_depth: Optional[int] = None,
+             top: Optional[int] = None, key: str = 'total_used') -> Iterator[DatasetNode]:
+        """
+        Nodes in pre-order (parents before children) from node, or every root.
+        Children come by name, or with top, only the top largest by key.
+        """
+        stack = [node] if node is not None else self._ordered(self.roots, top, key)[::-1]
+        while stack:
+            current = stack.pop()
+            yield current
+            if max_depth is None or current.depth < max_depth:
+                stack.extend(self._ordered(current.children, top, key)[::-1])
+
+    @staticmethod
+    def _ordered(nodes: Dict[str, DatasetNode], top: Optional[int], key: str) -> List[DatasetNode]:
+        if top is None:
+            return [nodes[name] for name in sorted(nodes)]
+        return heapq.nlargest(top, nodes.values(), key=lambda n: getattr(n, key))
+
+    def top(self, n: int, parent: Optional[str] = None, depth: Optional[int] = None,
+            key: str = 'total_used') -> List[DatasetNode]:
+        """The n largest children of parent, or datasets at depth (0 = pools), or pools"""
+        if parent is not None:
+            candidates = self.nodes[parent].children.values() if parent in self.nodes else []
+        elif depth is not None:
+            candidates = self.levels.get(depth, {}).values()
+        else:
+            candidates = self.roots.values()
+        return heapq.nlargest(n, (c for c in candidates if c.record is not None), key=lambda c: getattr(c, key))
+
+    def largest(self, n: int, key: str = 'total_used') -> List[DatasetNode]:
+        """
+        The n largest datasets anywhere in the tree. A child never exceeds its
+        parent on these keys, so only the children of datasets already taken
+        can be next: about n * fan-out nodes are looked at, not the whole tree.
+        """
+        if key not in MONOTONE_KEYS:
+            raise ValueError(f"largest() needs one of {', '.join(MONOTONE_KEYS)}, not {key}")
+        heap = [(-getattr(root, key), root.name, root) for root in self.roots.values()]
+        heapq.heapify(heap)
+        found = []
+        while heap and len(found) < n:
+            _, _, node = heapq.heappop(heap)
+            if node.record is not None:
+                found.append(node)
+            for child in node.children.values():
+                heapq.heappush(heap, (-getattr(child, key), child.name, child))
+        return found